@@ -0,0 +1,192 @@
+from collections import defaultdict
+from dataclasses import dataclass, field, fields
+
+import numpy as np
+
+from fact_table import ANSWERED, CORRECT, count_by_group, group_rows
+
+# Concept accuracy bands used throughout the report
+STRONG_THRESHOLD = 80
+WEAK_THRESHOLD = 60
+
+# --- Result Types ---
+@dataclass
+class GroupStats:
+    total: int = 0
+    answered: int = 0
+    correct: int = 0
+    incorrect: int = 0
+    marked_review: int = 0
+    not_answered: int = 0
+    total_time: int = 0
+    answered_time: int = 0
+
+    @property
+    def accuracy(self):
+        return (self.correct / self.answered * 100) if self.answered > 0 else 0
+
+    @property
+    def avg_time(self):
+        return self.total_time / self.answered if self.answered > 0 else 0
+
+    def add(self, other):
+        for stat in fields(self):
+            setattr(self, stat.name, getattr(self, stat.name) + getattr(other, stat.name))
+
+@dataclass
+class ConceptStats:
+    subject: str
+    chapter: str
+    concept: str
+    total: int = 0
+    correct: int = 0
+
+    @property
+    def incorrect(self):
+        return self.total - self.correct
+
+    @property
+    def accuracy(self):
+        return (self.correct / self.total) * 100 if self.total > 0 else 0
+
+    @property
+    def band(self):
+        if self.accuracy >= STRONG_THRESHOLD:
+            return "strong"
+        if self.accuracy <= WEAK_THRESHOLD:
+            return "weak"
+        return "moderate"
+
+@dataclass
+class PerformanceAggregates:
+    """
+    Every rollup the report needs for one submission. Dicts keep the order
+    in which subjects and chapters first appear in the test; difficulty
+    levels follow the fact table's level codes (easy, medium, tough, ...).
+    """
+    overall: GroupStats = field(default_factory=GroupStats)
+    subjects: dict = field(default_factory=dict)
+    difficulties: dict = field(default_factory=dict)
+    subject_difficulties: dict = field(default_factory=dict)
+    chapters: dict = field(default_factory=dict)
+    chapter_difficulties: dict = field(default_factory=dict)
+    concepts: dict = field(default_factory=dict)
+    strong_concepts: list = field(default_factory=list)
+    moderate_concepts: list = field(default_factory=list)
+    weak_concepts: list = field(default_factory=list)
+
+    def chapters_by_subject(self):
+        """{subject: {chapter: GroupStats}} in subject order."""
+        grouped = {subject: {} for subject in self.subjects}
+        for (subject, chapter), stats in self.chapters.items():
+            grouped[subject][chapter] = stats
+        return grouped
+
+    def chapter_details(self):
+        """Chapter stats in the processed_data["chapter_details"] format."""
+        chapter_details = defaultdict(dict)
+        for (subject, chapter), stats in self.chapters.items():
+            difficulty_counts = defaultdict(int)
+            difficulty_stats = defaultdict(_new_difficulty_stats)
+            for level, level_stats in self.chapter_difficulties[(subject, chapter)].items():
+                difficulty_counts[level] = level_stats.total
+                unattempted = level_stats.marked_review + level_stats.not_answered
+                if level_stats.answered or unattempted:
+                    difficulty_stats[level] = {
+                        "correct": level_stats.correct,
+                        "incorrect": level_stats.incorrect,
+                        "unattempted": unattempted
+                    }
+            chapter_details[subject][chapter] = {
+                "questions_total": stats.total,
+                "answered": stats.answered,
+                "correct": stats.correct,
+                "incorrect": stats.incorrect,
+                "marked_review": stats.marked_review,
+                "not_answered": stats.not_answered,
+                "total_time_seconds": stats.total_time,
+                "difficulty_counts": difficulty_counts,
+                "difficulty_stats": difficulty_stats,
+                "accuracy_on_answered_percent": float(stats.accuracy),
+                "avg_time_per_answered_q_seconds": float(stats.avg_time)
+            }
+        return chapter_details
+
+    def concept_stats(self):
+        """Concept counts in the {(subject, chapter): {concept: counts}} format."""
+        return {
+            key: {
+                concept.concept: {"total": concept.total, "correct": concept.correct, "incorrect": concept.incorrect}
+                for concept in concepts
+            }
+            for key, concepts in self.concepts.items()
+        }
+
+def _new_difficulty_stats():
+    return {"correct": 0, "incorrect": 0, "unattempted": 0}
+
+# --- Aggregation Engine ---
+def aggregate_performance(facts):
+    """
+    Compute all rollups from a QuestionFacts table. Questions are counted
+    once into (subject, chapter, level) cells; every coarser rollup is then
+    summed from those few cells rather than from the questions again.
+    """
+    aggregates = PerformanceAggregates()
+
+    cells, first_rows = group_rows(facts.subject, facts.chapter, facts.level)
+    counts = count_by_group(facts, cells, len(first_rows))
+    answered_time = np.bincount(cells, weights=facts.time_taken * (facts.status == ANSWERED), minlength=len(first_rows))
+
+    # Subject and chapter rollups keep first-seen order
+    for row in first_rows:
+        subject = facts.subjects[facts.subject[row]]
+        chapter = facts.chapters[facts.chapter[row]]
+        aggregates.subjects.setdefault(subject, GroupStats())
+        aggregates.subject_difficulties.setdefault(subject, {})
+        aggregates.chapters.setdefault((subject, chapter), GroupStats())
+        aggregates.chapter_difficulties.setdefault((subject, chapter), {})
+
+    # Fold each cell into every rollup, visiting cells in level-code order
+    for index in np.argsort(facts.level[first_rows], kind='stable'):
+        row = first_rows[index]
+        subject = facts.subjects[facts.subject[row]]
+        chapter = facts.chapters[facts.chapter[row]]
+        level = facts.levels[facts.level[row]]
+        cell = GroupStats(
+            **{name: int(values[index]) for name, values in counts.items()},
+            answered_time=int(answered_time[index])
+        )
+
+        aggregates.chapter_difficulties[(subject, chapter)][level] = cell
+        aggregates.chapters[(subject, chapter)].add(cell)
+        aggregates.subjects[subject].add(cell)
+        aggregates.subject_difficulties[subject].setdefault(level, GroupStats()).add(cell)
+        aggregates.difficulties.setdefault(level, GroupStats()).add(cell)
+        aggregates.overall.add(cell)
+
+    _aggregate_concepts(facts, aggregates)
+    return aggregates
+
+def _aggregate_concepts(facts, aggregates):
+    answered_pairs = facts.status[facts.concept_question] == ANSWERED
+    rows = facts.concept_question[answered_pairs]
+    concepts = facts.concept[answered_pairs]
+    if not len(rows):
+        return
+
+    groups, first_pairs = group_rows(facts.subject[rows], facts.chapter[rows], concepts)
+    totals = np.bincount(groups, minlength=len(first_pairs))
+    corrects = np.bincount(groups[facts.correct[rows] == CORRECT], minlength=len(first_pairs))
+
+    for index, pair in enumerate(first_pairs):
+        row = rows[pair]
+        subject = facts.subjects[facts.subject[row]]
+        chapter = facts.chapters[facts.chapter[row]]
+        concept = ConceptStats(subject, chapter, facts.concepts[concepts[pair]], int(totals[index]), int(corrects[index]))
+        aggregates.concepts.setdefault((subject, chapter), []).append(concept)
+
+    # Classify in chapter-major order so the global lists read chapter by chapter
+    for chapter_concepts in aggregates.concepts.values():
+        for concept in chapter_concepts:
+            getattr(aggregates, f"{concept.band}_concepts").append(concept)
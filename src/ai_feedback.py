@@ -1,17 +1,36 @@
+import asyncio
+import time
 import requests
-import json
-import os
-import requests
-import json
 import os
 from dotenv import load_dotenv # Import load_dotenv
 
+from gemini_client import GeminiClient
+from llm_scheduler import RateLimitedScheduler
+from llm_cache import LLMResponseCache
+from llm_metrics import LLMMetrics, llm_tags
+from llm_context import prepare_compact_llm_context
+from section_prompts import generate_sectioned_report
+from template_feedback import build_template_report
+from profile_buckets import generate_bucketed_reports
+from batch_jobs import BatchRun, get_batch_backend
+from report_model import STRUCTURED_GENERATION_CONFIG, StreamingReportParser, build_feedback_report
+
 # Load environment variables from .env file
 load_dotenv()
 
 # Gemini API configuration
 API_KEY = os.getenv("GEMINI_API_KEY") # Now it will read from the .env file
-API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
+
+# Quota budgets for the scheduler (free tier defaults)
+REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_RPM", "15"))
+TOKENS_PER_MINUTE = int(os.getenv("GEMINI_TPM", "1000000"))
+
+# Feedback source: "llm" for everyone, "template" for everyone, or
+# "selected" for LLM feedback only for the students in llm_students
+FEEDBACK_MODE = os.getenv("FEEDBACK_MODE", "llm")
+
+# JSONL log of every LLM call (optional)
+LLM_METRICS_LOG = os.getenv("LLM_METRICS_LOG")
 
 # Performance data from prepare_llm_context_comprehensive output
 new_new_performance_data = {
@@ -180,335 +199,338 @@ new_new_performance_data = {
     }
 }
 
-# API prompt for generating feedback
-prompt = f"""
+# --- Build Prompt ---
+def _join_names(names):
+    names = list(names)
+    return ", ".join(names[:-1]) + f", and {names[-1]}" if len(names) > 1 else "".join(names)
+
+def _concept_list(concepts):
+    return ', '.join([f"{c['concept']} ({c['accuracy']})" for c in concepts])
+
+def build_feedback_prompt(performance_data):
+    """
+    Build the feedback prompt from new_performance_data-style summary data
+    (see new_performance_data.build_new_performance_data).
+    """
+    overall = performance_data['overall_summary']
+    subjects = performance_data['subject_summary']
+    difficulties = performance_data['difficulty_summary']
+    chapter_concepts = performance_data['chapter_concepts']
+
+    subject_lines = "\n".join(
+        f"- {subject}: Score: {s['score']}, Attempted: {s['questions_attempted']}, Correct: {s['correct']}, Incorrect: {s['incorrect']}, Accuracy: {s['accuracy']}, Avg Time/Question: {s['avg_time_per_question']}"
+        for subject, s in subjects.items()
+    )
+    difficulty_lines = "\n".join(
+        f"- {level}: Total: {d['total']}, Attempted: {d['attempted']}, Correct: {d['correct']}, Incorrect: {d['incorrect']}, Accuracy: {d['accuracy']}, Avg Time: {d['avg_time']}"
+        for level, d in difficulties.items()
+    )
+    chapter_lines = "\n".join(
+        f"""- {subject} ({chapter}): Total: {c['total_questions']}, Attempted: {c['attempted']}, Correct: {c['correct']}, Accuracy: {c['accuracy']}, Avg Time: {c['avg_time']}
+  Strong Concepts: {_concept_list(c['strong_concepts'])}
+  Weak Concepts: {_concept_list(c['weak_concepts'])}"""
+        for subject, chapters in chapter_concepts.items()
+        for chapter, c in chapters.items()
+    )
+    chapter_scope = _join_names(f"{subject} ({', '.join(chapters)})" for subject, chapters in chapter_concepts.items())
+
+    # API prompt for generating feedback
+    return f"""
 You are an expert tutor providing personalized feedback for a student's test performance. Based on the following data, generate a detailed, human-like feedback report that is motivating, encouraging, and actionable. The report should include:
 
 1. An 'Overall Performance' section summarizing the total score, questions attempted, correct answers, accuracy, and time taken.
 2. A personalized, motivating introduction (highlight specific achievements like strong concepts, acknowledge challenges like low attempt rates, avoid generic phrases).
-3. A performance breakdown by difficulty level (Easy, Medium, Tough) across subjects (Physics, Chemistry, Mathematics), presented concisely.
+3. A performance breakdown by difficulty level ({', '.join(difficulties)}) across subjects ({', '.join(subjects)}), presented concisely.
 4. Time vs. accuracy insights, explaining how time allocation impacts performance and identifying patterns (e.g., spending too long on easy questions).
-5. A chapter-wise concept analysis, listing strong (≥80% accuracy) and weak (≤60% accuracy) concepts for each chapter in Physics (Electrostatics, Capacitance), Chemistry (Solutions, Electrochemistry), and Mathematics (Functions, Sets and Relations).
+5. A chapter-wise concept analysis, listing strong (≥80% accuracy) and weak (≤60% accuracy) concepts for each chapter in {chapter_scope}.
 6. 2–3 actionable suggestions for improvement, focusing on specific weaknesses and leveraging strengths.
 
 Use a friendly, supportive tone and keep the response clear and concise. Avoid technical jargon. Here is the performance data:
 
 Overall Summary:
-- Total Score: {new_new_performance_data['overall_summary']['total_score']}
-- Questions Attempted: {new_new_performance_data['overall_summary']['questions_attempted']}
-- Correct Answers: {new_new_performance_data['overall_summary']['correct_answers']}
-- Overall Accuracy: {new_new_performance_data['overall_summary']['overall_accuracy']}
-- Time Taken: {new_new_performance_data['overall_summary']['time_taken']}
+- Total Score: {overall['total_score']}
+- Questions Attempted: {overall['questions_attempted']}
+- Correct Answers: {overall['correct_answers']}
+- Overall Accuracy: {overall['overall_accuracy']}
+- Time Taken: {overall['time_taken']}
 
 Subject-wise Summary:
-- Physics: Score: {new_new_performance_data['subject_summary']['Physics']['score']}, Attempted: {new_new_performance_data['subject_summary']['Physics']['questions_attempted']}, Correct: {new_new_performance_data['subject_summary']['Physics']['correct']}, Incorrect: {new_new_performance_data['subject_summary']['Physics']['incorrect']}, Accuracy: {new_new_performance_data['subject_summary']['Physics']['accuracy']}, Avg Time/Question: {new_new_performance_data['subject_summary']['Physics']['avg_time_per_question']}
-- Chemistry: Score: {new_new_performance_data['subject_summary']['Chemistry']['score']}, Attempted: {new_new_performance_data['subject_summary']['Chemistry']['questions_attempted']}, Correct: {new_new_performance_data['subject_summary']['Chemistry']['correct']}, Incorrect: {new_new_performance_data['subject_summary']['Chemistry']['incorrect']}, Accuracy: {new_new_performance_data['subject_summary']['Chemistry']['accuracy']}, Avg Time/Question: {new_new_performance_data['subject_summary']['Chemistry']['avg_time_per_question']}
-- Mathematics: Score: {new_new_performance_data['subject_summary']['Mathematics']['score']}, Attempted: {new_new_performance_data['subject_summary']['Mathematics']['questions_attempted']}, Correct: {new_new_performance_data['subject_summary']['Mathematics']['correct']}, Incorrect: {new_new_performance_data['subject_summary']['Mathematics']['incorrect']}, Accuracy: {new_new_performance_data['subject_summary']['Mathematics']['accuracy']}, Avg Time/Question: {new_new_performance_data['subject_summary']['Mathematics']['avg_time_per_question']}
+{subject_lines}
 
 Difficulty-wise Summary:
-- Easy: Total: {new_new_performance_data['difficulty_summary']['Easy']['total']}, Attempted: {new_new_performance_data['difficulty_summary']['Easy']['attempted']}, Correct: {new_new_performance_data['difficulty_summary']['Easy']['correct']}, Incorrect: {new_new_performance_data['difficulty_summary']['Easy']['incorrect']}, Accuracy: {new_new_performance_data['difficulty_summary']['Easy']['accuracy']}, Avg Time: {new_new_performance_data['difficulty_summary']['Easy']['avg_time']}
-- Medium: Total: {new_new_performance_data['difficulty_summary']['Medium']['total']}, Attempted: {new_new_performance_data['difficulty_summary']['Medium']['attempted']}, Correct: {new_new_performance_data['difficulty_summary']['Medium']['correct']}, Incorrect: {new_new_performance_data['difficulty_summary']['Medium']['incorrect']}, Accuracy: {new_new_performance_data['difficulty_summary']['Medium']['accuracy']}, Avg Time: {new_new_performance_data['difficulty_summary']['Medium']['avg_time']}
-- Tough: Total: {new_new_performance_data['difficulty_summary']['Tough']['total']}, Attempted: {new_new_performance_data['difficulty_summary']['Tough']['attempted']}, Correct: {new_new_performance_data['difficulty_summary']['Tough']['correct']}, Incorrect: {new_new_performance_data['difficulty_summary']['Tough']['incorrect']}, Accuracy: {new_new_performance_data['difficulty_summary']['Tough']['accuracy']}, Avg Time: {new_new_performance_data['difficulty_summary']['Tough']['avg_time']}
+{difficulty_lines}
 
 Chapter-wise Concepts:
-- Physics (Capacitance): Total: {new_new_performance_data['chapter_concepts']['Physics']['Capacitance']['total_questions']}, Attempted: {new_new_performance_data['chapter_concepts']['Physics']['Capacitance']['attempted']}, Correct: {new_new_performance_data['chapter_concepts']['Physics']['Capacitance']['correct']}, Accuracy: {new_new_performance_data['chapter_concepts']['Physics']['Capacitance']['accuracy']}, Avg Time: {new_new_performance_data['chapter_concepts']['Physics']['Capacitance']['avg_time']}
-  Strong Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_new_performance_data['chapter_concepts']['Physics']['Capacitance']['strong_concepts']])}
-  Weak Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_new_performance_data['chapter_concepts']['Physics']['Capacitance']['weak_concepts']])}
-- Physics (Electrostatics): Total: {new_new_performance_data['chapter_concepts']['Physics']['Electrostatics']['total_questions']}, Attempted: {new_new_performance_data['chapter_concepts']['Physics']['Electrostatics']['attempted']}, Correct: {new_new_performance_data['chapter_concepts']['Physics']['Electrostatics']['correct']}, Accuracy: {new_new_performance_data['chapter_concepts']['Physics']['Electrostatics']['accuracy']}, Avg Time: {new_new_performance_data['chapter_concepts']['Physics']['Electrostatics']['avg_time']}
-  Strong Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_new_performance_data['chapter_concepts']['Physics']['Electrostatics']['strong_concepts']])}
-  Weak Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_new_performance_data['chapter_concepts']['Physics']['Electrostatics']['weak_concepts']])}
-- Chemistry (Electrochemistry): Total: {new_new_performance_data['chapter_concepts']['Chemistry']['Electrochemistry']['total_questions']}, Attempted: {new_new_performance_data['chapter_concepts']['Chemistry']['Electrochemistry']['attempted']}, Correct: {new_new_performance_data['chapter_concepts']['Chemistry']['Electrochemistry']['correct']}, Accuracy: {new_new_performance_data['chapter_concepts']['Chemistry']['Electrochemistry']['accuracy']}, Avg Time: {new_new_performance_data['chemistry_chapter_concepts']['Electrochemistry']['avg_time']}
-  Strong Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_new_performance_data['chapter_concepts']['Chemistry']['Electrochemistry']['strong_concepts']])}
-  Weak Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_new_performance_data['chapter_concepts']['Chemistry']['Electrochemistry']['weak_concepts']])}
-- Chemistry (Solutions): Total: {new_new_performance_data['chapter_concepts']['Chemistry']['Solutions']['total_questions']}, Attempted: {new_new_performance_data['chapter_concepts']['Chemistry']['Solutions']['attempted']}, Correct: {new_new_performance_data['chapter_concepts']['Chemistry']['Solutions']['correct']}, Accuracy: {new_new_performance_data['chapter_concepts']['Chemistry']['Solutions']['accuracy']}, Avg Time: {new_new_performance_data['chapter_concepts']['Chemistry']['Solutions']['avg_time']}
-  Strong Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_new_performance_data['chapter_concepts']['Chemistry']['Solutions']['strong_concepts']])}
-  Weak Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_new_performance_data['chapter_concepts']['Chemistry']['Solutions']['weak_concepts']])}
-- Mathematics (Functions): Total: {new_new_performance_data['chapter_concepts']['Mathematics']['Functions']['total_questions']}, Attempted: {new_new_performance_data['chapter_concepts']['Mathematics']['Functions']['attempted']}, Correct: {new_new_performance_data['chapter_concepts']['Mathematics']['Functions']['correct']}, Accuracy: {new_new_performance_data['chapter_concepts']['Mathematics']['Functions']['accuracy']}, Avg Time: {new_new_performance_data['chapter_concepts']['Mathematics']['Functions']['avg_time']}
-  Strong Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_new_performance_data['chapter_concepts']['Mathematics']['Functions']['strong_concepts']])}
-  Weak Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_new_performance_data['chapter_concepts']['Mathematics']['Functions']['weak_concepts']])}
-- Mathematics (Sets and Relations): Total: {new_new_performance_data['chapter_concepts']['Mathematics']['Sets and Relations']['total_questions']}, Attempted: {new_new_performance_data['chapter_concepts']['Mathematics']['Sets and Relations']['attempted']}, Correct: {new_new_performance_data['chapter_concepts']['Mathematics']['Sets and Relations']['correct']}, Accuracy: {new_new_performance_data['chapter_concepts']['Mathematics']['Sets and Relations']['accuracy']}, Avg Time: {new_new_performance_data['chapter_concepts']['Mathematics']['Sets and Relations']['avg_time']}
-  Strong Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_new_performance_data['chapter_concepts']['Mathematics']['Sets and Relations']['strong_concepts']])}
-  Weak Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_new_performance_data['chapter_concepts']['Mathematics']['Sets and Relations']['weak_concepts']])}
+{chapter_lines}
 
 Format the response in clear sections with headers: 'Overall Performance', 'Motivating Introduction', 'Performance Breakdown', 'Time vs. Accuracy Insights', 'Chapter-wise Concept Analysis', and 'Actionable Suggestions'. Ensure the response is under 2000 tokens to stay within free tier limits.
 """
 
-# API request
-headers = {
-    "Content-Type": "application/json"
-}
+def build_compact_feedback_prompt(compact_context):
+    """
+    Shorter prompt around llm_context.prepare_compact_llm_context output,
+    asking for the same report sections as build_feedback_prompt.
+    """
+    return f"""You are an expert tutor. Write motivating, specific, actionable feedback on this student's test, friendly and jargon-free, under 2000 tokens.
+Sections: 'Overall Performance' (score, attempts, correct, accuracy, time); 'Motivating Introduction' (name real strengths and challenges); 'Performance Breakdown' (by difficulty across subjects, concise); 'Time vs. Accuracy Insights' (how time allocation affects results); 'Chapter-wise Concept Analysis' (strong and weak concepts per chapter); 'Actionable Suggestions' (2-3, targeting weaknesses and using strengths).
+Data (pipe-separated tables; see legend):
 
-payload = {
-    "contents": [
-        {
-            "parts": [
-                {"text": prompt}
-            ],
-            "role": "user"
-        }
-    ]
-}
+{compact_context}
+"""
 
-try:
-    response = requests.post(f"{API_URL}?key={API_KEY}", headers=headers, json=payload)
-    response.raise_for_status()
-    feedback = response.json().get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-    print("Generated Feedback:")
-    print(feedback)
-except requests.RequestException as e:
-    print(f"Error calling Gemini API: {e}")
-    feedback = "Failed to generate feedback due to API error."
+def build_structured_feedback_prompt(compact_context):
+    """
+    Prompt for the JSON report (see report_model.RESPONSE_SCHEMA). Scores
+    and tables are filled in from the data, so only the prose is requested.
+    """
+    return f"""You are an expert tutor. Write motivating, specific, actionable feedback on this student's test, friendly and jargon-free.
+Fill the JSON fields: introduction (personal, names real strengths and challenges); breakdown_notes (short remarks on performance by difficulty across subjects); time_insights (how time allocation affects accuracy, one point per item); chapters (one entry per chapter with a one-sentence summary and its strong (>=80%) and weak (<=60%) concepts); suggestions (2-3, each a short title and detail, targeting weaknesses and using strengths).
+Data (pipe-separated tables; see legend):
 
-# Save feedback for PDF generation
-with open("feedback_output.txt", "w") as f:
-    f.write(feedback)
+{compact_context}
+"""
 
-# Performance data from prepare_llm_context_comprehensive output
-new_new_performance_data = {
-    "overall_summary": {
-        "total_score": "133/300",
-        "questions_attempted": "47/75",
-        "correct_answers": 36,
-        "overall_accuracy": "76.6%",
-        "time_taken": "83.3 minutes"
-    },
-    "subject_summary": {
-        "Physics": {
-            "score": "44/100",
-            "questions_attempted": "16/25",
-            "correct": 12,
-            "incorrect": 4,
-            "accuracy": "75.0%",
-            "avg_time_per_question": "186.5 seconds"
-        },
-        "Chemistry": {
-            "score": "60/100",
-            "questions_attempted": "20/25",
-            "correct": 16,
-            "incorrect": 4,
-            "accuracy": "80.0%",
-            "avg_time_per_question": "69.8 seconds"
-        },
-        "Mathematics": {
-            "score": "29/100",
-            "questions_attempted": "11/25",
-            "correct": 8,
-            "incorrect": 3,
-            "accuracy": "72.7%",
-            "avg_time_per_question": "56.1 seconds"
-        }
-    },
-    "difficulty_summary": {
-        "Easy": {
-            "total": 25,
-            "attempted": 19,
-            "correct": 14,
-            "incorrect": 5,
-            "accuracy": "73.7%",
-            "avg_time": "138.3 seconds"
-        },
-        "Medium": {
-            "total": 30,
-            "attempted": 18,
-            "correct": 14,
-            "incorrect": 4,
-            "accuracy": "77.8%",
-            "avg_time": "77.8 seconds"
-        },
-        "Tough": {
-            "total": 20,
-            "attempted": 10,
-            "correct": 8,
-            "incorrect": 2,
-            "accuracy": "80.0%",
-            "avg_time": "97.0 seconds"
-        }
-    },
-    "chapter_concepts": {
-        "Physics": {
-            "Capacitance": {
-                "total_questions": 10,
-                "attempted": 8,
-                "correct": 6,
-                "accuracy": "75.0%",
-                "avg_time": "62.5 seconds",
-                "strong_concepts": [
-                    {"concept": "Charging of Capacitors", "accuracy": "100.0%"},
-                    {"concept": "Series and Parallel Combinations of Capacitor", "accuracy": "100.0%"},
-                    {"concept": "Induced charge on dielectric", "accuracy": "100.0%"},
-                    {"concept": "Energy stored in capacitor", "accuracy": "100.0%"}
-                ],
-                "weak_concepts": [
-                    {"concept": "Multiple dielectric slabs in capacitor", "accuracy": "0.0%"},
-                    {"concept": "Force on plates of capacitor", "accuracy": "0.0%"}
-                ]
-            },
-            "Electrostatics": {
-                "total_questions": 15,
-                "attempted": 12,
-                "correct": 10,
-                "accuracy": "83.3%",
-                "avg_time": "74.8 seconds",
-                "strong_concepts": [
-                    {"concept": "Electric Field and Force due to Dipole", "accuracy": "100.0%"},
-                    {"concept": "Properties of Electric Dipole", "accuracy": "100.0%"},
-                    {"concept": "Electric Field due to continuous charge distribution", "accuracy": "100.0%"},
-                    {"concept": "Electric flux", "accuracy": "100.0%"},
-                    {"concept": "Gauss theorem", "accuracy": "100.0%"},
-                    {"concept": "Electric potential due to point charge", "accuracy": "100.0%"},
-                    {"concept": "Electric field by group of charges", "accuracy": "100.0%"}
-                ],
-                "weak_concepts": [
-                    {"concept": "Coulombs Law", "accuracy": "0.0%"},
-                    {"concept": "Charged Particle in electric field", "accuracy": "50.0%"}
-                ]
-            }
-        },
-        "Chemistry": {
-            "Electrochemistry": {
-                "total_questions": 13,
-                "attempted": 1,
-                "correct": 1,
-                "accuracy": "100.0%",
-                "avg_time": "122.0 seconds",
-                "strong_concepts": [
-                    {"concept": "Factors which enhance corrosion", "accuracy": "100.0%"}
-                ],
-                "weak_concepts": []
-            },
-            "Solutions": {
-                "total_questions": 12,
-                "attempted": 10,
-                "correct": 7,
-                "accuracy": "70.0%",
-                "avg_time": "49.5 seconds",
-                "strong_concepts": [
-                    {"concept": "Henry's law", "accuracy": "100.0%"},
-                    {"concept": "Azeotropic solutions", "accuracy": "100.0%"},
-                    {"concept": "Elevation in boiling point", "accuracy": "100.0%"},
-                    {"concept": "Vapour pressure of solution containing volatile solute and volatile solvent", "accuracy": "100.0%"}
-                ],
-                "weak_concepts": [
-                    {"concept": "Osmotic pressure", "accuracy": "33.3%"},
-                    {"concept": "Depression in freezing point", "accuracy": "0.0%"}
-                ]
-            }
-        },
-        "Mathematics": {
-            "Functions": {
-                "total_questions": 18,
-                "attempted": 10,
-                "correct": 7,
-                "accuracy": "70.0%",
-                "avg_time": "177.1 seconds",
-                "strong_concepts": [
-                    {"concept": "Questions on determining odd and even functions", "accuracy": "100.0%"},
-                    {"concept": "domain of modulus functions", "accuracy": "100.0%"},
-                    {"concept": "questions based on functional equations", "accuracy": "100.0%"},
-                    {"concept": "range involving modulus functions", "accuracy": "100.0%"}
-                ],
-                "weak_concepts": [
-                    {"concept": "finding fog and gof", "accuracy": "50.0%"},
-                    {"concept": "period of normal functions", "accuracy": "0.0%"}
-                ]
-            },
-            "Sets and Relations": {
-                "total_questions": 7,
-                "attempted": 6,
-                "correct": 5,
-                "accuracy": "83.3%",
-                "avg_time": "202.2 seconds",
-                "strong_concepts": [
-                    {"concept": "Questions on number of relations and sets", "accuracy": "100.0%"},
-                    {"concept": "Questions on Venn Diagram", "accuracy": "100.0%"}
-                ],
-                "weak_concepts": [
-                    {"concept": "Questions on Symmetric Transitive and Reflexive Properties", "accuracy": "50.0%"}
-                ]
-            }
-        }
-    }
-}
+# --- Generate Feedback ---
+_default_client = None
+_default_scheduler = None
+_default_metrics = None
 
-# API prompt for generating feedback
-prompt = f"""
-You are an expert tutor providing personalized feedback for a student's test performance. Based on the following data, generate a detailed, human-like feedback report that is motivating, encouraging, and actionable. The report should include:
+def get_metrics():
+    """Shared LLMMetrics recording every call and cache hit in this run."""
+    global _default_metrics
+    if _default_metrics is None:
+        _default_metrics = LLMMetrics(log_path=LLM_METRICS_LOG)
+    return _default_metrics
 
-1. An 'Overall Performance' section summarizing the total score, questions attempted, correct answers, accuracy, and time taken.
-2. A personalized, motivating introduction (highlight specific achievements like strong concepts, acknowledge challenges like low attempt rates, avoid generic phrases).
-3. A performance breakdown by difficulty level (Easy, Medium, Tough) across subjects (Physics, Chemistry, Mathematics), presented concisely.
-4. Time vs. accuracy insights, explaining how time allocation impacts performance and identifying patterns (e.g., spending too long on easy questions).
-5. A chapter-wise concept analysis, listing strong (≥80% accuracy) and weak (≤60% accuracy) concepts for each chapter in Physics (Electrostatics, Capacitance), Chemistry (Solutions, Electrochemistry), and Mathematics (Functions, Sets and Relations).
-6. 2–3 actionable suggestions for improvement, focusing on specific weaknesses and leveraging strengths.
+def get_client():
+    """Shared GeminiClient so every call reuses the same connection pool."""
+    global _default_client
+    if _default_client is None:
+        _default_client = GeminiClient(api_key=API_KEY)
+    return _default_client
 
-Use a friendly, supportive tone and keep the response clear and concise. Avoid technical jargon. Here is the performance data:
+def get_scheduler():
+    """Shared scheduler so all calls draw from the same quota budget."""
+    global _default_scheduler
+    if _default_scheduler is None:
+        _default_scheduler = RateLimitedScheduler(
+            get_client(),
+            requests_per_minute=REQUESTS_PER_MINUTE,
+            tokens_per_minute=TOKENS_PER_MINUTE,
+            metrics=get_metrics()
+        )
+    return _default_scheduler
 
-Overall Summary:
-- Total Score: {new_performance_data['overall_summary']['total_score']}
-- Questions Attempted: {new_performance_data['overall_summary']['questions_attempted']}
-- Correct Answers: {new_performance_data['overall_summary']['correct_answers']}
-- Overall Accuracy: {new_performance_data['overall_summary']['overall_accuracy']}
-- Time Taken: {new_performance_data['overall_summary']['time_taken']}
+def generate_feedback(prompt, cache=None, scheduler=None, generation_config=None, parse=None):
+    """
+    Call Gemini for one prompt, retrying rate limits and transient errors.
+    With an LLMResponseCache, identical prompts (for this model and
+    generation config) are answered from the cache without spending quota.
+    With parse, the text is passed through it and the parsed result is
+    returned; a reply it rejects (None) is never cached.
+    Returns None on failure.
+    """
+    parse = parse or (lambda text: text)
+    scheduler = scheduler or get_scheduler()
+    client = scheduler.client
+    config = {**client.generation_config, **(generation_config or {})}
+    if cache is not None:
+        cached = cache.get(prompt, client.model, config)
+        if cached is not None:
+            result = parse(cached)
+            if result is not None:
+                return result
 
-Subject-wise Summary:
-- Physics: Score: {new_performance_data['subject_summary']['Physics']['score']}, Attempted: {new_performance_data['subject_summary']['Physics']['questions_attempted']}, Correct: {new_performance_data['subject_summary']['Physics']['correct']}, Incorrect: {new_performance_data['subject_summary']['Physics']['incorrect']}, Accuracy: {new_performance_data['subject_summary']['Physics']['accuracy']}, Avg Time/Question: {new_performance_data['subject_summary']['Physics']['avg_time_per_question']}
-- Chemistry: Score: {new_performance_data['subject_summary']['Chemistry']['score']}, Attempted: {new_performance_data['subject_summary']['Chemistry']['questions_attempted']}, Correct: {new_performance_data['subject_summary']['Chemistry']['correct']}, Incorrect: {new_performance_data['subject_summary']['Chemistry']['incorrect']}, Accuracy: {new_performance_data['subject_summary']['Chemistry']['accuracy']}, Avg Time/Question: {new_performance_data['subject_summary']['Chemistry']['avg_time_per_question']}
-- Mathematics: Score: {new_performance_data['subject_summary']['Mathematics']['score']}, Attempted: {new_performance_data['subject_summary']['Mathematics']['questions_attempted']}, Correct: {new_performance_data['subject_summary']['Mathematics']['correct']}, Incorrect: {new_performance_data['subject_summary']['Mathematics']['incorrect']}, Accuracy: {new_performance_data['subject_summary']['Mathematics']['accuracy']}, Avg Time/Question: {new_performance_data['subject_summary']['Mathematics']['avg_time_per_question']}
+    try:
+        feedback = asyncio.run(scheduler.generate(prompt, generation_config))
+    except requests.RequestException as e:
+        print(f"Error calling Gemini API: {e}")
+        return None
+    if not feedback:
+        print("Gemini returned no text (the prompt may have been blocked)")
+        return None
 
-Difficulty-wise Summary:
-- Easy: Total: {new_performance_data['difficulty_summary']['Easy']['total']}, Attempted: {new_performance_data['difficulty_summary']['Easy']['attempted']}, Correct: {new_performance_data['difficulty_summary']['Easy']['correct']}, Incorrect: {new_performance_data['difficulty_summary']['Easy']['incorrect']}, Accuracy: {new_performance_data['difficulty_summary']['Easy']['accuracy']}, Avg Time: {new_performance_data['difficulty_summary']['Easy']['avg_time']}
-- Medium: Total: {new_performance_data['difficulty_summary']['Medium']['total']}, Attempted: {new_performance_data['difficulty_summary']['Medium']['attempted']}, Correct: {new_performance_data['difficulty_summary']['Medium']['correct']}, Incorrect: {new_performance_data['difficulty_summary']['Medium']['incorrect']}, Accuracy: {new_performance_data['difficulty_summary']['Medium']['accuracy']}, Avg Time: {new_performance_data['difficulty_summary']['Medium']['avg_time']}
-- Tough: Total: {new_performance_data['difficulty_summary']['Tough']['total']}, Attempted: {new_performance_data['difficulty_summary']['Tough']['attempted']}, Correct: {new_performance_data['difficulty_summary']['Tough']['correct']}, Incorrect: {new_performance_data['difficulty_summary']['Tough']['incorrect']}, Accuracy: {new_performance_data['difficulty_summary']['Tough']['accuracy']}, Avg Time: {new_performance_data['difficulty_summary']['Tough']['avg_time']}
+    result = parse(feedback)
+    if cache is not None and result is not None:
+        cache.put(prompt, client.model, feedback, config)
+    return result
 
-Chapter-wise Concepts:
-- Physics (Capacitance): Total: {new_performance_data['chapter_concepts']['Physics']['Capacitance']['total_questions']}, Attempted: {new_performance_data['chapter_concepts']['Physics']['Capacitance']['attempted']}, Correct: {new_performance_data['chapter_concepts']['Physics']['Capacitance']['correct']}, Accuracy: {new_performance_data['chapter_concepts']['Physics']['Capacitance']['accuracy']}, Avg Time: {new_performance_data['chapter_concepts']['Physics']['Capacitance']['avg_time']}
-  Strong Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_performance_data['chapter_concepts']['Physics']['Capacitance']['strong_concepts']])}
-  Weak Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_performance_data['chapter_concepts']['Physics']['Capacitance']['weak_concepts']])}
-- Physics (Electrostatics): Total: {new_performance_data['chapter_concepts']['Physics']['Electrostatics']['total_questions']}, Attempted: {new_performance_data['chapter_concepts']['Physics']['Electrostatics']['attempted']}, Correct: {new_performance_data['chapter_concepts']['Physics']['Electrostatics']['correct']}, Accuracy: {new_performance_data['chapter_concepts']['Physics']['Electrostatics']['accuracy']}, Avg Time: {new_performance_data['chapter_concepts']['Physics']['Electrostatics']['avg_time']}
-  Strong Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_performance_data['chapter_concepts']['Physics']['Electrostatics']['strong_concepts']])}
-  Weak Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_performance_data['chapter_concepts']['Physics']['Electrostatics']['weak_concepts']])}
-- Chemistry (Electrochemistry): Total: {new_performance_data['chapter_concepts']['Chemistry']['Electrochemistry']['total_questions']}, Attempted: {new_performance_data['chapter_concepts']['Chemistry']['Electrochemistry']['attempted']}, Correct: {new_performance_data['chapter_concepts']['Chemistry']['Electrochemistry']['correct']}, Accuracy: {new_performance_data['chapter_concepts']['Chemistry']['Electrochemistry']['accuracy']}, Avg Time: {new_performance_data['chapter_concepts']['Chemistry']['Electrochemistry']['avg_time']}
-  Strong Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_performance_data['chapter_concepts']['Chemistry']['Electrochemistry']['strong_concepts']])}
-  Weak Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_performance_data['chapter_concepts']['Chemistry']['Electrochemistry']['weak_concepts']])}
-- Chemistry (Solutions): Total: {new_performance_data['chapter_concepts']['Chemistry']['Solutions']['total_questions']}, Attempted: {new_performance_data['chapter_concepts']['Chemistry']['Solutions']['attempted']}, Correct: {new_performance_data['chapter_concepts']['Chemistry']['Solutions']['correct']}, Accuracy: {new_performance_data['chapter_concepts']['Chemistry']['Solutions']['accuracy']}, Avg Time: {new_performance_data['chapter_concepts']['Chemistry']['Solutions']['avg_time']}
-  Strong Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_performance_data['chapter_concepts']['Chemistry']['Solutions']['strong_concepts']])}
-  Weak Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_performance_data['chapter_concepts']['Chemistry']['Solutions']['weak_concepts']])}
-- Mathematics (Functions): Total: {new_performance_data['chapter_concepts']['Mathematics']['Functions']['total_questions']}, Attempted: {new_performance_data['chapter_concepts']['Mathematics']['Functions']['attempted']}, Correct: {new_performance_data['chapter_concepts']['Mathematics']['Functions']['correct']}, Accuracy: {new_performance_data['chapter_concepts']['Mathematics']['Functions']['accuracy']}, Avg Time: {new_performance_data['chapter_concepts']['Mathematics']['Functions']['avg_time']}
-  Strong Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_performance_data['chapter_concepts']['Mathematics']['Functions']['strong_concepts']])}
-  Weak Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_performance_data['chapter_concepts']['Mathematics']['Functions']['weak_concepts']])}
-- Mathematics (Sets and Relations): Total: {new_performance_data['chapter_concepts']['Mathematics']['Sets and Relations']['total_questions']}, Attempted: {new_performance_data['chapter_concepts']['Mathematics']['Sets and Relations']['attempted']}, Correct: {new_performance_data['chapter_concepts']['Mathematics']['Sets and Relations']['correct']}, Accuracy: {new_performance_data['chapter_concepts']['Mathematics']['Sets and Relations']['accuracy']}, Avg Time: {new_performance_data['chapter_concepts']['Mathematics']['Sets and Relations']['avg_time']}
-  Strong Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_performance_data['chapter_concepts']['Mathematics']['Sets and Relations']['strong_concepts']])}
-  Weak Concepts: {', '.join([f"{c['concept']} ({c['accuracy']})" for c in new_performance_data['chapter_concepts']['Mathematics']['Sets and Relations']['weak_concepts']])}
+def generate_feedback_report(processed_data, cache=None, scheduler=None, sectioned=False):
+    """
+    Request schema-constrained JSON feedback for one student and return it
+    as a report_model.FeedbackReport, or None on failure. With sectioned,
+    each section is its own concurrent request (see section_prompts).
+    """
+    if sectioned:
+        return asyncio.run(generate_sectioned_report(processed_data, scheduler or get_scheduler(), cache=cache))
 
-Format the response in clear sections with headers: 'Overall Performance', 'Motivating Introduction', 'Performance Breakdown', 'Time vs. Accuracy Insights', 'Chapter-wise Concept Analysis', and 'Actionable Suggestions'. Ensure the response is under 2000 tokens to stay within free tier limits.
-"""
+    context, _, _ = prepare_compact_llm_context(processed_data)
+    return generate_feedback(
+        build_structured_feedback_prompt(context),
+        cache=cache,
+        scheduler=scheduler,
+        generation_config=STRUCTURED_GENERATION_CONFIG,
+        parse=lambda response: build_feedback_report(response, processed_data)
+    )
 
-# API request
-headers = {
-    "Content-Type": "application/json"
-}
+# --- Route Between LLM and Template Feedback ---
+def uses_llm(submission_id, mode=None, llm_students=()):
+    mode = mode or FEEDBACK_MODE
+    if mode == "llm":
+        return True
+    if mode == "template":
+        return False
+    if mode == "selected":
+        return submission_id in llm_students
+    raise ValueError(f"Unknown feedback mode: {mode}")
 
-payload = {
-    "contents": [
-        {
-            "parts": [
-                {"text": prompt}
-            ],
-            "role": "user"
-        }
-    ]
-}
+def route_feedback_report(submission_id, processed_data, mode=None, llm_students=(), cache=None,
+                          scheduler=None, sectioned=False):
+    """
+    FeedbackReport for one student from the LLM or the template engine,
+    depending on mode. Students routed to the LLM fall back to the template
+    report if the API call fails, so every student gets a report.
+    """
+    if uses_llm(submission_id, mode, llm_students):
+        with llm_tags(student=submission_id, test=processed_data.get("test_id")):
+            report = generate_feedback_report(processed_data, cache=cache, scheduler=scheduler, sectioned=sectioned)
+        if report is not None:
+            return report
+        print(f"Using template feedback for {submission_id} after LLM failure")
+    return build_template_report(processed_data)
+
+def generate_feedback_reports_bucketed(students, cache=None, scheduler=None):
+    """
+    FeedbackReports for {submission_id: processed_data} with one LLM call
+    per distinct performance profile (see profile_buckets). Students whose
+    bucket draft failed get the template report.
+    """
+    reports, failures, buckets = asyncio.run(generate_bucketed_reports(students, scheduler or get_scheduler(), cache=cache))
+    for submission_id in failures:
+        reports[submission_id] = build_template_report(students[submission_id])
+    print(f"Profile buckets: {buckets.stats()}")
+    return reports
+
+async def generate_feedback_many(prompts, cache=None, scheduler=None):
+    """
+    Generate feedback for {submission_id: prompt} within the quota budgets.
+    Students with identical prompts share one API call. Returns
+    (feedback, failures): {submission_id: text} and
+    {submission_id: exception} for students that still failed after retries
+    and re-queueing.
+    """
+    scheduler = scheduler or get_scheduler()
+    client = scheduler.client
+    feedback = {}
+    pending = {}
+    for submission_id, prompt in prompts.items():
+        with llm_tags(student=submission_id):
+            cached = cache.get(prompt, client.model, client.generation_config) if cache is not None else None
+        if cached is not None:
+            feedback[submission_id] = cached
+        else:
+            pending.setdefault(prompt, []).append(submission_id)
+
+    # Send each distinct prompt once, keyed by its first student
+    unique = {submission_ids[0]: prompt for prompt, submission_ids in pending.items()}
+    results, errors = await scheduler.run(unique, tag_name="student")
+    failures = {}
+    for first_id, prompt in unique.items():
+        if first_id in results:
+            result = results[first_id]
+            if cache is not None and result:
+                cache.put(prompt, client.model, result, client.generation_config)
+            for submission_id in pending[prompt]:
+                feedback[submission_id] = result
+        else:
+            for submission_id in pending[prompt]:
+                failures[submission_id] = errors[first_id]
+                print(f"Error calling Gemini API for {submission_id}: {errors[first_id]}")
+    return feedback, failures
 
-try:
-    response = requests.post(f"{API_URL}?key={API_KEY}", headers=headers, json=payload)
-    response.raise_for_status()
-    feedback = response.json().get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
+def stream_feedback_fields(processed_data, cache=None, client=None):
+    """
+    Stream structured feedback for one student, yielding (name, value)
+    report fields (see report_model.StreamingReportParser) as each one
+    completes. A cached response is replayed without calling the API; the
+    streamed text is cached only once the whole response parses. Raises
+    report_model.IncompleteReportError if the stream ends before the JSON
+    object closes or without every required field.
+    """
+    client = client or get_client()
+    config = {**client.generation_config, **STRUCTURED_GENERATION_CONFIG}
+    context, _, _ = prepare_compact_llm_context(processed_data)
+    prompt = build_structured_feedback_prompt(context)
+    parser = StreamingReportParser()
+    tags = {"student": processed_data.get("submission_id"), "test": processed_data.get("test_id")}
+
+    with llm_tags(**tags):
+        cached = cache.get(prompt, client.model, config) if cache is not None else None
+    if cached is not None and build_feedback_report(cached, processed_data) is not None:
+        yield from parser.feed(cached)
+        return
+
+    chunks = []
+    start = time.perf_counter()
+    try:
+        for chunk in client.stream_sync(prompt, STRUCTURED_GENERATION_CONFIG):
+            chunks.append(chunk)
+            yield from parser.feed(chunk)
+    except requests.RequestException as e:
+        get_metrics().record(client.model, prompt, "".join(chunks), time.perf_counter() - start, error=e, tags=tags)
+        raise
+    text = "".join(chunks)
+    get_metrics().record(client.model, prompt, text, time.perf_counter() - start, tags=tags)
+    if cache is not None and text and build_feedback_report(text, processed_data) is not None:
+        cache.put(prompt, client.model, text, config)
+    parser.finish()
+
+# --- Offline Batch Jobs ---
+def submit_feedback_batch(prompts, work_dir, backend=None, cache=None):
+    """
+    Write {submission_id: prompt} to JSONL request files and submit them to
+    the batch backend. Prompts already answered in the cache, or in an
+    earlier pass of this run, are skipped. Returns the new job ids.
+    """
+    client = get_client()
+    if cache is not None:
+        prompts = {key: prompt for key, prompt in prompts.items()
+                   if cache.get(prompt, client.model, client.generation_config) is None}
+    run = BatchRun(work_dir, backend or get_batch_backend(client=client))
+    return run.submit(prompts, client)
+
+def collect_feedback_batch(work_dir, prompts=None, backend=None, cache=None):
+    """
+    Ingest finished batch jobs. Returns (feedback, failures, pending_jobs);
+    with prompts and a cache, answers are also stored in the response cache.
+    """
+    client = get_client()
+    run = BatchRun(work_dir, backend or get_batch_backend(client=client))
+    feedback, failures, pending = run.collect()
+    if cache is not None and prompts:
+        for submission_id, text in feedback.items():
+            if submission_id in prompts and text:
+                cache.put(prompts[submission_id], client.model, text, client.generation_config)
+    for submission_id, error in failures.items():
+        print(f"Batch request failed for {submission_id}: {error}")
+    return feedback, failures, pending
+
+# --- Main Execution ---
+def main():
+    prompt = build_feedback_prompt(new_new_performance_data)
+    cache = LLMResponseCache(metrics=get_metrics())
+    feedback = generate_feedback(prompt, cache=cache)
+    print(f"LLM cache: {cache.stats()}")
+    print(f"LLM calls: {get_metrics().summary()}")
+    if feedback is None:
+        print("Feedback was not generated; feedback_output.txt left unchanged")
+        return
     print("Generated Feedback:")
     print(feedback)
-except requests.RequestException as e:
-    print(f"Error calling Gemini API: {e}")
-    feedback = "Failed to generate feedback due to API error."
 
-# Save feedback for PDF generation
-with open("feedback_output.txt", "w") as f:
-    f.write(feedback)
\ No newline at end of file
+    # Save feedback for PDF generation
+    with open("feedback_output.txt", "w") as f:
+        f.write(feedback)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+import json
+import os
+import time
+import uuid
+
+from gemini_client import GeminiClient
+
+# Job states reported by every backend
+PENDING, RUNNING, SUCCEEDED, FAILED = "pending", "running", "succeeded", "failed"
+
+CHECKPOINT_FILE = "checkpoint.json"
+RESULTS_FILE = "results.jsonl"
+
+# --- JSONL Request and Result Files ---
+def write_request_file(prompts, path, client, generation_config=None):
+    """
+    One line per prompt in the Gemini batch format:
+    {"key": submission_id, "request": GenerateContentRequest}.
+    """
+    with open(path, "w") as file:
+        for key, prompt in prompts.items():
+            request = client.build_payload(prompt, generation_config)
+            file.write(json.dumps({"key": key, "request": request}) + "\n")
+    return path
+
+def read_jsonl_entries(path):
+    """
+    Decoded lines of a JSONL file we append to ourselves. Blank lines are
+    skipped and a half-written last line (from an interrupted run) is
+    ignored; a bad line anywhere else still raises.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as file:
+        lines = [line for line in file if line.strip()]
+    entries = []
+    for number, line in enumerate(lines, 1):
+        try:
+            entries.append(json.loads(line))
+        except json.JSONDecodeError:
+            if number == len(lines):
+                break
+            raise
+    return entries
+
+def trim_partial_line(path):
+    """Drop a half-written last line so the next append starts on a line of its own."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as file:
+        data = file.read()
+        if data and not data.endswith(b"\n"):
+            file.truncate(data.rfind(b"\n") + 1)
+
+def read_request_file(path):
+    with open(path, "r") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+def read_result_file(path):
+    """
+    Parse a JSONL result file of {"key", "response"} or {"key", "error"}
+    lines. Returns (results, failures): {key: text} and {key: error}.
+    """
+    results = {}
+    failures = {}
+    with open(path, "r") as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Skipping malformed result line {line_number} in {path}: {e}")
+                continue
+            key = entry.get("key")
+            if "response" in entry:
+                results[key] = GeminiClient.extract_text(entry["response"])
+            else:
+                failures[key] = entry.get("error", "missing response")
+    return results, failures
+
+# --- Batch Backends ---
+class LocalFileBackend:
+    """
+    Stand-in for a hosted batch service. Jobs live in <root>/<job_id>/;
+    status() works through the request file with respond(request) and
+    appends each result line as it goes, so an interrupted job resumes
+    where it stopped. By default respond posts to Gemini (or a mock server)
+    through a GeminiClient.
+    """
+
+    def __init__(self, root=".batch_jobs", respond=None, client=None):
+        self.root = root
+        self.client = client
+        self.respond = respond or self._post
+
+    def _post(self, request):
+        self.client = self.client or GeminiClient()
+        return self.client.post(request)
+
+    def _job_dir(self, job_id):
+        return os.path.join(self.root, job_id)
+
+    def submit(self, request_path):
+        job_id = uuid.uuid4().hex
+        os.makedirs(self._job_dir(job_id))
+        os.replace(request_path, os.path.join(self._job_dir(job_id), "requests.jsonl"))
+        return job_id
+
+    def status(self, job_id):
+        job_dir = self._job_dir(job_id)
+        if not os.path.isdir(job_dir):
+            return FAILED
+        if os.path.exists(os.path.join(job_dir, "done")):
+            return SUCCEEDED
+
+        # Resume after the last complete response of an interrupted run
+        output_path = os.path.join(job_dir, "responses.jsonl")
+        trim_partial_line(output_path)
+        finished = {entry["key"] for entry in read_jsonl_entries(output_path)}
+        with open(output_path, "a") as output:
+            for entry in read_request_file(os.path.join(job_dir, "requests.jsonl")):
+                if entry["key"] in finished:
+                    continue
+                try:
+                    result = {"key": entry["key"], "response": self.respond(entry["request"])}
+                except Exception as e:
+                    result = {"key": entry["key"], "error": str(e)}
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+        open(os.path.join(job_dir, "done"), "w").close()
+        return SUCCEEDED
+
+    def download_results(self, job_id, path):
+        with open(os.path.join(self._job_dir(job_id), "responses.jsonl"), "rb") as source, open(path, "wb") as target:
+            target.write(source.read())
+        return path
+
+class GeminiBatchBackend:
+    """Gemini Batch API: upload the request file, create a batch job, poll, download."""
+
+    _STATES = {
+        "BATCH_STATE_PENDING": PENDING,
+        "BATCH_STATE_RUNNING": RUNNING,
+        "BATCH_STATE_SUCCEEDED": SUCCEEDED,
+        "BATCH_STATE_FAILED": FAILED,
+        "BATCH_STATE_CANCELLED": FAILED,
+        "BATCH_STATE_EXPIRED": FAILED
+    }
+
+    def __init__(self, client=None):
+        self.client = client or GeminiClient()
+        root = self.client.base_url.rsplit("/models", 1)[0]
+        self.api_url = root
+        self.upload_url = root.replace("/v1beta", "/upload/v1beta")
+        self.download_url = root.replace("/v1beta", "/download/v1beta")
+
+    def _upload(self, request_path):
+        session = self.client.session
+        size = os.path.getsize(request_path)
+        start = session.post(
+            f"{self.upload_url}/files",
+            headers={
+                "X-Goog-Upload-Protocol": "resumable",
+                "X-Goog-Upload-Command": "start",
+                "X-Goog-Upload-Header-Content-Length": str(size),
+                "X-Goog-Upload-Header-Content-Type": "application/jsonl"
+            },
+            json={"file": {"display_name": os.path.basename(request_path)}},
+            timeout=self.client.timeout
+        )
+        start.raise_for_status()
+        with open(request_path, "rb") as file:
+            upload = session.post(
+                start.headers["X-Goog-Upload-URL"],
+                headers={"X-Goog-Upload-Offset": "0", "X-Goog-Upload-Command": "upload, finalize"},
+                data=file,
+                timeout=self.client.timeout
+            )
+        upload.raise_for_status()
+        return upload.json()["file"]["name"]
+
+    def submit(self, request_path):
+        file_name = self._upload(request_path)
+        response = self.client.session.post(
+            f"{self.client.base_url}/{self.client.model}:batchGenerateContent",
+            json={"batch": {"display_name": os.path.basename(request_path), "input_config": {"file_name": file_name}}},
+            timeout=self.client.timeout
+        )
+        response.raise_for_status()
+        return response.json()["name"]
+
+    def _get(self, job_id):
+        response = self.client.session.get(f"{self.api_url}/{job_id}", timeout=self.client.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def status(self, job_id):
+        state = self._get(job_id).get("metadata", {}).get("state", "BATCH_STATE_PENDING")
+        return self._STATES.get(state, PENDING)
+
+    def download_results(self, job_id, path):
+        file_name = self._get(job_id)["response"]["responsesFile"]
+        response = self.client.session.get(f"{self.download_url}/{file_name}:download", params={"alt": "media"},
+                                           timeout=self.client.timeout, stream=True)
+        response.raise_for_status()
+        with open(path, "wb") as file:
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                file.write(chunk)
+        return path
+
+def get_batch_backend(name=None, client=None):
+    """Backend named by name or the BATCH_BACKEND env var ("gemini" or "local")."""
+    name = name or os.getenv("BATCH_BACKEND", "gemini")
+    if name == "local":
+        return LocalFileBackend(client=client)
+    if name == "gemini":
+        return GeminiBatchBackend(client=client)
+    raise ValueError(f"Unknown batch backend: {name}")
+
+# --- Checkpointed Batch Runs ---
+class BatchRun:
+    """
+    Tracks one cohort run in work_dir: submitted jobs and their keys live
+    in checkpoint.json, ingested answers accumulate in results.jsonl. A
+    restarted run skips keys that are already answered or in flight.
+    """
+
+    def __init__(self, work_dir, backend):
+        self.work_dir = work_dir
+        self.backend = backend
+        os.makedirs(work_dir, exist_ok=True)
+        self.checkpoint_path = os.path.join(work_dir, CHECKPOINT_FILE)
+        self.results_path = os.path.join(work_dir, RESULTS_FILE)
+        self.jobs = {}
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, "r") as file:
+                self.jobs = json.load(file)["jobs"]
+
+    def _save(self):
+        temp_path = self.checkpoint_path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump({"jobs": self.jobs}, file)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def answered(self):
+        """
+        {key: text} for every answer ingested so far. Blank lines are
+        skipped, and a half-written last line (from an interrupted run)
+        counts as not yet answered.
+        """
+        return {entry["key"]: entry["text"] for entry in read_jsonl_entries(self.results_path)}
+
+    def submit(self, prompts, client, generation_config=None, max_requests_per_job=10_000):
+        """Submit prompts not yet answered or in flight; returns the new job ids."""
+        in_flight = {key for job in self.jobs.values() if not job["ingested"] for key in job["keys"]}
+        done = self.answered()
+        todo = {key: prompt for key, prompt in prompts.items() if key not in done and key not in in_flight}
+        keys = list(todo)
+        job_ids = []
+        for start in range(0, len(keys), max_requests_per_job):
+            chunk = {key: todo[key] for key in keys[start:start + max_requests_per_job]}
+            request_path = os.path.join(self.work_dir, f"requests-{int(time.time())}-{start}.jsonl")
+            write_request_file(chunk, request_path, client, generation_config)
+            job_id = self.backend.submit(request_path)
+            self.jobs[job_id] = {"keys": list(chunk), "ingested": False}
+            self._save()
+            job_ids.append(job_id)
+        return job_ids
+
+    def collect(self):
+        """
+        Ingest every finished job. Returns (results, failures, pending):
+        all answers so far, {key: error} from this pass, and job ids still running.
+        """
+        failures = {}
+        pending = []
+        for job_id, job in self.jobs.items():
+            if job["ingested"]:
+                continue
+            state = self.backend.status(job_id)
+            if state in (PENDING, RUNNING):
+                pending.append(job_id)
+                continue
+            if state == FAILED:
+                print(f"Batch job {job_id} failed; its {len(job['keys'])} requests can be resubmitted")
+                failures.update({key: "batch job failed" for key in job["keys"]})
+            else:
+                result_path = self.backend.download_results(job_id, os.path.join(self.work_dir, f"results-{os.path.basename(job_id)}.jsonl"))
+                results, job_failures = read_result_file(result_path)
+                trim_partial_line(self.results_path)
+                with open(self.results_path, "a") as file:
+                    for key, text in results.items():
+                        file.write(json.dumps({"key": key, "text": text}) + "\n")
+                failures.update(job_failures)
+            job["ingested"] = True
+            self._save()
+        return self.answered(), failures, pending
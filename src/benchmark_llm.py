@@ -0,0 +1,127 @@
+import argparse
+import asyncio
+import time
+
+import numpy as np
+import requests
+
+from gemini_client import GeminiClient
+from llm_cache import LLMResponseCache, SQLiteStore, prompt_key
+from llm_metrics import LLMMetrics
+from llm_scheduler import RateLimitedScheduler, RetryPolicy
+from mock_gemini_server import MockConfig, start_mock_server
+
+# --- Benchmark ---
+async def run_benchmark(scheduler, prompts, cache=None):
+    """
+    Send every prompt through the scheduler (and the response cache, if
+    given). Identical prompts already in flight share one request, as in a
+    cohort run. Returns (latencies, failures, elapsed) with per-request
+    latency including queueing, retries and backoff.
+    """
+    client = scheduler.client
+    latencies = []
+    failures = 0
+    in_flight = {}
+
+    async def fetch(prompt):
+        text = await scheduler.generate(prompt)
+        if cache is not None:
+            cache.put(prompt, client.model, text)
+        return text
+
+    async def one(prompt):
+        nonlocal failures
+        start = time.perf_counter()
+        try:
+            if cache is not None and cache.get(prompt, client.model) is not None:
+                return
+            key = prompt_key(prompt, client.model)
+            task = in_flight.get(key)
+            if task is None:
+                task = in_flight[key] = asyncio.ensure_future(fetch(prompt))
+                task.add_done_callback(lambda _: in_flight.pop(key, None))
+            await task
+        except requests.RequestException:
+            failures += 1
+            return
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(prompt) for prompt in prompts))
+    return latencies, failures, time.perf_counter() - start
+
+def summarize(latencies, failures, elapsed, scheduler):
+    latencies = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (0, 0, 0)
+    return {
+        "requests": len(latencies),
+        "failures": failures,
+        "elapsed_s": round(elapsed, 2),
+        "requests_per_s": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(float(p50), 1),
+        "p95_ms": round(float(p95), 1),
+        "p99_ms": round(float(p99), 1),
+        "retries": scheduler.retries,
+        "rate_limited": scheduler.rate_limited
+    }
+
+# --- Main Execution ---
+def main():
+    parser = argparse.ArgumentParser(description="Throughput benchmark for the Gemini client, scheduler and cache")
+    parser.add_argument("--url", default=None, help="API base URL; starts a local mock server when omitted")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rpm", type=int, default=6000, help="scheduler requests-per-minute budget")
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--prompt-chars", type=int, default=4000)
+    parser.add_argument("--distinct", type=int, default=None, help="distinct prompts (repeats exercise the cache)")
+    parser.add_argument("--cache", default=None, help="SQLite path for the LLM response cache")
+    parser.add_argument("--latency", type=float, default=0.5, help="mock median latency in seconds")
+    parser.add_argument("--sigma", type=float, default=0.3)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--mock-rpm", type=int, default=None)
+    parser.add_argument("--response-chars", type=int, default=2000)
+    parser.add_argument("--metrics-log", default=None, help="JSONL file for per-call LLM metrics")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        server = start_mock_server(MockConfig(
+            latency_median=args.latency, latency_sigma=args.sigma, error_rate=args.error_rate,
+            rate_limit_rate=args.rate_limit_rate, rate_limit_rpm=args.mock_rpm,
+            retry_after=0.5, response_chars=args.response_chars
+        ))
+        base_url = server.base_url
+        print(f"Started mock Gemini API at {base_url}")
+
+    client = GeminiClient(api_key="benchmark" if server else None, base_url=base_url, max_concurrency=args.concurrency)
+    metrics = LLMMetrics(args.metrics_log)
+    scheduler = RateLimitedScheduler(
+        client,
+        requests_per_minute=args.rpm,
+        retry_policy=RetryPolicy(max_retries=args.max_retries, base_delay=0.2, max_delay=5.0),
+        metrics=metrics
+    )
+    cache = LLMResponseCache(SQLiteStore(args.cache), metrics=metrics) if args.cache else None
+    distinct = args.distinct or args.requests
+    prompts = [f"Student {i % distinct}: " + "x" * args.prompt_chars for i in range(args.requests)]
+
+    latencies, failures, elapsed = asyncio.run(run_benchmark(scheduler, prompts, cache))
+    print(summarize(latencies, failures, elapsed, scheduler))
+    if cache is not None:
+        # Second pass measures a rerun served from the cache
+        latencies, failures, elapsed = asyncio.run(run_benchmark(scheduler, prompts, cache))
+        print(f"Warm cache: {summarize(latencies, failures, elapsed, scheduler)}")
+        print(f"LLM cache: {cache.stats()}")
+    print(f"LLM calls: {metrics.summary()}")
+    if server is not None:
+        print(f"Mock server: {server.counts}")
+        server.shutdown()
+    client.close()
+
+if __name__ == "__main__":
+    main()
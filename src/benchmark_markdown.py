@@ -0,0 +1,117 @@
+import argparse
+import re
+import time
+import unicodedata
+
+from feedback_markdown import tokenize_feedback
+
+SECTION_TITLES = ['Overall Performance', 'Motivating Introduction', 'Performance Breakdown',
+                  'Time vs. Accuracy Insights', 'Chapter-wise Concept Analysis', 'Actionable Suggestions']
+
+# --- Legacy Path (clean_document_content plus create_styled_pdf's per-paragraph regexes) ---
+def _drop_separator_rows(table_data):
+    return [row for row in table_data if not all(cell.strip().startswith('-') and len(cell.strip()) > 1 for cell in row)]
+
+def legacy_clean_document_content(content):
+    cleaned_content = content.replace('*', '')
+    output_lines = []
+    in_table = False
+    table_data = []
+    table_count = 0
+    for line in cleaned_content.split('\n'):
+        line = line.strip()
+        if not line:
+            if in_table and table_data:
+                table_data = _drop_separator_rows(table_data)
+                if table_data:
+                    table_count += 1
+                    output_lines.append({'type': 'table', 'data': table_data, 'table_type': 'subject' if table_count == 1 else 'difficulty'})
+                table_data = []
+                in_table = False
+            continue
+        if line.startswith('|'):
+            in_table = True
+            table_data.append([cell.strip() for cell in line.split('|')[1:-1]])
+            continue
+        if in_table:
+            in_table = False
+            table_data = _drop_separator_rows(table_data)
+            if table_data:
+                table_count += 1
+                output_lines.append({'type': 'table', 'data': table_data, 'table_type': 'subject' if table_count == 1 else 'difficulty'})
+            table_data = []
+        output_lines.append({'type': 'text', 'content': line})
+    if table_data:
+        table_data = _drop_separator_rows(table_data)
+        if table_data:
+            output_lines.append({'type': 'table', 'data': table_data, 'table_type': 'difficulty'})
+    return output_lines
+
+def legacy_paragraph_text(items):
+    """The regex work create_styled_pdf used to do on each text line, without layout."""
+    pieces = []
+    section = None
+    for item in items:
+        if item['type'] != 'text':
+            continue
+        content = item['content']
+        if content in SECTION_TITLES:
+            section = content
+            continue
+        if section == 'Time vs. Accuracy Insights':
+            cleaned = re.sub(r'^\s*[-•]|\$\s*\\cdot\s*\d*\s*', '', content).strip()
+            cleaned = re.sub(r'\s+', ' ', cleaned.replace('\n', ' ')).strip()
+            pieces.extend(s.strip() for s in re.split(r'(?<!\d)\.(?!\d)', cleaned) if s.strip())
+            continue
+        if section != 'Actionable Suggestions':
+            pieces.append(content)
+            continue
+        cleaned = unicodedata.normalize('NFKD', content)
+        cleaned = re.sub(r'[^\x20-\x7E]', '', cleaned)
+        cleaned = re.sub(r'^\s*[-•]|\$\s*\\cdot\s*\d*\s*', '', cleaned).strip()
+        pieces.extend(s.strip() for s in re.split(r'\s*\d+\s*(?=\n)', cleaned) if s.strip())
+    return pieces
+
+def legacy_path(content):
+    return legacy_paragraph_text(legacy_clean_document_content(content))
+
+def tokenizer_path(content):
+    """Tokenize, then split paragraphs into sentences where create_styled_pdf does."""
+    pieces = []
+    section = None
+    for block in tokenize_feedback(content):
+        if block.kind == "heading":
+            section = block.text
+        elif block.kind == "paragraph":
+            pieces.extend(block.sentences if section == 'Time vs. Accuracy Insights' else [block.text])
+    return pieces
+
+# --- Benchmark ---
+def time_path(path, content, runs):
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        path(content)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the markdown tokenizer with the legacy cleaning path")
+    parser.add_argument("feedback", help="feedback markdown file")
+    parser.add_argument("--sizes", default="1,10,100,1000", help="comma-separated document repeat counts")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.feedback, "r") as file:
+        document = file.read()
+
+    print(f"{'repeat':>7} {'KB':>8} {'legacy ms':>10} {'tokenizer ms':>13} {'speedup':>8} {'tokenizer MB/s':>15}")
+    for repeat in (int(size) for size in args.sizes.split(",")):
+        content = "\n\n".join([document] * repeat)
+        legacy = time_path(legacy_path, content, args.runs)
+        tokenizer = time_path(tokenizer_path, content, args.runs)
+        print(f"{repeat:>7} {len(content) / 1024:>8.0f} {legacy * 1000:>10.2f} {tokenizer * 1000:>13.2f} "
+              f"{legacy / tokenizer:>7.1f}x {len(content) / tokenizer / 1e6:>15.1f}")
+
+if __name__ == "__main__":
+    main()
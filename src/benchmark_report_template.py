@@ -0,0 +1,62 @@
+import argparse
+import contextlib
+import io
+import json
+import time
+import timeit
+
+import numpy as np
+
+import pdf_generation
+from report_template import ReportTemplate, get_report_template
+
+# --- Benchmark ---
+def render_many(blocks, chart_data, count, chart_backend):
+    """
+    Build count PDFs into memory per mode, alternating a fresh ReportTemplate
+    with the per-process one so machine noise hits both equally.
+    Returns per-report seconds for (rebuilt, reused).
+    """
+    timings = {ReportTemplate: [], get_report_template: []}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(count):
+            for template_factory, runs in timings.items():
+                start = time.perf_counter()
+                pdf_generation.create_styled_pdf(blocks, chart_data, io.BytesIO(), chart_backend=chart_backend,
+                                                 template=template_factory())
+                runs.append(time.perf_counter() - start)
+    return np.array(timings[ReportTemplate]), np.array(timings[get_report_template])
+
+def describe(name, timings):
+    return (f"{name:>10}: {len(timings)} reports, {timings.sum():.2f}s total, "
+            f"mean {timings.mean() * 1000:.2f} ms, p50 {np.median(timings) * 1000:.2f} ms")
+
+# --- Main Execution ---
+def main():
+    parser = argparse.ArgumentParser(description="Per-report cost of rebuilding vs reusing the report template")
+    parser.add_argument("submission", help="submission analysis JSON")
+    parser.add_argument("feedback", help="feedback markdown file")
+    parser.add_argument("--reports", type=int, default=2000)
+    parser.add_argument("--chart-backend", choices=pdf_generation.CHART_BACKENDS, default="vector")
+    args = parser.parse_args()
+
+    with open(args.submission, "r") as file:
+        processed_data = pdf_generation.process_data(json.load(file))
+    chart_data = pdf_generation.extract_chart_data(processed_data)
+    with open(args.feedback, "r") as file:
+        blocks = pdf_generation.clean_document_content(file.read())
+
+    # Warm imports, fonts and the chart cache so both runs measure layout only
+    render_many(blocks, chart_data, 3, args.chart_backend)
+
+    rebuilt, reused = render_many(blocks, chart_data, args.reports, args.chart_backend)
+    build = timeit.timeit(ReportTemplate, number=200) / 200
+    print(f"Template build: {build * 1000:.3f} ms")
+    print(describe("rebuilt", rebuilt))
+    print(describe("reused", reused))
+    saving = rebuilt.mean() - reused.mean()
+    print(f"Saving: {saving * 1000:.2f} ms per report ({saving / rebuilt.mean():.1%}), "
+          f"{saving * args.reports:.1f}s over {args.reports} reports")
+
+if __name__ == "__main__":
+    main()
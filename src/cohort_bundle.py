@@ -0,0 +1,116 @@
+import argparse
+import contextlib
+import io
+import os
+import time
+from xml.sax.saxutils import escape
+
+from reportlab.lib.units import inch
+from reportlab.platypus import Flowable, PageBreak, Paragraph, Spacer
+
+import pdf_generation
+from dataPreprocessing import load_json_data
+from report_template import get_report_template
+from result_cache import ResultCache
+
+# --- Bookmarks ---
+class StudentBookmark(Flowable):
+    """Zero-size marker that starts a student's section: a named destination plus an outline entry."""
+
+    def __init__(self, key, title):
+        super().__init__()
+        self.key = key
+        self.title = title
+        self.width = self.height = 0
+
+    def wrap(self, available_width, available_height):
+        return 0, 0
+
+    def draw(self):
+        self.canv.bookmarkPage(self.key)
+        self.canv.addOutlineEntry(self.title, self.key, level=0)
+
+# --- Bundle ---
+def create_cohort_bundle(students, output_filename='cohort_reports.pdf', title="Class Reports",
+                         cache=None, chart_backend=None, template=None):
+    """
+    Every student's report in one PDF built with a single doc.build pass.
+    students is a list of (name, blocks, chart_data). The first page lists
+    the students as links, each report starts with an outline bookmark and
+    gets its own heading flowables from the template, and identical charts
+    are stored once and shared (see SharedChart).
+    Returns True once the PDF is written.
+    """
+    template = template or get_report_template()
+    styles = template.styles
+    doc = template.doc(output_filename)
+    doc.title = title
+
+    story = [Paragraph(escape(title), styles["main_title"]), Spacer(1, 0.08*inch),
+             Paragraph("Contents", styles["section_title"])]
+    for index, (name, _, _) in enumerate(students):
+        story.append(Paragraph(f'<a href="#student-{index}" color="blue">{escape(name)}</a>', styles["list"]))
+
+    for index, (name, blocks, chart_data) in enumerate(students):
+        story.append(PageBreak())
+        story.append(StudentBookmark(f"student-{index}", name))
+        story.append(Paragraph(escape(name), styles["subheading"]))
+        story.extend(pdf_generation.build_styled_story(blocks, chart_data, template, cache, chart_backend))
+
+    return pdf_generation._build_pdf(doc, story, output_filename)
+
+# --- Main Execution ---
+def main():
+    parser = argparse.ArgumentParser(description="Build one PDF holding every student's report")
+    parser.add_argument("export", help="JSON export with one or more submissions")
+    parser.add_argument("feedback_dir", help="directory of feedback text files named <submission_id>.txt")
+    parser.add_argument("--output", default="cohort_reports.pdf")
+    parser.add_argument("--chart-backend", choices=pdf_generation.CHART_BACKENDS, default=None)
+    parser.add_argument("--repeat", type=int, default=1, help="include each submission this many times (benchmarking)")
+    parser.add_argument("--compare", action="store_true", help="also build separate PDFs and compare size and time")
+    args = parser.parse_args()
+
+    json_data = load_json_data(args.export)
+    if not json_data:
+        print("Failed to load JSON file")
+        return
+    if isinstance(json_data, dict):
+        json_data = [json_data]
+
+    cache = ResultCache()
+    students = []
+    missing = []
+    for submission_id, (_, chart_data) in pdf_generation.extract_batch_chart_data(json_data, cache=cache).items():
+        blocks = pdf_generation.load_feedback_blocks(args.feedback_dir, submission_id)
+        if blocks is None:
+            missing.append(submission_id)
+            continue
+        for i in range(args.repeat):
+            students.append((submission_id if args.repeat == 1 else f"{submission_id}-{i}", blocks, chart_data))
+    if missing:
+        print(f"No feedback file in {args.feedback_dir} for: {', '.join(missing)}")
+        print("Cohort bundle not built")
+        return
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        ok = create_cohort_bundle(students, args.output, cache=cache, chart_backend=args.chart_backend)
+    if not ok:
+        print("Failed to build the cohort bundle")
+        return
+    elapsed = time.perf_counter() - start
+    print(f"Bundle: {len(students)} reports, {os.path.getsize(args.output) / 1024:.0f} KB in {elapsed:.2f}s")
+
+    if args.compare:
+        total_bytes = 0
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _, student_blocks, chart_data in students:
+                buffer = io.BytesIO()
+                pdf_generation.create_styled_pdf(student_blocks, chart_data, buffer, cache=cache, chart_backend=args.chart_backend)
+                total_bytes += len(buffer.getvalue())
+        elapsed = time.perf_counter() - start
+        print(f"Separate: {len(students)} reports, {total_bytes / 1024:.0f} KB in {elapsed:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,29 @@
+import hashlib
 import json
+import os
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+
+from aggregation import aggregate_performance
+from fact_table import QuestionFactsBuilder, QuestionRecords
+from syllabus import get_test_scope
+
+# Map sections to subjects
+section_subject_map = {
+    "Physics Single Correct": "Physics",
+    "Physics Numerical": "Physics",
+    "Chemistry Single Correct": "Chemistry",
+    "Chemistry Numerical": "Chemistry",
+    "Mathematics Single Correct": "Mathematics",
+    "Mathematics Numerical": "Mathematics"
+}
+
+# Subject ID to name mapping
+subject_map = {
+    "607018ee404ae53194e73d92": "Physics",
+    "607018ee404ae53194e73d90": "Chemistry",
+    "607018ee404ae53194e73d91": "Mathematics"
+}
 
 # --- Load JSON Data ---
 def load_json_data(file_path):
@@ -10,54 +34,96 @@ def load_json_data(file_path):
         print(f"Error loading JSON: {e}")
         return None
 
-# --- Process Data ---
-def process_data(json_data):
-    if not json_data or not isinstance(json_data, list):
-        print("Invalid JSON data")
-        return None
+# --- Stream Submissions ---
+def _drop_question_text(obj):
+    # questionId.question holds the rendered question HTML, by far the largest
+    # field of a record and never read by the analysis
+    if "level" in obj and isinstance(obj.get("question"), dict):
+        del obj["question"]
+    return obj
+
+def iter_submissions(file_path, keep_question_text=False, chunk_size=1 << 20):
+    """
+    Yield submissions one at a time from an export holding a JSON array,
+    reading the file in chunks so that only the current submission is in
+    memory. Question text is dropped while decoding unless keep_question_text.
+    """
+    decoder = json.JSONDecoder(object_hook=None if keep_question_text else _drop_question_text)
+    with open(file_path, 'r') as file:
+        buffer, pos, eof = "", 0, False
+        started = False
+        while True:
+            # Skip whitespace, reading ahead when the buffer runs dry
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    break
+                buffer, pos = file.read(chunk_size), 0
+                eof = not buffer
+
+            if pos >= len(buffer):
+                if started:
+                    raise ValueError(f"Unexpected end of file in {file_path}")
+                return
+
+            char = buffer[pos]
+            if not started:
+                if char != '[':
+                    raise ValueError(f"Expected a JSON array of submissions in {file_path}")
+                started = True
+                pos += 1
+                continue
+            if char == ']':
+                return
+            if char == ',':
+                pos += 1
+                continue
 
+            # Decode one submission, growing the buffer until it is complete
+            while True:
+                try:
+                    submission, pos = decoder.raw_decode(buffer, pos)
+                    break
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    # Read at least as much as is already buffered so a large
+                    # submission is re-decoded a logarithmic number of times
+                    chunk = file.read(max(chunk_size, len(buffer) - pos))
+                    eof = not chunk
+                    buffer, pos = buffer[pos:] + chunk, 0
+
+            yield submission
+
+            # Release the text of submissions already decoded
+            if pos >= chunk_size:
+                buffer, pos = buffer[pos:], 0
+
+def get_submission_id(data, default=""):
+    return data.get("_id", {}).get("$oid", default)
+
+# --- Process a Single Submission ---
+def process_submission(data):
+    """
+    Aggregate one submission record.
+    Returns (processed_data, concept_stats, debug_counts); the question fact
+    table and its PerformanceAggregates are kept in processed_data under
+    "question_facts" and "aggregates".
+    """
     # Initialize data structure
     processed_data = {
+        "submission_id": get_submission_id(data),
+        "test_id": data.get("test", {}).get("_id", {}).get("$oid", ""),
         "overall_summary": {},
         "subject_summary": defaultdict(dict),
         "chapter_details": defaultdict(dict)
     }
-    chapter_stats = defaultdict(lambda: {
-        "questions_total": 0,
-        "answered": 0,
-        "correct": 0,
-        "incorrect": 0,
-        "marked_review": 0,
-        "not_answered": 0,
-        "total_time_seconds": 0,
-        "difficulty_counts": defaultdict(int)
-    })
-
-    # Initialize concept stats per chapter
-    concept_stats = defaultdict(lambda: defaultdict(lambda: {"total": 0, "correct": 0, "incorrect": 0}))
-
-    # Map sections to subjects
-    section_subject_map = {
-        "Physics Single Correct": "Physics",
-        "Physics Numerical": "Physics",
-        "Chemistry Single Correct": "Chemistry",
-        "Chemistry Numerical": "Chemistry",
-        "Mathematics Single Correct": "Mathematics",
-        "Mathematics Numerical": "Mathematics"
-    }
-
-    # Subject ID to name mapping
-    subject_map = {
-        "607018ee404ae53194e73d92": "Physics",
-        "607018ee404ae53194e73d90": "Chemistry",
-        "607018ee404ae53194e73d91": "Mathematics"
-    }
 
-    # Debug: Track questions per chapter
-    debug_counts = defaultdict(list)
+    # One row per in-scope question; every summary is derived from it
+    facts_builder = QuestionFactsBuilder()
 
     # Process overall summary
-    data = json_data[0]
     processed_data["overall_summary"] = {
         "total_marks_scored": data.get("totalMarkScored", 0),
         "total_marks_possible": data.get("totalMarks", 300),
@@ -84,6 +150,9 @@ def process_data(json_data):
             "avg_time_per_attempted_q_seconds": (subject.get("totalTimeTaken", 0) / subject.get("totalAttempted", 0)) if subject.get("totalAttempted", 0) > 0 else 0
         }
 
+    # Chapters in scope for this test, parsed once per test
+    scoped_chapters, scoped_subjects = get_test_scope(data.get("test", {}))
+
     # Process sections and questions
     for section in data.get("sections", []):
         section_title = section.get("sectionId", {}).get("title", "")
@@ -96,28 +165,13 @@ def process_data(json_data):
             level = question.get("questionId", {}).get("level", "unknown")
             concepts = [concept.get("title", "Unknown") for concept in question.get("questionId", {}).get("concepts", [])]
 
-            # Filter for specified chapters
-            if (subject == "Physics" and chapter not in ["Electrostatics", "Capacitance"]) or \
-               (subject == "Chemistry" and chapter not in ["Solutions", "Electrochemistry"]) or \
-               (subject == "Mathematics" and chapter not in ["Functions", "Sets and Relations"]):
+            # Filter for chapters in the test syllabus
+            if subject in scoped_subjects and (subject, chapter) not in scoped_chapters:
                 continue
 
-            # Update chapter stats
-            chapter_stats[(subject, chapter)]["questions_total"] += 1
-            chapter_stats[(subject, chapter)]["total_time_seconds"] += time_taken
-            chapter_stats[(subject, chapter)]["difficulty_counts"][level] += 1
-
-            # Debug: Log question details
-            debug_info = {
-                "status": status,
-                "time_taken": time_taken,
-                "level": level,
-                "concepts": concepts
-            }
-
+            # Check correctness
+            is_correct = None
             if status == "answered":
-                chapter_stats[(subject, chapter)]["answered"] += 1
-                # Check correctness
                 is_correct = False
                 marked_options = question.get("markedOptions", [])
                 input_value = question.get("inputValue", {})
@@ -127,32 +181,18 @@ def process_data(json_data):
                 elif input_value.get("value") is not None:
                     is_correct = input_value.get("isCorrect", False)
 
-                if is_correct:
-                    chapter_stats[(subject, chapter)]["correct"] += 1
-                    debug_info["correct"] = True
-                else:
-                    chapter_stats[(subject, chapter)]["incorrect"] += 1
-                    debug_info["correct"] = False
-
-                # Update concept stats
-                for concept in concepts:
-                    concept_stats[(subject, chapter)][concept]["total"] += 1
-                    if is_correct:
-                        concept_stats[(subject, chapter)][concept]["correct"] += 1
-                    else:
-                        concept_stats[(subject, chapter)][concept]["incorrect"] += 1
-            elif status == "markedReview":
-                chapter_stats[(subject, chapter)]["marked_review"] += 1
-            elif status == "notAnswered":
-                chapter_stats[(subject, chapter)]["not_answered"] += 1
-
-            debug_counts[(subject, chapter)].append(debug_info)
-
-    # Calculate chapter stats
-    for (subject, chapter), stats in chapter_stats.items():
-        stats["accuracy_on_answered_percent"] = (stats["correct"] / stats["answered"] * 100) if stats["answered"] > 0 else 0.0
-        stats["avg_time_per_answered_q_seconds"] = (stats["total_time_seconds"] / stats["answered"]) if stats["answered"] > 0 else 0.0
-        processed_data["chapter_details"][subject][chapter] = stats
+            facts_builder.add(subject, chapter, level, status, is_correct, time_taken,
+                              question.get("timeLeftWhenAttempted"), concepts)
+
+    facts = facts_builder.build()
+    processed_data["question_facts"] = facts
+
+    # Single aggregation pass over the questions; every rollup comes from it
+    aggregates = aggregate_performance(facts)
+    processed_data["aggregates"] = aggregates
+    processed_data["chapter_details"] = aggregates.chapter_details()
+    concept_stats = aggregates.concept_stats()
+    debug_counts = QuestionRecords(facts)
 
     # Calculate total questions per subject
     subject_questions = defaultdict(int)
@@ -163,6 +203,19 @@ def process_data(json_data):
     # Calculate total questions in paper
     processed_data["overall_summary"]["total_questions_calculated"] = sum(subject_questions.values())
 
+    return processed_data, concept_stats, debug_counts
+
+# --- Process Data ---
+def process_data(json_data):
+    if not json_data or not isinstance(json_data, list):
+        print("Invalid JSON data")
+        return None
+
+    if len(json_data) > 1:
+        print(f"Note: {len(json_data)} submissions found, processing the first one only (use process_batch for all)")
+
+    processed_data, concept_stats, debug_counts = process_submission(json_data[0])
+
     # Debug: Print question counts
     print("\n=== Debug: Question Counts per Chapter ===")
     for (subject, chapter), questions in debug_counts.items():
@@ -182,18 +235,130 @@ def process_data(json_data):
 
     return processed_data
 
+# --- Cached Processing ---
+def submission_fingerprint(data):
+    """
+    SHA-256 of only the fields process_submission reads, so the cache key
+    skips the question HTML and avoids serialising the whole record.
+    """
+    test = data.get("test", {})
+    parts = [
+        test.get("_id", {}).get("$oid", ""), test.get("totalQuestions"), test.get("syllabus"),
+        data.get("totalMarkScored"), data.get("totalMarks"), data.get("totalTimeTaken"),
+        data.get("totalAttempted"), data.get("totalCorrect"), data.get("accuracy")
+    ]
+    for subject in data.get("subjects", []):
+        parts.append((subject.get("subjectId", {}).get("$oid"), subject.get("totalMarkScored"), subject.get("totalMarks"),
+                      subject.get("totalTimeTaken"), subject.get("totalAttempted"), subject.get("totalCorrect"),
+                      subject.get("accuracy")))
+    for section in data.get("sections", []):
+        parts.append(section.get("sectionId", {}).get("title"))
+        for question in section.get("questions", []):
+            question_id = question.get("questionId", {})
+            parts.append((
+                [chapter.get("title") for chapter in question_id.get("chapters", [])[:1]],
+                question_id.get("level"),
+                [concept.get("title") for concept in question_id.get("concepts", [])],
+                question.get("status"), question.get("timeTaken"), question.get("timeLeftWhenAttempted"),
+                [option.get("isCorrect") for option in question.get("markedOptions", [])],
+                question.get("inputValue", {}).get("value") is not None, question.get("inputValue", {}).get("isCorrect")
+            ))
+    return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()
+
+def process_submission_cached(submission_id, data, cache=None):
+    """
+    process_submission through the on-disk ResultCache, keyed by the
+    submission id and its submission_fingerprint.
+    """
+    if cache is None:
+        return process_submission(data)
+
+    key = cache.make_key(submission_id, submission_fingerprint(data))
+    result = cache.get_object("aggregates", key)
+    if result is None:
+        result = process_submission(data)
+        cache.put_object("aggregates", key, result)
+    return result
+
+# --- Batch Processing ---
+def _process_keyed(item):
+    submission_id, data, cache = item
+    return submission_id, process_submission_cached(submission_id, data, cache)
+
+def _collect_results(keyed_results):
+    results = {}
+    for submission_id, result in keyed_results:
+        if submission_id in results:
+            print(f"Warning: duplicate submission id {submission_id}, keeping the last one")
+        results[submission_id] = result
+    return results
+
+def process_batch(json_data, max_workers=None, chunksize=None, cache=None):
+    """
+    Aggregate every submission in an export and return
+    {submission_id: (processed_data, concept_stats, debug_counts)}.
+    Work is spread over a process pool; small exports run inline.
+    Pass a ResultCache to reuse results for unchanged submissions.
+    """
+    if not json_data or not isinstance(json_data, list):
+        print("Invalid JSON data")
+        return {}
+
+    # Submissions without an _id fall back to their position in the export
+    items = [(get_submission_id(data, default=str(index)), data, cache) for index, data in enumerate(json_data)]
+
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or len(items) == 1:
+        return _collect_results(map(_process_keyed, items))
+
+    # Large chunks amortise the per-task pickling overhead across the pool
+    if chunksize is None:
+        chunksize = max(1, len(items) // (max_workers * 4))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return _collect_results(executor.map(_process_keyed, items, chunksize=chunksize))
+
+def iter_process_batch(submissions, max_workers=None, max_pending=None, cache=None):
+    """
+    Streaming variant of process_batch for any iterable of submissions
+    (e.g. iter_submissions). Yields (submission_id, result) as soon as each
+    submission is aggregated, in completion order, keeping at most
+    max_pending submissions in flight.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1:
+        for index, data in enumerate(submissions):
+            yield _process_keyed((get_submission_id(data, default=str(index)), data, cache))
+        return
+
+    max_pending = max_pending or max_workers * 2
+    pending = set()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for index, data in enumerate(submissions):
+            pending.add(executor.submit(_process_keyed, (get_submission_id(data, default=str(index)), data, cache)))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in as_completed(pending):
+            yield future.result()
+
 # --- Main Execution ---
-file_path = "/content/sample_submission_analysis_1.json"
-json_data = load_json_data(file_path)
-if json_data:
-    result = process_data(json_data)
-    if result:
-        import pprint
-        print("\n=== Overall Summary ===")
-        pprint.pprint(result["overall_summary"])
-        print("\n=== Subject Summary ===")
-        pprint.pprint(dict(result["subject_summary"]))
-        print("\n=== Corrected Chapter Details ===")
-        pprint.pprint(dict(result["chapter_details"]))
-else:
-    print("Failed to load JSON file")
\ No newline at end of file
+def main():
+    file_path = "/content/sample_submission_analysis_1.json"
+    json_data = load_json_data(file_path)
+    if json_data:
+        result = process_data(json_data)
+        if result:
+            import pprint
+            print("\n=== Overall Summary ===")
+            pprint.pprint(result["overall_summary"])
+            print("\n=== Subject Summary ===")
+            pprint.pprint(dict(result["subject_summary"]))
+            print("\n=== Corrected Chapter Details ===")
+            pprint.pprint(dict(result["chapter_details"]))
+    else:
+        print("Failed to load JSON file")
+
+if __name__ == "__main__":
+    main()
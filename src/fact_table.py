@@ -0,0 +1,192 @@
+from array import array
+from collections.abc import Mapping
+from dataclasses import dataclass
+
+import numpy as np
+
+# Level and status vocabularies are seeded so their codes are stable across
+# submissions; anything unexpected is appended after them.
+LEVELS = ["easy", "medium", "tough"]
+STATUSES = ["answered", "markedReview", "notAnswered"]
+ANSWERED, MARKED_REVIEW, NOT_ANSWERED = 0, 1, 2
+
+# Values of the correct column
+CORRECT, INCORRECT, NOT_EVALUATED = 1, 0, -1
+
+# --- Dictionary Encoding ---
+class StringDictionary:
+    """Assigns dense integer codes to strings in first-seen order."""
+
+    def __init__(self, values=()):
+        self.codes = {}
+        self.values = []
+        for value in values:
+            self.encode(value)
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __getitem__(self, code):
+        return self.values[code]
+
+    def __len__(self):
+        return len(self.values)
+
+# --- Fact Table ---
+@dataclass
+class QuestionFacts:
+    """
+    One row per in-scope question. String columns hold codes into the
+    matching StringDictionary; concepts are stored exploded as
+    (concept_question, concept) pairs since a question can carry several.
+    """
+    subject: np.ndarray
+    chapter: np.ndarray
+    level: np.ndarray
+    status: np.ndarray
+    correct: np.ndarray
+    time_taken: np.ndarray
+    time_left: np.ndarray
+    concept_question: np.ndarray
+    concept: np.ndarray
+    subjects: StringDictionary
+    chapters: StringDictionary
+    levels: StringDictionary
+    statuses: StringDictionary
+    concepts: StringDictionary
+
+    def __len__(self):
+        return len(self.subject)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in (
+            "subject", "chapter", "level", "status", "correct",
+            "time_taken", "time_left", "concept_question", "concept"
+        ))
+
+class QuestionFactsBuilder:
+    """Accumulates rows in compact typed arrays while a submission is scanned."""
+
+    def __init__(self):
+        self.subjects = StringDictionary()
+        self.chapters = StringDictionary()
+        self.levels = StringDictionary(LEVELS)
+        self.statuses = StringDictionary(STATUSES)
+        self.concepts = StringDictionary()
+        self._subject = array('h')
+        self._chapter = array('i')
+        self._level = array('b')
+        self._status = array('b')
+        self._correct = array('b')
+        self._time_taken = array('i')
+        self._time_left = array('i')
+        self._concept_question = array('i')
+        self._concept = array('i')
+
+    def add(self, subject, chapter, level, status, correct, time_taken, time_left, concepts):
+        row = len(self._subject)
+        self._subject.append(self.subjects.encode(subject))
+        self._chapter.append(self.chapters.encode(chapter))
+        self._level.append(self.levels.encode(level))
+        self._status.append(self.statuses.encode(status))
+        self._correct.append(NOT_EVALUATED if correct is None else int(bool(correct)))
+        self._time_taken.append(int(time_taken or 0))
+        self._time_left.append(-1 if time_left is None else int(time_left))
+        for concept in concepts:
+            self._concept_question.append(row)
+            self._concept.append(self.concepts.encode(concept))
+
+    def build(self):
+        return QuestionFacts(
+            subject=np.array(self._subject, dtype=np.int16),
+            chapter=np.array(self._chapter, dtype=np.int32),
+            level=np.array(self._level, dtype=np.int8),
+            status=np.array(self._status, dtype=np.int8),
+            correct=np.array(self._correct, dtype=np.int8),
+            time_taken=np.array(self._time_taken, dtype=np.int32),
+            time_left=np.array(self._time_left, dtype=np.int32),
+            concept_question=np.array(self._concept_question, dtype=np.int32),
+            concept=np.array(self._concept, dtype=np.int32),
+            subjects=self.subjects,
+            chapters=self.chapters,
+            levels=self.levels,
+            statuses=self.statuses,
+            concepts=self.concepts
+        )
+
+# --- Vectorized Group-bys ---
+def group_rows(*columns):
+    """
+    Combine code columns into one dense group id per row.
+    Returns (group_ids, first_rows) with groups numbered in first-seen order,
+    so summaries keep the order in which the questions appeared.
+    """
+    if not len(columns[0]):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    key = np.zeros(len(columns[0]), dtype=np.int64)
+    for column in columns:
+        key = key * (int(column.max()) + 1) + column
+    _, first_rows, inverse = np.unique(key, return_index=True, return_inverse=True)
+    order = np.argsort(first_rows, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return rank[inverse.ravel()], first_rows[order]
+
+def count_by_group(facts, groups, group_count):
+    """Status, correctness and time totals for each group id."""
+    status, correct = facts.status, facts.correct
+    return {
+        "total": np.bincount(groups, minlength=group_count),
+        "answered": np.bincount(groups[status == ANSWERED], minlength=group_count),
+        "correct": np.bincount(groups[correct == CORRECT], minlength=group_count),
+        "incorrect": np.bincount(groups[correct == INCORRECT], minlength=group_count),
+        "marked_review": np.bincount(groups[status == MARKED_REVIEW], minlength=group_count),
+        "not_answered": np.bincount(groups[status == NOT_ANSWERED], minlength=group_count),
+        "total_time": np.bincount(groups, weights=facts.time_taken, minlength=group_count).astype(np.int64)
+    }
+
+# --- Per-question Records ---
+class QuestionRecords(Mapping):
+    """
+    Read-only {(subject, chapter): [question dict, ...]} view over a fact
+    table, materialising the per-question dicts only when a chapter is read.
+    """
+
+    def __init__(self, facts):
+        self.facts = facts
+        self._groups, first_rows = group_rows(facts.subject, facts.chapter)
+        self._keys = [
+            (facts.subjects[facts.subject[row]], facts.chapters[facts.chapter[row]])
+            for row in first_rows
+        ]
+        self._index = {key: index for index, key in enumerate(self._keys)}
+
+    def __getitem__(self, key):
+        facts = self.facts
+        rows = np.flatnonzero(self._groups == self._index[key])
+        starts = np.searchsorted(facts.concept_question, rows, side='left')
+        ends = np.searchsorted(facts.concept_question, rows, side='right')
+        records = []
+        for row, start, end in zip(rows, starts, ends):
+            record = {
+                "status": facts.statuses[facts.status[row]],
+                "time_taken": int(facts.time_taken[row]),
+                "level": facts.levels[facts.level[row]],
+                "concepts": [facts.concepts[code] for code in facts.concept[start:end]],
+                "subject": facts.subjects[facts.subject[row]]
+            }
+            if facts.correct[row] != NOT_EVALUATED:
+                record["correct"] = bool(facts.correct[row] == CORRECT)
+            records.append(record)
+        return records
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
@@ -0,0 +1,113 @@
+import re
+from dataclasses import dataclass, field
+
+# --- Compiled Patterns ---
+# One alternation classifies every line; the name of the last group that
+# matched (Match.lastgroup) is the line's kind
+_LINE = re.compile(r"""
+    ^[ \t]*(?:
+        (?P<table>\|.*)
+      | (?:(?P<hashes>\#{1,6})[ \t]+(?P<hash_text>.+?)|\*\*(?P<bold_text>[^*\n]+)\*\*)[ \t]*
+      | (?:[-*•+]|(?P<number>\d+)[.)])[ \t]+(?:\*\*(?P<label>[^*\n]+?):?\*\*:?[ \t]*)?(?P<body>.*)
+      | (?P<text>\S.*)
+      | (?P<blank>)
+    )$""", re.MULTILINE | re.VERBOSE)
+_SEPARATOR_ROW = re.compile(r"\|?(?:\s*:?-+:?\s*\|)+\s*(?::?-+:?\s*)?$")
+# Markdown emphasis and stray LaTeX "$\cdot 2" fragments the model sometimes emits
+_INLINE_NOISE = re.compile(r"\*+|\$\s*\\cdot\s*\d*\s*")
+_SPACES = re.compile(r"\s{2,}")
+_SENTENCE_END = re.compile(r"(?<!\d)\.(?!\d)")
+
+def _clean_inline(text):
+    if "*" in text or "$" in text:
+        text = _INLINE_NOISE.sub("", text)
+    if "  " in text:
+        text = _SPACES.sub(" ", text)
+    return text.strip()
+
+# --- Typed Blocks ---
+@dataclass
+class Block:
+    kind: str            # "heading", "subheading", "bullet", "table" or "paragraph"
+    text: str = ""
+    label: str = ""      # bold lead-in of a bullet, e.g. a chapter name
+    number: int = 0      # position in a numbered list, 0 for plain bullets
+    rows: list = field(default_factory=list)
+    table_type: str = ""
+
+    @property
+    def sentences(self):
+        """The paragraph split into sentences; periods inside numbers are kept."""
+        return [sentence.strip() for sentence in _SENTENCE_END.split(self.text) if sentence.strip()]
+
+def _table_block(rows, table_count):
+    header = rows[0][0].lower() if rows and rows[0] else ""
+    if header in ("subject", "difficulty"):
+        table_type = header
+    else:
+        table_type = "subject" if table_count == 1 else "difficulty"
+    return Block("table", rows=rows, table_type=table_type)
+
+# --- Tokenizer ---
+def tokenize_feedback(content):
+    """
+    Turn LLM markdown feedback into typed Blocks in a single regex pass.
+    Headings are "## Title" or "**Title**" lines ("**Physics:**" and "###"
+    give subheadings); "* **Chapter:** text" and "1. **Title:** text" give
+    labelled bullets. Consecutive text lines form one paragraph, and table
+    separator rows are dropped.
+    """
+    blocks = []
+    paragraph = []
+    table = []
+    table_count = 0
+    append = blocks.append
+    if "\r" in content:
+        content = content.replace("\r\n", "\n")
+
+    for match in _LINE.finditer(content):
+        kind = match.lastgroup
+        if kind == "text" and not table:
+            paragraph.append(match.group("text"))
+            continue
+        if paragraph:
+            append(Block("paragraph", _clean_inline(" ".join(paragraph))))
+            paragraph = []
+
+        if kind == "table":
+            line = match.group("table").rstrip()
+            if not _SEPARATOR_ROW.match(line):
+                cells = line.strip("|").split("|")
+                table.append([_clean_inline(cell) for cell in cells] if "*" in line or "$" in line else [cell.strip() for cell in cells])
+            continue
+        if table:
+            table_count += 1
+            append(_table_block(table, table_count))
+            table = []
+
+        if kind == "body":
+            label = match.group("label")
+            body = match.group("body")
+            number = int(match.group("number") or 0)
+            if label is None:
+                append(Block("bullet", _clean_inline(body), number=number))
+            elif body.strip():
+                append(Block("bullet", _clean_inline(body), label=_clean_inline(label), number=number))
+            else:
+                # "* **Physics:**" introduces the bullets that follow
+                append(Block("subheading", _clean_inline(label)))
+        elif kind in ("hash_text", "bold_text"):
+            hashes = match.group("hashes")
+            text = _clean_inline(match.group(kind))
+            if text.endswith(":") or (hashes and len(hashes) > 2):
+                append(Block("subheading", text.rstrip(":").strip()))
+            else:
+                append(Block("heading", text))
+        elif kind == "text":
+            paragraph.append(match.group("text"))
+
+    if paragraph:
+        append(Block("paragraph", _clean_inline(" ".join(paragraph))))
+    if table:
+        append(_table_block(table, table_count + 1))
+    return blocks
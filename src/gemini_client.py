@@ -0,0 +1,156 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Gemini API configuration
+API_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/models"
+DEFAULT_MODEL = "gemini-1.5-flash"
+
+class StreamDecodeError(requests.RequestException):
+    """A server-sent event in a streamed response was not valid JSON."""
+
+# --- Gemini Client ---
+class GeminiClient:
+    """
+    asyncio front end for the Gemini generateContent endpoint.
+
+    All calls share one requests.Session whose connection pool is sized to
+    max_concurrency, so TLS connections are reused across students. Blocking
+    HTTP calls run on a dedicated thread pool of the same size, and a
+    semaphore caps the number of requests in flight.
+    """
+
+    def __init__(self, api_key=None, model=DEFAULT_MODEL, base_url=API_BASE_URL,
+                 max_concurrency=8, timeout=60, connect_timeout=10, generation_config=None):
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.timeout = (connect_timeout, timeout)
+        self.generation_config = generation_config or {}
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+        if self.api_key:
+            self.session.headers.update({"x-goog-api-key": self.api_key})
+
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="gemini")
+        self._semaphore = None
+        self._semaphore_loop = None
+
+    @property
+    def url(self):
+        return f"{self.base_url}/{self.model}:generateContent"
+
+    @property
+    def stream_url(self):
+        return f"{self.base_url}/{self.model}:streamGenerateContent"
+
+    def build_payload(self, prompt, generation_config=None):
+        payload = {
+            "contents": [
+                {
+                    "parts": [
+                        {"text": prompt}
+                    ],
+                    "role": "user"
+                }
+            ]
+        }
+        config = {**self.generation_config, **(generation_config or {})}
+        if config:
+            payload["generationConfig"] = config
+        return payload
+
+    @staticmethod
+    def extract_text(response_json):
+        """Text of the first candidate, or "" when there is none (e.g. a prompt blocked for safety)."""
+        candidates = response_json.get("candidates") or [{}]
+        parts = candidates[0].get("content", {}).get("parts") or [{}]
+        return parts[0].get("text", "")
+
+    def post(self, payload):
+        """Blocking POST of a raw payload; raises requests.RequestException."""
+        response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def generate_sync(self, prompt, generation_config=None):
+        """Blocking single call; raises requests.RequestException."""
+        return self.generate_sync_with_usage(prompt, generation_config)[0]
+
+    def generate_sync_with_usage(self, prompt, generation_config=None):
+        """Blocking single call returning (text, usageMetadata)."""
+        response_json = self.post(self.build_payload(prompt, generation_config))
+        return self.extract_text(response_json), response_json.get("usageMetadata", {})
+
+    def stream_sync(self, prompt, generation_config=None):
+        """
+        Blocking streamGenerateContent call over server-sent events. Yields
+        text chunks as the model produces them; raises requests.RequestException
+        (StreamDecodeError for an event that is not valid JSON).
+        """
+        payload = self.build_payload(prompt, generation_config)
+        with self.session.post(self.stream_url, params={"alt": "sse"}, json=payload,
+                               timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue
+                try:
+                    event = json.loads(line[5:])
+                except ValueError as e:
+                    raise StreamDecodeError(f"Malformed stream event: {e}", response=response) from e
+                text = self.extract_text(event)
+                if text:
+                    yield text
+
+    def _get_semaphore(self):
+        # Semaphores belong to one event loop; make a new one per asyncio.run
+        loop = asyncio.get_running_loop()
+        if self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def generate(self, prompt, generation_config=None):
+        return (await self.generate_with_usage(prompt, generation_config))[0]
+
+    async def generate_with_usage(self, prompt, generation_config=None):
+        async with self._get_semaphore():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self.generate_sync_with_usage, prompt, generation_config)
+
+    async def generate_many(self, prompts, generation_config=None):
+        """
+        Generate for a list of prompts, or a {key: prompt} dict, with at most
+        max_concurrency requests in flight. Failed prompts come back as the
+        exception instead of text, in the same shape as the input.
+        """
+        if isinstance(prompts, dict):
+            results = await asyncio.gather(
+                *(self.generate(prompt, generation_config) for prompt in prompts.values()),
+                return_exceptions=True
+            )
+            return dict(zip(prompts, results))
+        return await asyncio.gather(
+            *(self.generate(prompt, generation_config) for prompt in prompts),
+            return_exceptions=True
+        )
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
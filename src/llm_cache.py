@@ -0,0 +1,219 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from result_cache import DEFAULT_CACHE_DIR, ResultCache, content_hash
+
+DEFAULT_MAX_ENTRIES = 50_000
+DEFAULT_TTL = 30 * 24 * 3600  # Seconds; feedback for unchanged prompts stays valid for a month
+DEFAULT_MEMORY_ENTRIES = 1024
+# Memory hits refresh the store's access times in batches of this many keys
+TOUCH_BATCH = 64
+
+# --- Prompt Keys ---
+def normalize_prompt(prompt):
+    """Collapse whitespace and drop blank lines so cosmetic template changes still hit."""
+    lines = (" ".join(line.split()) for line in prompt.strip().splitlines())
+    return "\n".join(line for line in lines if line)
+
+def prompt_key(prompt, model, generation_config=None):
+    return content_hash(normalize_prompt(prompt), model, generation_config or {})
+
+# --- Stores ---
+class SQLiteStore:
+    """Single-file store; one row per response with created/accessed times."""
+
+    def __init__(self, path=os.path.join(DEFAULT_CACHE_DIR, "llm_responses.sqlite3"), max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, text TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._db.commit()
+        # Running row count; other processes may write too, so it is
+        # re-read with COUNT(*) only when it says the limit is crossed
+        self._count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get(self, key):
+        """Return (text, created) or None."""
+        with self._lock:
+            row = self._db.execute("SELECT text, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+                self._db.commit()
+        return row
+
+    def touch(self, keys):
+        """Mark keys as used now, e.g. after hits served from memory."""
+        now = time.time()
+        with self._lock:
+            self._db.executemany("UPDATE responses SET accessed = ? WHERE key = ?", [(now, key) for key in keys])
+            self._db.commit()
+
+    def put(self, key, text, created):
+        with self._lock:
+            exists = self._db.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, text, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, text, created, created)
+            )
+            if not exists:
+                self._count += 1
+            if self._count > self.max_entries:
+                self._count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if self._count > self.max_entries:
+                # Drop least recently used rows down to 90% of the limit
+                target = int(self.max_entries * 0.9)
+                self._db.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                    (self._count - target,)
+                )
+                self._count = target
+            self._db.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._count -= self._db.execute("DELETE FROM responses WHERE key = ?", (key,)).rowcount
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+            self._count = 0
+
+    def close(self):
+        self._db.close()
+
+class FileStore:
+    """One file per response in a ResultCache namespace; LRU eviction by size."""
+
+    namespace = "llm"
+
+    def __init__(self, cache=None):
+        self.cache = cache or ResultCache()
+
+    def get(self, key):
+        value = self.cache.get(self.namespace, key)
+        if value is None:
+            return None
+        entry = json.loads(value)
+        return entry["text"], entry["created"]
+
+    def touch(self, keys):
+        for key in keys:
+            self.cache.touch(self.namespace, key)
+
+    def put(self, key, text, created):
+        self.cache.put(self.namespace, key, json.dumps({"text": text, "created": created}).encode("utf-8"))
+
+    def delete(self, key):
+        self.cache.delete(self.namespace, key)
+
+    def clear(self):
+        self.cache.clear(self.namespace)
+
+    def close(self):
+        pass
+
+def open_store(backend=None):
+    """Store named by backend, or by the LLM_CACHE_BACKEND env var ("sqlite" or "file")."""
+    backend = backend or os.getenv("LLM_CACHE_BACKEND", "sqlite")
+    if backend == "file":
+        return FileStore()
+    if backend == "sqlite":
+        return SQLiteStore()
+    raise ValueError(f"Unknown LLM cache backend: {backend}")
+
+# --- LLM Response Cache ---
+class LLMResponseCache:
+    """
+    Persistent Gemini response cache keyed by the normalised prompt, model
+    and generation parameters, so students with identical prompts share one
+    API call across runs. A small in-memory LRU sits in front of the store
+    for repeats within a run. Entries older than ttl seconds are ignored.
+    Hits are recorded in metrics (an llm_metrics.LLMMetrics) when given.
+    """
+
+    def __init__(self, store=None, ttl=DEFAULT_TTL, memory_entries=DEFAULT_MEMORY_ENTRIES, metrics=None):
+        self.store = store if store is not None else open_store()
+        self.metrics = metrics
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._touched = set()
+
+    def _expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, prompt, model, generation_config=None):
+        start = time.perf_counter()
+        key = prompt_key(prompt, model, generation_config)
+        entry = self._memory.get(key)
+        if entry is not None:
+            # The store's LRU must see hot prompts too, or it evicts them first
+            self._touched.add(key)
+            if len(self._touched) >= TOUCH_BATCH:
+                self.flush_touches()
+        else:
+            entry = self.store.get(key)
+        if entry is None or self._expired(entry[1]):
+            if entry is not None:
+                self._memory.pop(key, None)
+                self.store.delete(key)
+            self.misses += 1
+            return None
+        self._remember(key, entry)
+        self.hits += 1
+        if self.metrics is not None:
+            self.metrics.record(model, prompt, entry[0], time.perf_counter() - start, cache_hit=True)
+        return entry[0]
+
+    def put(self, prompt, model, text, generation_config=None):
+        key = prompt_key(prompt, model, generation_config)
+        entry = (text, time.time())
+        self.store.put(key, *entry)
+        self._remember(key, entry)
+
+    def flush_touches(self):
+        """Write the access times of memory hits through to the store."""
+        if self._touched:
+            touched, self._touched = self._touched, set()
+            self.store.touch(touched)
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hit_rate, 3)}
+
+    def clear(self):
+        self._memory.clear()
+        self._touched.clear()
+        self.store.clear()
+
+    def close(self):
+        self.flush_touches()
+        self.store.close()
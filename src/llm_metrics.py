@@ -0,0 +1,140 @@
+import contextvars
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+
+import numpy as np
+
+from llm_tokens import estimate_tokens
+
+# Tags (student, test, section, ...) attached to every call made in this context
+_tags = contextvars.ContextVar("llm_tags", default={})
+
+@contextmanager
+def llm_tags(**tags):
+    """Tag every LLM call made inside the block, including in asyncio tasks it starts."""
+    token = _tags.set({**_tags.get(), **{name: value for name, value in tags.items() if value}})
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+def current_tags():
+    return dict(_tags.get())
+
+_HEADING = re.compile(r"^#{1,6} +(.+)$", re.MULTILINE)
+
+def prompt_section_tokens(prompt):
+    """Estimated tokens under each markdown heading of a prompt ("preamble" before the first)."""
+    sections = {}
+    start, name = 0, "preamble"
+    for match in _HEADING.finditer(prompt):
+        if match.start() > start:
+            sections[name] = sections.get(name, 0) + estimate_tokens(prompt[start:match.start()])
+        start, name = match.start(), match.group(1).strip().strip("*")
+    sections[name] = sections.get(name, 0) + estimate_tokens(prompt[start:])
+    return sections
+
+# --- Call Records ---
+@dataclass
+class CallRecord:
+    timestamp: float
+    model: str
+    prompt_chars: int
+    response_chars: int
+    latency_s: float
+    retries: int = 0
+    cache_hit: bool = False
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    total_tokens: int = 0
+    error: str = ""
+    tags: dict = field(default_factory=dict)
+    prompt_sections: dict = field(default_factory=dict)
+
+class LLMMetrics:
+    """
+    Collects one CallRecord per LLM call or cache hit. With log_path, each
+    record is also appended to a JSONL log as it happens.
+    """
+
+    def __init__(self, log_path=None):
+        self.log_path = log_path
+        self.records = []
+        self._lock = threading.Lock()
+
+    def record(self, model, prompt, response="", latency=0.0, usage=None, retries=0, cache_hit=False, error=None, tags=None):
+        usage = usage or {}
+        record = CallRecord(
+            timestamp=time.time(),
+            model=model,
+            prompt_chars=len(prompt),
+            response_chars=len(response or ""),
+            latency_s=round(latency, 4),
+            retries=retries,
+            cache_hit=cache_hit,
+            prompt_tokens=usage.get("promptTokenCount", 0),
+            output_tokens=usage.get("candidatesTokenCount", 0),
+            total_tokens=usage.get("totalTokenCount", 0),
+            error=str(error) if error else "",
+            tags={**current_tags(), **(tags or {})},
+            prompt_sections=prompt_section_tokens(prompt)
+        )
+        with self._lock:
+            self.records.append(record)
+            if self.log_path:
+                with open(self.log_path, "a") as file:
+                    file.write(json.dumps(asdict(record)) + "\n")
+        return record
+
+    def summary(self, by=None):
+        """
+        Per-run totals: calls, cache hits, errors, retries, tokens, latency
+        percentiles of real API calls, and estimated prompt tokens per
+        section. With by (a tag name), totals are also broken down by it.
+        """
+        with self._lock:
+            records = list(self.records)
+        api_calls = [r for r in records if not r.cache_hit]
+        latencies = np.array([r.latency_s for r in api_calls if not r.error])
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (0.0, 0.0, 0.0)
+        section_tokens = defaultdict(int)
+        for r in api_calls:
+            for name, tokens in r.prompt_sections.items():
+                section_tokens[name] += tokens
+
+        summary = {
+            "calls": len(records),
+            "api_calls": len(api_calls),
+            "cache_hits": len(records) - len(api_calls),
+            "errors": sum(1 for r in records if r.error),
+            "retries": sum(r.retries for r in records),
+            "prompt_tokens": sum(r.prompt_tokens for r in api_calls),
+            "output_tokens": sum(r.output_tokens for r in api_calls),
+            "prompt_chars": sum(r.prompt_chars for r in api_calls),
+            "response_chars": sum(r.response_chars for r in api_calls),
+            "latency_p50_s": round(float(p50), 3),
+            "latency_p95_s": round(float(p95), 3),
+            "latency_p99_s": round(float(p99), 3),
+            "prompt_section_tokens": dict(sorted(section_tokens.items(), key=lambda item: -item[1]))
+        }
+        if by:
+            groups = defaultdict(lambda: {"calls": 0, "cache_hits": 0, "prompt_tokens": 0, "output_tokens": 0, "latency_s": 0.0})
+            for r in records:
+                group = groups[r.tags.get(by, "")]
+                group["calls"] += 1
+                group["cache_hits"] += r.cache_hit
+                group["prompt_tokens"] += r.prompt_tokens
+                group["output_tokens"] += r.output_tokens
+                group["latency_s"] = round(group["latency_s"] + r.latency_s, 4)
+            summary[f"by_{by}"] = dict(groups)
+        return summary
+
+    def write_jsonl(self, path):
+        with self._lock, open(path, "w") as file:
+            for record in self.records:
+                file.write(json.dumps(asdict(record)) + "\n")
@@ -0,0 +1,197 @@
+import asyncio
+import email.utils
+import random
+import time
+from datetime import timezone
+
+import requests
+
+from llm_tokens import estimate_tokens
+
+# HTTP statuses worth retrying; everything else fails the request at once
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# --- Token Bucket ---
+class TokenBucket:
+    """Refills at rate_per_minute, holding at most capacity units."""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = None
+        self._lock_loop = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate_per_minute / 60.0)
+        self.updated = now
+
+    def set_rate(self, rate_per_minute):
+        """Change the refill rate, scaling the capacity with it so bursts shrink too."""
+        self._refill()
+        self.capacity = self.capacity * rate_per_minute / self.rate_per_minute
+        self.rate_per_minute = rate_per_minute
+        self.tokens = min(self.tokens, self.capacity)
+
+    def wait_time(self, amount):
+        self._refill()
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60.0 / self.rate_per_minute
+
+    async def acquire(self, amount=1):
+        # Requests larger than the bucket could never be served; cap them
+        amount = min(amount, self.capacity)
+        loop = asyncio.get_running_loop()
+        if self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        async with self._lock:
+            while True:
+                delay = self.wait_time(amount)
+                if delay <= 0:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep(delay)
+
+# --- Retry Policy ---
+def retry_after_seconds(error):
+    """Seconds requested by a Retry-After header on an HTTP error, if any."""
+    response = getattr(error, "response", None)
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    # Otherwise an HTTP date; a malformed one falls back to the usual backoff
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, retry_at.timestamp() - time.time())
+
+def is_retryable(error):
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    response = getattr(error, "response", None)
+    return response is not None and response.status_code in RETRYABLE_STATUSES
+
+class RetryPolicy:
+    """Jittered exponential backoff ("full jitter") that honours Retry-After."""
+
+    def __init__(self, max_retries=5, base_delay=1.0, max_delay=60.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, error=None):
+        retry_after = retry_after_seconds(error) if error is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+# --- Rate-limited Scheduler ---
+class RateLimitedScheduler:
+    """
+    Keeps Gemini calls within requests-per-minute and tokens-per-minute
+    budgets. Every call takes one request token and its estimated prompt
+    plus output tokens before it is sent. A 429 pauses all callers until the
+    Retry-After time and halves the send rate and burst size; both recover
+    gradually as calls succeed. run() re-queues students whose retries ran
+    out instead of returning placeholder text. With an llm_metrics.LLMMetrics,
+    every call is recorded with its latency, retries and token usage.
+    """
+
+    def __init__(self, client, requests_per_minute=15, tokens_per_minute=1_000_000,
+                 output_token_reserve=2000, retry_policy=None, max_requeues=2, metrics=None):
+        self.client = client
+        self.metrics = metrics
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.output_token_reserve = output_token_reserve
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.max_requeues = max_requeues
+        self.max_rate = requests_per_minute
+        self.cooldown_until = 0.0
+        self.retries = 0
+        self.rate_limited = 0
+
+    async def _wait_for_cooldown(self):
+        delay = self.cooldown_until - time.monotonic()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self.cooldown_until - time.monotonic()
+
+    def _on_rate_limited(self, delay):
+        self.rate_limited += 1
+        self.cooldown_until = max(self.cooldown_until, time.monotonic() + delay)
+        self.request_bucket.set_rate(max(1, self.request_bucket.rate_per_minute / 2))
+
+    def _on_success(self):
+        if self.request_bucket.rate_per_minute < self.max_rate:
+            self.request_bucket.set_rate(min(self.max_rate, self.request_bucket.rate_per_minute + 1))
+
+    async def generate(self, prompt, generation_config=None, tags=None):
+        """Generate one response, retrying transient failures; raises the last error."""
+        attempt = 0
+        start = time.perf_counter()
+        while True:
+            await self._wait_for_cooldown()
+            await self.request_bucket.acquire(1)
+            await self.token_bucket.acquire(estimate_tokens(prompt) + self.output_token_reserve)
+            try:
+                result, usage = await self.client.generate_with_usage(prompt, generation_config)
+            except requests.RequestException as e:
+                if not is_retryable(e) or attempt >= self.retry_policy.max_retries:
+                    if self.metrics is not None:
+                        self.metrics.record(self.client.model, prompt, latency=time.perf_counter() - start,
+                                            retries=attempt, error=e, tags=tags)
+                    raise
+                delay = self.retry_policy.delay(attempt, e)
+                if getattr(e, "response", None) is not None and e.response.status_code == 429:
+                    self._on_rate_limited(delay)
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(delay)
+                continue
+            self._on_success()
+            if self.metrics is not None:
+                self.metrics.record(self.client.model, prompt, result, time.perf_counter() - start,
+                                    usage=usage, retries=attempt, tags=tags)
+            return result
+
+    async def run(self, prompts, generation_config=None, tag_name="key"):
+        """
+        Generate for {key: prompt}. Keys that still fail after retrying are
+        re-queued for up to max_requeues more rounds; calls are tagged with
+        their key under tag_name.
+        Returns (results, failures) as {key: text} and {key: exception}.
+        """
+        results = {}
+        failures = {}
+        queue = dict(prompts)
+        for _ in range(self.max_requeues + 1):
+            if not queue:
+                break
+            keys = list(queue)
+            outcomes = await asyncio.gather(
+                *(self.generate(queue[key], generation_config, tags={tag_name: key}) for key in keys),
+                return_exceptions=True
+            )
+            retry_queue = {}
+            for key, outcome in zip(keys, outcomes):
+                if isinstance(outcome, Exception):
+                    failures[key] = outcome
+                    if isinstance(outcome, requests.RequestException) and is_retryable(outcome):
+                        retry_queue[key] = queue[key]
+                else:
+                    failures.pop(key, None)
+                    results[key] = outcome
+            queue = retry_queue
+        return results, failures
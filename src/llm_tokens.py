@@ -0,0 +1,7 @@
+import math
+
+# Rough prompt size in tokens (Gemini averages ~4 characters per token)
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
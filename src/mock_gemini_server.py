@@ -0,0 +1,195 @@
+import argparse
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FILLER = "Keep practising steadily and review each mistake carefully. "
+
+# --- Mock Behaviour ---
+class MockConfig:
+    """
+    How the mock responds. Latency is lognormal around latency_median
+    seconds (latency_sigma=0 makes it fixed). error_rate returns 500s,
+    rate_limit_rate returns random 429s, and rate_limit_rpm enforces a
+    sliding one-minute request quota; 429s carry Retry-After.
+    """
+
+    def __init__(self, latency_median=0.5, latency_sigma=0.3, error_rate=0.0, rate_limit_rate=0.0,
+                 rate_limit_rpm=None, retry_after=1.0, response_chars=2000, stream_chunks=8, seed=None):
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rate_limit_rpm = rate_limit_rpm
+        self.retry_after = retry_after
+        self.response_chars = response_chars
+        self.stream_chunks = stream_chunks
+        self.random = random.Random(seed)
+
+    def latency(self):
+        if self.latency_sigma <= 0:
+            return self.latency_median
+        return self.random.lognormvariate(0, self.latency_sigma) * self.latency_median
+
+def _fake_value(schema, chars):
+    """A value matching a Gemini response schema, with roughly chars of text."""
+    kind = schema.get("type", "STRING")
+    if kind == "OBJECT":
+        properties = schema.get("properties", {})
+        share = max(20, chars // max(1, len(properties)))
+        return {name: _fake_value(sub_schema, share) for name, sub_schema in properties.items()}
+    if kind == "ARRAY":
+        return [_fake_value(schema.get("items", {}), chars // 3) for _ in range(3)]
+    if kind in ("INTEGER", "NUMBER"):
+        return 1
+    if kind == "BOOLEAN":
+        return True
+    return (FILLER * (chars // len(FILLER) + 1))[:chars].strip()
+
+def fake_response_text(request, chars):
+    config = request.get("generationConfig", {})
+    if config.get("responseMimeType") == "application/json":
+        return json.dumps(_fake_value(config.get("responseSchema", {"type": "OBJECT"}), chars))
+    return (FILLER * (chars // len(FILLER) + 1))[:chars]
+
+def _response_json(text, prompt_chars):
+    return {
+        "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP"}],
+        "usageMetadata": {
+            "promptTokenCount": prompt_chars // 4,
+            "candidatesTokenCount": len(text) // 4,
+            "totalTokenCount": (prompt_chars + len(text)) // 4
+        }
+    }
+
+# --- Request Handler ---
+class MockGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=()):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _rate_limited(self):
+        server = self.server
+        config = server.config
+        if config.rate_limit_rate and config.random.random() < config.rate_limit_rate:
+            return True
+        if not config.rate_limit_rpm:
+            return False
+        now = time.monotonic()
+        with server.lock:
+            while server.recent and now - server.recent[0] > 60:
+                server.recent.popleft()
+            if len(server.recent) >= config.rate_limit_rpm:
+                return True
+            server.recent.append(now)
+        return False
+
+    def do_POST(self):
+        server = self.server
+        config = server.config
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with server.lock:
+            server.counts["requests"] += 1
+
+        if ":generateContent" not in self.path and ":streamGenerateContent" not in self.path:
+            self._send_json(404, {"error": {"code": 404, "message": "Not found"}})
+            return
+        if self._rate_limited():
+            with server.lock:
+                server.counts["rate_limited"] += 1
+            self._send_json(429, {"error": {"code": 429, "message": "Resource exhausted", "status": "RESOURCE_EXHAUSTED"}},
+                            headers=[("Retry-After", f"{config.retry_after:g}")])
+            return
+
+        time.sleep(config.latency())
+        if config.error_rate and config.random.random() < config.error_rate:
+            with server.lock:
+                server.counts["errors"] += 1
+            self._send_json(500, {"error": {"code": 500, "message": "Internal error", "status": "INTERNAL"}})
+            return
+
+        request = json.loads(body or b"{}")
+        text = fake_response_text(request, config.response_chars)
+        if ":streamGenerateContent" in self.path:
+            self._stream(text, len(body))
+        else:
+            self._send_json(200, _response_json(text, len(body)))
+        with server.lock:
+            server.counts["ok"] += 1
+
+    def _stream(self, text, prompt_chars):
+        """Server-sent events, one chunk of the text per event."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        size = max(1, len(text) // self.server.config.stream_chunks + 1)
+        for start in range(0, len(text), size):
+            event = b"data: " + json.dumps(_response_json(text[start:start + size], prompt_chars)).encode("utf-8") + b"\r\n\r\n"
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(event), event))
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+# --- Server ---
+class MockGeminiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), config=None):
+        super().__init__(address, MockGeminiHandler)
+        self.config = config or MockConfig()
+        self.lock = threading.Lock()
+        self.recent = deque()
+        self.counts = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1beta/models"
+
+def start_mock_server(config=None, port=0):
+    """Serve on a background thread; point GeminiClient(base_url=server.base_url) at it."""
+    server = MockGeminiServer(("127.0.0.1", port), config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# --- Main Execution ---
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Gemini generateContent API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="median latency in seconds")
+    parser.add_argument("--sigma", type=float, default=0.3, help="lognormal latency spread (0 = fixed)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--rpm", type=int, default=None, help="requests-per-minute quota before 429s")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--response-chars", type=int, default=2000)
+    args = parser.parse_args()
+
+    config = MockConfig(args.latency, args.sigma, args.error_rate, args.rate_limit_rate, args.rpm,
+                        args.retry_after, args.response_chars)
+    server = MockGeminiServer(("127.0.0.1", args.port), config)
+    print(f"Mock Gemini API at {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Requests served: {server.counts}")
+
+if __name__ == "__main__":
+    main()
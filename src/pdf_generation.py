@@ -1,19 +1,29 @@
+import hashlib
+import io
 import json
-import matplotlib.pyplot as plt
+import logging
+import threading
 import numpy as np
-from collections import defaultdict
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from collections import OrderedDict
+from dataclasses import dataclass
+from reportlab.graphics import renderPDF
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Flowable, Paragraph, Spacer, Table, PageBreak
 from reportlab.lib.units import inch
 import os
-import tempfile
-import time
-import re
-import unicodedata 
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape
 
-import matplotlib.pyplot as plt
+from dataPreprocessing import process_submission, process_batch
+from result_cache import ResultCache, content_hash
+from llm_cache import LLMResponseCache
+from report_model import IncompleteReportError, overall_lines, performance_tables
+from template_feedback import build_template_report
+from vector_charts import subject_chart_drawing
+from feedback_markdown import tokenize_feedback
+from report_template import get_report_template
+
+logger = logging.getLogger(__name__)
 
 # --- Load JSON Data ---
 def load_json_data(file_path):
@@ -32,144 +42,21 @@ def process_data(json_data):
         print("Invalid JSON data")
         return None
 
-    processed_data = {
-        "overall_summary": {},
-        "subject_summary": defaultdict(dict),
-        "chapter_details": defaultdict(dict)
-    }
-    chapter_stats = defaultdict(lambda: {
-        "questions_total": 0,
-        "answered": 0,
-        "correct": 0,
-        "incorrect": 0,
-        "marked_review": 0,
-        "not_answered": 0,
-        "total_time_seconds": 0,
-        "difficulty_counts": defaultdict(int),
-        "difficulty_stats": defaultdict(lambda: {"correct": 0, "incorrect": 0, "unattempted": 0})
-    })
-
-    concept_stats = defaultdict(lambda: defaultdict(lambda: {"total": 0, "correct": 0, "incorrect": 0}))
-
-    section_subject_map = {
-        "Physics Single Correct": "Physics",
-        "Physics Numerical": "Physics",
-        "Chemistry Single Correct": "Chemistry",
-        "Chemistry Numerical": "Chemistry",
-        "Mathematics Single Correct": "Mathematics",
-        "Mathematics Numerical": "Mathematics"
-    }
-
-    subject_map = {
-        "607018ee404ae53194e73d92": "Physics",
-        "607018ee404ae53194e73d90": "Chemistry",
-        "607018ee404ae53194e73d91": "Mathematics"
-    }
+    processed_data, _, _ = process_submission(json_data[0])
+    return processed_data
 
-    debug_counts = defaultdict(list)
-
-    data = json_data[0]
-    processed_data["overall_summary"] = {
-        "total_marks_scored": data.get("totalMarkScored", 0),
-        "total_marks_possible": data.get("totalMarks", 300),
-        "total_time_taken_seconds": data.get("totalTimeTaken", 0),
-        "total_questions_in_test": data.get("test", {}).get("totalQuestions", 0),
-        "final_attempted": data.get("totalAttempted", 0),
-        "final_correct": data.get("totalCorrect", 0),
-        "overall_accuracy_percent": data.get("accuracy", 0),
-        "time_taken_minutes": data.get("totalTimeTaken", 0) / 60.0
+# --- Chart Data for Every Submission ---
+def extract_batch_chart_data(json_data, max_workers=None, cache=None):
+    """
+    Aggregate every submission in the export.
+    Returns {submission_id: (processed_data, chart_data)}.
+    """
+    results = process_batch(json_data, max_workers=max_workers, cache=cache)
+    return {
+        submission_id: (processed_data, extract_chart_data(processed_data))
+        for submission_id, (processed_data, _, _) in results.items()
     }
 
-    for subject in data.get("subjects", []):
-        subject_id = subject.get("subjectId", {}).get("$oid", "")
-        subject_name = subject_map.get(subject_id, "Unknown")
-        processed_data["subject_summary"][subject_name] = {
-            "marks_scored": subject.get("totalMarkScored", 0),
-            "total_marks_possible": subject.get("totalMarks", 100),
-            "time_seconds": subject.get("totalTimeTaken", 0),
-            "attempted": subject.get("totalAttempted", 0),
-            "correct": subject.get("totalCorrect", 0),
-            "incorrect": subject.get("totalAttempted", 0) - subject.get("totalCorrect", 0),
-            "accuracy_percent": subject.get("accuracy", 0),
-            "avg_time_per_attempted_q_seconds": (subject.get("totalTimeTaken", 0) / subject.get("totalAttempted", 0)) if subject.get("totalAttempted", 0) > 0 else 0
-        }
-
-    for section in data.get("sections", []):
-        section_title = section.get("sectionId", {}).get("title", "")
-        subject = section_subject_map.get(section_title, "Unknown")
-
-        for question in section.get("questions", []):
-            chapter = question.get("questionId", {}).get("chapters", [{}])[0].get("title", "Unknown")
-            status = question.get("status", "notAnswered")
-            time_taken = question.get("timeTaken", 0)
-            level = question.get("questionId", {}).get("level", "unknown")
-            concepts = [concept.get("title", "Unknown") for concept in question.get("questionId", {}).get("concepts", [])]
-
-            if (subject == "Physics" and chapter not in ["Electrostatics", "Capacitance"]) or \
-               (subject == "Chemistry" and chapter not in ["Solutions", "Electrochemistry"]) or \
-               (subject == "Mathematics" and chapter not in ["Functions", "Sets and Relations"]):
-                continue
-
-            chapter_stats[(subject, chapter)]["questions_total"] += 1
-            chapter_stats[(subject, chapter)]["total_time_seconds"] += time_taken
-            chapter_stats[(subject, chapter)]["difficulty_counts"][level] += 1
-
-            debug_info = {
-                "status": status,
-                "time_taken": time_taken,
-                "level": level,
-                "concepts": concepts
-            }
-
-            if status == "answered":
-                chapter_stats[(subject, chapter)]["answered"] += 1
-                is_correct = False
-                marked_options = question.get("markedOptions", [])
-                input_value = question.get("inputValue", {})
-
-                if marked_options:
-                    is_correct = any(opt.get("isCorrect", False) for opt in marked_options)
-                elif input_value.get("value") is not None:
-                    is_correct = input_value.get("isCorrect", False)
-
-                if is_correct:
-                    chapter_stats[(subject, chapter)]["correct"] += 1
-                    chapter_stats[(subject, chapter)]["difficulty_stats"][level]["correct"] += 1
-                    debug_info["correct"] = True
-                else:
-                    chapter_stats[(subject, chapter)]["incorrect"] += 1
-                    chapter_stats[(subject, chapter)]["difficulty_stats"][level]["incorrect"] += 1
-                    debug_info["correct"] = False
-
-                for concept in concepts:
-                    concept_stats[(subject, chapter)][concept]["total"] += 1
-                    if is_correct:
-                        concept_stats[(subject, chapter)][concept]["correct"] += 1
-                    else:
-                        concept_stats[(subject, chapter)][concept]["incorrect"] += 1
-            elif status == "markedReview":
-                chapter_stats[(subject, chapter)]["marked_review"] += 1
-                chapter_stats[(subject, chapter)]["difficulty_stats"][level]["unattempted"] += 1
-            elif status == "notAnswered":
-                chapter_stats[(subject, chapter)]["not_answered"] += 1
-                chapter_stats[(subject, chapter)]["difficulty_stats"][level]["unattempted"] += 1
-
-            debug_counts[(subject, chapter)].append(debug_info)
-
-    for (subject, chapter), stats in chapter_stats.items():
-        stats["accuracy_on_answered_percent"] = (stats["correct"] / stats["answered"] * 100) if stats["answered"] > 0 else 0.0
-        stats["avg_time_per_answered_q_seconds"] = (stats["total_time_seconds"] / stats["answered"]) if stats["answered"] > 0 else 0.0
-        processed_data["chapter_details"][subject][chapter] = stats
-
-    subject_questions = defaultdict(int)
-    for subject in processed_data["chapter_details"]:
-        subject_questions[subject] = sum(chapter["questions_total"] for chapter in processed_data["chapter_details"][subject].values())
-        processed_data["subject_summary"][subject]["total_questions"] = subject_questions[subject]
-
-    processed_data["overall_summary"]["total_questions_calculated"] = sum(subject_questions.values())
-
-    return processed_data
-
 # --- Function to Extract Data for Charts ---
 def extract_chart_data(processed_data):
     chart_data = {}
@@ -191,20 +78,144 @@ def extract_chart_data(processed_data):
 
     return chart_data
 
-# --- Function to Plot Bar Chart for a Subject and Save as Image ---
-def plot_subject_chart(subject, subject_data, temp_image_path):
+# --- Function to Plot Bar Chart for a Subject as an In-memory PNG ---
+# "matplotlib" embeds PNGs; "vector" draws native reportlab charts and never imports matplotlib
+CHART_BACKENDS = ("matplotlib", "vector")
+CHART_BACKEND = os.getenv("CHART_BACKEND", "matplotlib")
+# Chart resolution; the figure size is fixed, so pixel dimensions follow from it
+CHART_DPI = int(os.getenv("CHART_DPI", "300"))
+CHART_SIZE = (5, 3)  # inches; small enough for two charts per page
+# Bump when the chart drawing code changes how a chart looks
+CHART_STYLE_VERSION = "1"
+# Rendered charts kept in memory per process, in front of the shared disk cache
+CHART_MEMORY_ENTRIES = 128
+
+def chart_description(subject_data):
+    totals = [subject_data[level]['total'] for level in ['Easy', 'Medium', 'Tough']]
+    return f"Total questions - Easy: {totals[0]}, Medium: {totals[1]}, Tough: {totals[2]}"
+
+@dataclass
+class ChartImage:
+    data: bytes
+    width: int
+    height: int
+
+    @property
+    def aspect_ratio(self):
+        return self.height / self.width
+
+def chart_signature(subject, subject_data):
+    """Subject plus the exact (correct, incorrect, unattempted, total) counts per level."""
+    return (subject,) + tuple(
+        (subject_data[level]['correct'], subject_data[level]['incorrect'],
+         subject_data[level]['unattempted'], subject_data[level]['total'])
+        for level in ['Easy', 'Medium', 'Tough']
+    )
+
+class ChartCache:
+    """
+    Rendered chart PNGs keyed by chart signature, DPI and style version, so
+    students with identical counts share one rendering. A bounded in-memory
+    LRU sits in front of an optional ResultCache ("charts" namespace), which
+    worker processes share on disk.
+    """
+
+    def __init__(self, store=None, max_entries=CHART_MEMORY_ENTRIES):
+        self.store = store
+        self.max_entries = max_entries
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, subject, subject_data, dpi):
+        return content_hash(CHART_STYLE_VERSION, chart_signature(subject, subject_data), dpi)
+
+    def get(self, key):
+        with self.lock:
+            data = self.memory.get(key)
+            if data is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return data
+        data = self.store.get("charts", key) if self.store is not None else None
+        with self.lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        self._remember(key, data)
+        if self.store is not None:
+            self.store.put("charts", key, data)
+
+    def _remember(self, key, data):
+        with self.lock:
+            self.memory[key] = data
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_entries:
+                self.memory.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0}
+
+_chart_caches = {}
+
+def get_chart_cache(store=None):
+    """Per-process ChartCache for a ResultCache root (None = memory only)."""
+    root = store.root if store is not None else None
+    if root not in _chart_caches:
+        _chart_caches[root] = ChartCache(store)
+    return _chart_caches[root]
+
+# One Agg figure per thread, cleared and redrawn for every chart
+_chart_figures = threading.local()
+
+def _chart_figure():
+    fig = getattr(_chart_figures, "figure", None)
+    if fig is None:
+        # Imported on first use so the vector backend never loads matplotlib
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=CHART_SIZE)
+        FigureCanvasAgg(fig)
+        _chart_figures.figure = fig
+    fig.clear()
+    return fig
+
+def plot_subject_chart(subject, subject_data, cache=None, dpi=None):
+    """
+    Render one subject's difficulty bar chart to PNG bytes, reusing any
+    identical chart already rendered in this process or, with a
+    ResultCache, by any other process.
+    Returns (ChartImage, description), or (None, None) on failure.
+    """
+    dpi = dpi or CHART_DPI
     difficulty_levels = ['Easy', 'Medium', 'Tough']
     correct = [subject_data[level]['correct'] for level in difficulty_levels]
     incorrect = [subject_data[level]['incorrect'] for level in difficulty_levels]
     unattempted = [subject_data[level]['unattempted'] for level in difficulty_levels]
     totals = [subject_data[level]['total'] for level in difficulty_levels]
+    description = chart_description(subject_data)
+    width_px, height_px = round(CHART_SIZE[0] * dpi), round(CHART_SIZE[1] * dpi)
+
+    charts = get_chart_cache(cache)
+    cache_key = charts.make_key(subject, subject_data, dpi)
+    cached_image = charts.get(cache_key)
+    if cached_image is not None:
+        return ChartImage(cached_image, width_px, height_px), description
 
     colors = {'Correct': '#36A2EB', 'Incorrect': '#FF6384', 'Unattempted': '#FFCE56'}
 
     x = np.arange(len(difficulty_levels))
     width = 0.25
 
-    fig, ax = plt.subplots(figsize=(5, 3))  # Smaller size for grid layout
+    fig = _chart_figure()
+    ax = fig.add_subplot()
 
     bar1 = ax.bar(x - width, correct, width, label='Correct', color=colors['Correct'])
     bar2 = ax.bar(x, incorrect, width, label='Incorrect', color=colors['Incorrect'])
@@ -226,305 +237,334 @@ def plot_subject_chart(subject, subject_data, temp_image_path):
     ax.set_ylim(0, max(totals) + 2)
 
     try:
-        plt.tight_layout()
-        plt.savefig(temp_image_path, format='png', dpi=300, bbox_inches='tight')
-        plt.close(fig)
-        time.sleep(0.2)
-        if not os.path.exists(temp_image_path):
-            raise FileNotFoundError(f"Failed to save image at {temp_image_path}")
-        if not os.access(temp_image_path, os.R_OK):
-            raise PermissionError(f"Cannot read image at {temp_image_path}")
-        print(f"Chart saved successfully for {subject} at {temp_image_path}")
+        fig.tight_layout()
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=dpi)
     except Exception as e:
-        print(f"Error saving chart image for {subject}: {e}")
-        plt.close(fig)
+        print(f"Error rendering chart image for {subject}: {e}")
         return None, None
+    finally:
+        fig.clear()
 
-    description = f"Total questions - Easy: {totals[0]}, Medium: {totals[1]}, Tough: {totals[2]}"
-    return temp_image_path, description
+    image = ChartImage(buffer.getvalue(), width_px, height_px)
+    charts.put(cache_key, image.data)
+    return image, description
 
 # --- Function to Clean Document Content ---
 def clean_document_content(content):
-    cleaned_content = content.replace('*', '')
-    lines = cleaned_content.split('\n')
-    output_lines = []
-    in_table = False
-    table_data = []
-    table_count = 0
-
-    for line in lines:
-        line = line.strip()
-        if not line:
-            if in_table and table_data:
-                table_data = [row for row in table_data if not all(cell.strip().startswith('-') and len(cell.strip()) > 1 for cell in row)]
-                if table_data:
-                    table_count += 1
-                    output_lines.append({'type': 'table', 'data': table_data, 'table_type': 'subject' if table_count == 1 else 'difficulty'})
-                table_data = []
-                in_table = False
-            continue
-        if line.startswith('|'):
-            in_table = True
-            table_data.append([cell.strip() for cell in line.split('|')[1:-1]])
-            continue
-        if in_table and not line.startswith('|'):
-            in_table = False
-            if table_data:
-                table_data = [row for row in table_data if not all(cell.strip().startswith('-') and len(cell.strip()) > 1 for cell in row)]
-                if table_data:
-                    table_count += 1
-                    output_lines.append({'type': 'table', 'data': table_data, 'table_type': 'subject' if table_count == 1 else 'difficulty'})
-                table_data = []
-            output_lines.append({'type': 'text', 'content': line})
-        else:
-            output_lines.append({'type': 'text', 'content': line})
-
-    if table_data:
-        table_data = [row for row in table_data if not all(cell.strip().startswith('-') and len(cell.strip()) > 1 for cell in row)]
-        if table_data:
-            table_count += 1
-            output_lines.append({'type': 'table', 'data': table_data, 'table_type': 'difficulty'})
+    """Typed feedback_markdown.Blocks for the LLM's markdown feedback text."""
+    return tokenize_feedback(content)
 
-    return output_lines
+def load_feedback_blocks(feedback_dir, submission_id):
+    """Blocks of <feedback_dir>/<submission_id>.txt, or None if that student has no feedback file."""
+    path = os.path.join(feedback_dir, f"{submission_id}.txt")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as file:
+        return clean_document_content(file.read())
+
+# Subjects charted together on each page; others follow two per page
+CHART_PAGES = [['Physics', 'Chemistry'], ['Mathematics']]
+
+def _chart_pages(chart_data):
+    pages = [[subject for subject in page if subject in chart_data] for page in CHART_PAGES]
+    charted = {subject for page in CHART_PAGES for subject in page}
+    others = [subject for subject in chart_data if subject not in charted]
+    pages += [others[i:i + 2] for i in range(0, len(others), 2)]
+    return [page for page in pages if page] or [[]]
+
+class SharedChart(Flowable):
+    """
+    A chart drawn into the PDF once as a form XObject and reused wherever
+    the same key appears again, e.g. identical charts across a cohort bundle.
+    draw_chart(canvas, width, height) draws it with its origin at 0, 0.
+    """
+
+    def __init__(self, key, width, height, draw_chart):
+        super().__init__()
+        self.key = key
+        self.width = width
+        self.height = height
+        self.draw_chart = draw_chart
+        self.hAlign = 'CENTER'
+
+    def wrap(self, available_width, available_height):
+        return self.width, self.height
+
+    def draw(self):
+        name = f"chart-{self.key}"
+        if not self.canv.hasForm(name):
+            self.canv.beginForm(name)
+            self.draw_chart(self.canv, self.width, self.height)
+            self.canv.endForm()
+        self.canv.doForm(name)
+
+def _vector_chart(subject, subject_data, width, height):
+    key = content_hash("vector", CHART_STYLE_VERSION, chart_signature(subject, subject_data), width, height)[:16]
+    return SharedChart(key, width, height, lambda canvas, w, h: renderPDF.draw(
+        subject_chart_drawing(subject, subject_data, w, h), canvas, 0, 0))
+
+def _image_chart(chart, width, height):
+    key = hashlib.sha256(chart.data).hexdigest()[:16] + f"-{width:.0f}x{height:.0f}"
+    return SharedChart(key, width, height, lambda canvas, w, h: canvas.drawImage(
+        ImageReader(io.BytesIO(chart.data)), 0, 0, w, h))
+
+def _chart_story(chart_data, styles, page_width, cache=None, rendered=None, backend=None):
+    """
+    Flowables for the subject charts, each page of charts after a page break.
+    rendered maps subjects to futures of charts already being drawn.
+    """
+    backend = backend or CHART_BACKEND
+    story = []
+    for page in _chart_pages(chart_data):
+        story.append(PageBreak())
+        for subject in page:
+            target_width = min(page_width, 5.5*inch)
+            if backend == "vector":
+                chart = _vector_chart(subject, chart_data[subject], target_width, target_width * CHART_SIZE[1] / CHART_SIZE[0])
+                description = chart_description(chart_data[subject])
+            else:
+                if rendered is not None:
+                    image, description = rendered[subject].result()
+                else:
+                    image, description = plot_subject_chart(subject, chart_data[subject], cache)
+                if image is None:
+                    continue
+                target_height = target_width * image.aspect_ratio
+                if target_height > 3.5*inch:
+                    target_height = 3.5*inch
+                    target_width = target_height / image.aspect_ratio
+                chart = _image_chart(image, target_width, target_height)
+            story.append(Spacer(1, 0.05*inch))
+            story.append(Paragraph(f"{subject} Performance Chart", styles["subheading"]))
+            story.append(chart)
+            story.append(Paragraph(description, styles["body"]))
+            story.append(Spacer(1, 0.05*inch))
+    return story
 
-def create_styled_pdf(cleaned_content, chart_data, output_filename='feedback_report.pdf'):
-    doc = SimpleDocTemplate(output_filename, pagesize=letter, rightMargin=0.75*inch, leftMargin=0.75*inch, topMargin=0.75*inch, bottomMargin=0.75*inch)
-    styles = getSampleStyleSheet()
-    
-    main_title_style = ParagraphStyle(
-        name='MainTitleStyle',
-        fontSize=18,
-        leading=22,
-        spaceAfter=10,
-        fontName='Helvetica-Bold',
-        textColor=colors.navy,
-        alignment=1  # Center
-    )
-    
-    section_title_style = ParagraphStyle(
-        name='SectionTitleStyle',
-        fontSize=14,
-        leading=16,
-        spaceAfter=6,
-        fontName='Helvetica-Bold',
-        textColor=colors.darkblue,
-        alignment=0  # Left
-    )
-    
-    subheading_style = ParagraphStyle(
-        name='SubheadingStyle',
-        fontSize=10,
-        leading=12,
-        spaceAfter=4,
-        fontName='Helvetica-Oblique',
-        textColor=colors.darkslategray
-    )
-    
-    body_style = ParagraphStyle(
-        name='BodyStyle',
-        fontSize=8,
-        leading=10,
-        spaceAfter=3,
-        fontName='Times-Roman',
-        textColor=colors.black
-    )
-    
-    list_style = ParagraphStyle(
-        name='ListStyle',
-        fontSize=8,
-        leading=10,
-        spaceAfter=3,
-        fontName='Times-Roman',
-        textColor=colors.black,
-        leftIndent=16,
-        bulletFontName='Times-Roman',
-        bulletFontSize=8,
-        bulletIndent=8
-    )
+def _performance_table(table_data, page_width, table_style):
+    col_count = len(table_data[0])
+    col_width = (page_width - 0.3*inch) / col_count
+    table = Table(table_data, colWidths=[col_width] * col_count)
+    table.setStyle(table_style)
+    return table
+
+def _build_pdf(doc, story, output_filename):
+    """Build the document; returns False (and logs why) if reportlab fails."""
+    try:
+        doc.build(story)
+    except Exception:
+        logger.exception("Error building PDF %s", output_filename)
+        return False
+    logger.info("PDF generated: %s", output_filename)
+    return True
+
+# --- Build PDF From the Typed Report Model ---
+# Section titles and the report fields laid out under each, in page order
+REPORT_SECTIONS = [
+    ("Overall Performance", ["overall_performance"]),
+    ("Motivating Introduction", ["introduction"]),
+    ("Performance Breakdown", ["tables", "breakdown_notes", "charts"]),
+    ("Time vs. Accuracy Insights", ["time_insights"]),
+    ("Chapter-wise Concept Analysis", ["chapters"]),
+    ("Actionable Suggestions", ["suggestions"])
+]
+
+def _field_flowables(name, value, template):
+    """Flowables for one report_model.FeedbackReport field."""
+    styles = template.styles
+    flowables = []
+    if name in ("overall_performance", "breakdown_notes", "time_insights"):
+        for line in value:
+            flowables.append(Paragraph(f"• {escape(line)}", styles["list"]))
+    elif name == "introduction":
+        flowables.append(Paragraph(escape(value), styles["body"]))
+        flowables.append(Spacer(1, 0.03*inch))
+    elif name == "tables":
+        for table in value:
+            flowables.append(Paragraph(escape(table.title), styles["subheading"]))
+            flowables.append(_performance_table([table.headers] + [[str(cell) for cell in row] for row in table.rows],
+                                                template.page_width, template.table_style))
+            flowables.append(Spacer(1, 0.05*inch))
+    elif name == "chapters":
+        current_subject = None
+        for chapter in value:
+            if chapter.subject != current_subject:
+                flowables.append(Paragraph(escape(chapter.subject), styles["subheading"]))
+                current_subject = chapter.subject
+            line = f"<b>{escape(chapter.chapter)}:</b> {escape(chapter.summary)}"
+            if chapter.strong_concepts:
+                line += f" Strong: {escape(', '.join(chapter.strong_concepts))}."
+            if chapter.weak_concepts:
+                line += f" Needs work: {escape(', '.join(chapter.weak_concepts))}."
+            flowables.append(Paragraph(f"• {line}", styles["list"]))
+    elif name == "suggestions":
+        for number, suggestion in enumerate(value, 1):
+            flowables.append(Paragraph(f"<b>{number}. {escape(suggestion.title)}:</b> {escape(suggestion.detail)}", styles["body"]))
+            flowables.append(Spacer(1, 0.03*inch))
+    return flowables
+
+def _assemble_report_story(flowables, template):
+    story = template.title_flowables()
+    for title, names in REPORT_SECTIONS:
+        story.append(template.section_title(title))
+        for name in names:
+            story.extend(flowables.get(name, []))
+    return story
+
+def create_report_pdf(report, chart_data, output_filename='feedback_report.pdf', cache=None, chart_backend=None, template=None):
+    """
+    Render a report_model.FeedbackReport. Sections come straight from the
+    model's fields, so no markdown or heading text has to be parsed.
+    Returns True once the PDF is written.
+    """
+    template = template or get_report_template()
+    doc = template.doc(output_filename)
+
+    flowables = {
+        name: _field_flowables(name, getattr(report, name), template)
+        for _, names in REPORT_SECTIONS for name in names if name != "charts"
+    }
+    flowables["charts"] = _chart_story(chart_data, template.styles, template.page_width, cache, backend=chart_backend)
+    return _build_pdf(doc, _assemble_report_story(flowables, template), output_filename)
+
+def stream_report_pdf(processed_data, chart_data, output_filename='feedback_report.pdf', cache=None,
+                      llm_cache=None, client=None, chart_backend=None, template=None):
+    """
+    Build the report while Gemini is still streaming it. Charts render on a
+    background thread from the start, and each report section is laid out
+    as soon as its JSON field completes. If the API call fails or the
+    stream is cut off, the prose sections come from the template report
+    instead. Returns False if the PDF build fails.
+    """
+    # Imported here so farm workers rendering markdown never load the API client
+    import requests
+    from ai_feedback import stream_feedback_fields
+
+    template = template or get_report_template()
+    doc = template.doc(output_filename)
+    chart_backend = chart_backend or CHART_BACKEND
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="charts") as chart_pool:
+        # Vector charts are cheap enough to draw inline at layout time
+        rendered = None
+        if chart_backend == "matplotlib":
+            rendered = {
+                subject: chart_pool.submit(plot_subject_chart, subject, chart_data[subject], cache)
+                for subject in chart_data
+            }
+        flowables = {
+            "overall_performance": _field_flowables("overall_performance", overall_lines(processed_data), template),
+            "tables": _field_flowables("tables", performance_tables(processed_data), template)
+        }
+        try:
+            for name, value in stream_feedback_fields(processed_data, cache=llm_cache, client=client):
+                flowables[name] = _field_flowables(name, value, template)
+        except (requests.RequestException, IncompleteReportError) as e:
+            # Replace every streamed section so the report never mixes sources
+            print(f"Error streaming feedback from Gemini API, using template feedback: {e}")
+            report = build_template_report(processed_data)
+            for _, names in REPORT_SECTIONS:
+                for name in names:
+                    if name != "charts":
+                        flowables[name] = _field_flowables(name, getattr(report, name), template)
+        flowables["charts"] = _chart_story(chart_data, template.styles, template.page_width, rendered=rendered, backend=chart_backend)
+
+    return _build_pdf(doc, _assemble_report_story(flowables, template), output_filename)
+
+# --- Build PDF From Markdown Feedback Text ---
+def build_styled_story(blocks, chart_data, template, cache=None, chart_backend=None):
+    """Flowables for one report laid out from the Blocks of clean_document_content."""
+    styles = template.styles
+    subheading_style = styles["subheading"]
+    body_style = styles["body"]
+    list_style = styles["list"]
     
-    story = []
-    temp_files = []  # Track temporary files for cleanup
+    story = template.title_flowables()
     current_section = None
     in_performance_breakdown = False
     table_count = 0  # Track number of tables in Performance Breakdown
-    page_width = letter[0] - 1.5*inch  # Available width after margins
+    page_width = template.page_width
     charts_added = False  # Flag to prevent duplicate charts
 
-    # Add main title
-    story.append(Paragraph("Test Performance Report", main_title_style))
-    story.append(Spacer(1, 0.08*inch))
-
-    def add_chart(subject, image_path, description):
-        nonlocal story, temp_files
-        try:
-            from PIL import Image as PILImage
-            with PILImage.open(image_path) as img:
-                img_width, img_height = img.size
-                aspect_ratio = img_height / img_width
-                target_width = min(page_width, 5.5*inch)
-                target_height = target_width * aspect_ratio
-                if target_height > 3.5*inch:
-                    target_height = 3.5*inch
-                    target_width = target_height / aspect_ratio
-            story.append(Spacer(1, 0.05*inch))
-            story.append(Paragraph(f"{subject} Performance Chart", subheading_style))
-            img = Image(image_path, width=target_width, height=target_height)
-            img.hAlign = 'CENTER'
-            story.append(img)
-            story.append(Paragraph(description, body_style))
-            story.append(Spacer(1, 0.05*inch))
-            temp_files.append(image_path)
-            print(f"Added chart for {subject} to PDF")
-        except Exception as e:
-            print(f"Error embedding image for {subject}: {e}")
-
-    for item in cleaned_content:
-        if item['type'] == 'text':
-            content = item['content']
-            if content in ['Overall Performance', 'Motivating Introduction', 'Performance Breakdown', 
-                          'Time vs. Accuracy Insights', 'Chapter-wise Concept Analysis', 'Actionable Suggestions']:
-                if in_performance_breakdown and table_count >= 2 and not charts_added:
-                    # Add Physics and Chemistry charts on page 2
-                    story.append(PageBreak())
-                    for subject in ['Physics', 'Chemistry']:
-                        if subject in chart_data:
-                            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.png')
-                            temp_image_path = temp_file.name
-                            temp_file.close()
-                            print(f"Generating chart for {subject} at {temp_image_path}")
-                            image_path, description = plot_subject_chart(subject, chart_data[subject], temp_image_path)
-                            if image_path and os.path.exists(image_path):
-                                add_chart(subject, image_path, description)
-                    # Add Mathematics chart on page 3
-                    story.append(PageBreak())
-                    if chart_data.get('Mathematics'):
-                        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.png')
-                        temp_image_path = temp_file.name
-                        temp_file.close()
-                        print(f"Generating chart for Mathematics at {temp_image_path}")
-                        image_path, description = plot_subject_chart('Mathematics', chart_data['Mathematics'], temp_image_path)
-                        if image_path and os.path.exists(image_path):
-                            add_chart('Mathematics', image_path, description)
-                    charts_added = True
-                story.append(Paragraph(content, section_title_style))
-                current_section = content
-                in_performance_breakdown = (content == 'Performance Breakdown')
-                table_count = 0  # Reset table count for new section
-                continue
-            if content in ['Physics:', 'Chemistry:', 'Mathematics:']:
-                story.append(Paragraph(content[:-1], subheading_style))
-                continue
-            if content.startswith('Electrostatics:') or content.startswith('Capacitance:') or \
-               content.startswith('Solutions:') or content.startswith('Electrochemistry:') or \
-               content.startswith('Functions:') or content.startswith('Sets and Relations:'):
-                story.append(Paragraph(f"• {content}", list_style))
-                continue
+    for block in blocks:
+        if block.kind == 'heading':
+            if in_performance_breakdown and table_count >= 2 and not charts_added:
+                story.extend(_chart_story(chart_data, styles, page_width, cache, backend=chart_backend))
+                charts_added = True
+            story.append(template.section_title(block.text))
+            current_section = block.text
+            in_performance_breakdown = (block.text == 'Performance Breakdown')
+            table_count = 0  # Reset table count for new section
+        elif block.kind == 'subheading':
+            story.append(Paragraph(escape(block.text), subheading_style))
+        elif block.kind == 'bullet':
+            label = f"<b>{escape(block.label)}:</b> " if block.label else ""
+            if block.number and current_section == 'Actionable Suggestions':
+                story.append(Paragraph(f"<b>{block.number}.</b> {label}{escape(block.text)}", body_style))
+                story.append(Spacer(1, 0.03*inch))
+            else:
+                story.append(Paragraph(f"• {label}{escape(block.text)}", list_style))
+        elif block.kind == 'paragraph':
             if current_section == 'Time vs. Accuracy Insights':
-                try:
-                    cleaned_content = re.sub(r'^\s*[-•]|\$\s*\\cdot\s*\d*\s*', '', content).strip()
-                    cleaned_content = re.sub(r'\s+', ' ', cleaned_content.replace('\n', ' ')).strip()
-                    sentences = re.split(r'(?<!\d)\.(?!\d)', cleaned_content)
-                    sentences = [s.strip() for s in sentences if s.strip()]
-                    for sentence in sentences:
-                        if sentence and sentence != '.':
-                            story.append(Paragraph(f"• {sentence}.", list_style))
-                except re.error as e:
-                    print(f"Regex error in bullet point processing: {e}")
-                    cleaned_fallback = re.sub(r'\s+', ' ', content.replace('\n', ' ')).strip()
-                    sentences = re.split(r'(?<!\d)\.(?!\d)', cleaned_fallback)
-                    sentences = [s.strip() for s in sentences if s.strip()]
-                    for sentence in sentences:
-                        if sentence and sentence != '.':
-                            story.append(Paragraph(f"• {sentence}.", list_style))
-                continue
-            if current_section == 'Actionable Suggestions':
-                # Enhanced cleaning
-                cleaned_content = unicodedata.normalize('NFKD', content)  # Normalize Unicode
-                cleaned_content = re.sub(r'[^\x20-\x7E]', '', cleaned_content)  # Keep only printable ASCII characters
-                cleaned_content = re.sub(r'^\s*[-•]|\$\s*\\cdot\s*\d*\s*', '', cleaned_content).strip()
-                sections = re.split(r'\s*\d+\s*(?=\n)', cleaned_content)
-                sections = [s.strip() for s in sections if s.strip()]
-                section_number = 1
-                for section in sections:
-                    section_cleaned = re.sub(r'\s+', ' ', section.replace('\n', ' ')).strip()
-                    if section_cleaned:
-                        sentences = re.split(r'(?<!\d)\.(?!\d)', section_cleaned)
-                        sentences = [s.strip() for s in sentences if s.strip()]
-                        if sentences:
-                            paragraph_text = '. '.join(sentences)
-                            if not paragraph_text.endswith('.'):
-                                paragraph_text += '.'
-                            print(f"Actionable Suggestion {section_number}: {paragraph_text}")  # Debug logging
-                            story.append(Paragraph(paragraph_text, body_style))
-                            story.append(Spacer(1, 0.03*inch))
-                    section_number += 1
+                for sentence in block.sentences:
+                    story.append(Paragraph(f"• {escape(sentence)}.", list_style))
                 continue
-            story.append(Paragraph(content.replace('%', '%'), body_style))
+            story.append(Paragraph(escape(block.text), body_style))
             story.append(Spacer(1, 0.03*inch))
-        
-        elif item['type'] == 'table' and in_performance_breakdown:
-            table_title = "Subject Performance" if item['table_type'] == 'subject' else "Difficulty Performance"
+        elif block.kind == 'table' and in_performance_breakdown:
+            table_title = "Subject Performance" if block.table_type == 'subject' else "Difficulty Performance"
             story.append(Paragraph(table_title, subheading_style))
-            col_count = len(item['data'][0])
-            col_width = (page_width - 0.3*inch) / col_count
-            if item['table_type'] == 'difficulty':
-                item['data'][0] = [col.replace('Avg Time (seconds)', 'Avg Time(s)') for col in item['data'][0]]
-            table = Table(item['data'], colWidths=[col_width] * col_count)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                ('TOPPADDING', (0, 0), (-1, -1), 6),
-                ('LEFTPADDING', (0, 0), (-1, -1), 5),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 5),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('BOX', (0, 0), (-1, -1), 1, colors.black),
-            ]))
+            rows = block.rows
+            if block.table_type == 'difficulty':
+                rows = [[col.replace('Avg Time (seconds)', 'Avg Time(s)') for col in rows[0]]] + rows[1:]
+            table = _performance_table(rows, page_width, template.table_style)
             story.append(table)
             story.append(Spacer(1, 0.05*inch))
             table_count += 1
 
-    # Build the PDF
-    try:
-        doc.build(story)
-        print(f"PDF generated: {output_filename}")
-    except Exception as e:
-        print(f"Error building PDF: {e}")
-    finally:
-        # Clean up temporary files
-        for temp_file in temp_files:
-            try:
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
-                    print(f"Removed temporary file {temp_file}")
-            except Exception as e:
-                print(f"Error removing temporary file {temp_file}: {e}")
-
-# --- Main Execution ---
-file_path = "/content/sample_submission_analysis_1.json"
-text_file_path = "/content/feedback_output.txt"
-pdf_path = "feedback2_report.pdf"
+    return story
 
-if not os.path.exists(text_file_path):
-    print(f"Text file not found: {text_file_path}")
-    exit(1)
+def create_styled_pdf(blocks, chart_data, output_filename='feedback_report.pdf', cache=None, chart_backend=None, template=None):
+    """Lay out the Blocks from clean_document_content. Returns True once the PDF is written."""
+    template = template or get_report_template()
+    doc = template.doc(output_filename)
+    return _build_pdf(doc, build_styled_story(blocks, chart_data, template, cache, chart_backend), output_filename)
 
-json_data = load_json_data(file_path)
-if json_data:
+# --- Main Execution ---
+def main():
+    file_path = "/content/sample_submission_analysis_1.json"
+    text_file_path = "/content/feedback_output.txt"
+    pdf_path = "feedback2_report.pdf"
+
+    json_data = load_json_data(file_path)
+    if not json_data:
+        print("Failed to load JSON file")
+        return
     processed_data = process_data(json_data)
-    if processed_data:
-        chart_data = extract_chart_data(processed_data)
-        try:
-            with open(text_file_path, "r") as file:
-                document_content = file.read()
-            print(f"Successfully loaded text file: {text_file_path}")
-            cleaned_content = clean_document_content(document_content)
-            create_styled_pdf(cleaned_content, chart_data, pdf_path)
-        except Exception as e:
-            print(f"Error processing text file: {e}")
-else:
-    print("Failed to load JSON file")
\ No newline at end of file
+    if not processed_data:
+        return
+    chart_data = extract_chart_data(processed_data)
+    cache = ResultCache()
+
+    # Stream structured feedback straight from Gemini into the PDF
+    if stream_report_pdf(processed_data, chart_data, pdf_path, cache=cache, llm_cache=LLMResponseCache()):
+        print(f"PDF generated: {pdf_path}")
+        return
+
+    print(f"Falling back to saved feedback text: {text_file_path}")
+    if not os.path.exists(text_file_path):
+        print(f"Text file not found: {text_file_path}")
+        return
+    try:
+        with open(text_file_path, "r") as file:
+            document_content = file.read()
+        print(f"Successfully loaded text file: {text_file_path}")
+        blocks = clean_document_content(document_content)
+        if create_styled_pdf(blocks, chart_data, pdf_path, cache=cache):
+            print(f"PDF generated: {pdf_path}")
+    except Exception as e:
+        print(f"Error processing text file: {e}")
+
+if __name__ == "__main__":
+    main()
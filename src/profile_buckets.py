@@ -0,0 +1,231 @@
+import asyncio
+import json
+import re
+from collections import Counter
+
+import requests
+
+from fact_table import LEVELS
+from llm_metrics import llm_tags
+from report_model import STRUCTURED_GENERATION_CONFIG, build_feedback_report
+from result_cache import content_hash
+
+# Accuracy is quantised into bands this many points wide
+DEFAULT_BAND_WIDTH = 20
+
+# Any {...} without nested braces, so subject and chapter names may hold spaces or hyphens
+_PLACEHOLDER = re.compile(r"\{([^{}\n]+)\}")
+# Placeholder names are a bare overall field or "<scope>.<field>"
+OVERALL_FIELDS = {"score", "attempted", "correct", "accuracy", "time_taken"}
+SCOPED_FIELDS = {"accuracy", "attempted", "avg_time", "correct"}
+
+# --- Profile Signature ---
+def _band(stats, band_width):
+    if not stats.answered:
+        return "none"
+    low = min(int(stats.accuracy // band_width) * band_width, 100 - band_width)
+    return f"{low}-{low + band_width}"
+
+def profile_bands(aggregates, band_width=DEFAULT_BAND_WIDTH):
+    """[(subject, level, accuracy band)] for every subject and difficulty in the test."""
+    return [
+        (subject, level, _band(levels[level], band_width))
+        for subject, levels in aggregates.subject_difficulties.items()
+        for level in LEVELS
+        if level in levels and levels[level].total
+    ]
+
+def weak_concept_set(aggregates):
+    return sorted((c.subject, c.chapter, c.concept) for c in aggregates.weak_concepts)
+
+def profile_signature(aggregates, band_width=DEFAULT_BAND_WIDTH):
+    """
+    Hash of the banded accuracy profile, the weak-concept set and the
+    chapter list, so students of different tests never share a draft.
+    """
+    return content_hash(profile_bands(aggregates, band_width), weak_concept_set(aggregates), sorted(aggregates.chapters))
+
+# --- Placeholders for Per-student Numbers ---
+def student_values(processed_data, aggregates=None):
+    """Exact numbers a bucket draft may refer to, keyed by placeholder name."""
+    aggregates = aggregates or processed_data['aggregates']
+    overall = processed_data['overall_summary']
+    values = {
+        "score": f"{overall['total_marks_scored']}/{overall['total_marks_possible']}",
+        "attempted": f"{overall['final_attempted']}/{overall['total_questions_in_test']}",
+        "correct": str(overall['final_correct']),
+        "accuracy": f"{overall['overall_accuracy_percent']:.1f}%",
+        "time_taken": f"{overall['time_taken_minutes']:.1f} minutes"
+    }
+    for subject, stats in aggregates.subjects.items():
+        values[f"{subject}.accuracy"] = f"{stats.accuracy:.1f}%"
+        values[f"{subject}.attempted"] = f"{stats.answered}/{stats.total}"
+        values[f"{subject}.avg_time"] = f"{stats.avg_time:.0f} seconds"
+    for level, stats in aggregates.difficulties.items():
+        values[f"{level}.accuracy"] = f"{stats.accuracy:.1f}%"
+        values[f"{level}.attempted"] = f"{stats.answered}/{stats.total}"
+        values[f"{level}.avg_time"] = f"{stats.avg_time:.0f} seconds"
+    return values
+
+def chapter_values(aggregates, subject, chapter):
+    stats = aggregates.chapters.get((subject, chapter))
+    if stats is None:
+        return {}
+    return {
+        "chapter.accuracy": f"{stats.accuracy:.1f}%",
+        "chapter.attempted": f"{stats.answered}/{stats.total}",
+        "chapter.correct": str(stats.correct)
+    }
+
+def fill_placeholders(text, values):
+    """Replace {name} placeholders; unknown ones are left as written."""
+    return _PLACEHOLDER.sub(lambda match: values.get(match.group(1), match.group(0)), text)
+
+def unfilled_placeholders(report):
+    """Placeholder names still left in a specialised report's prose."""
+    texts = [report.introduction, *report.breakdown_notes, *report.time_insights]
+    texts += [chapter.summary for chapter in report.chapters]
+    texts += [text for suggestion in report.suggestions for text in (suggestion.title, suggestion.detail)]
+    return sorted({name for text in texts for name in _PLACEHOLDER.findall(text) if _is_placeholder_name(name)})
+
+def _is_placeholder_name(name):
+    # Braces in prose such as a set "{1, 2, 3}" are not placeholders
+    scope, dot, field = name.rpartition(".")
+    return name in OVERALL_FIELDS or (dot and scope.strip() and field in SCOPED_FIELDS)
+
+# --- Bucket Prompt ---
+def build_bucket_prompt(aggregates, placeholder_names, band_width=DEFAULT_BAND_WIDTH):
+    bands = "\n".join(f"{subject}|{level}|{band}" for subject, level, band in profile_bands(aggregates, band_width))
+    chapters = "\n".join(f"{subject}|{chapter}" for subject, chapter in aggregates.chapters)
+    weak = "\n".join(f"{subject}/{chapter}: {concept}" for subject, chapter, concept in weak_concept_set(aggregates)) or "none"
+    return f"""You are an expert tutor writing feedback that will be sent to every student with this performance profile. Be motivating, specific and jargon-free.
+Never write exact numbers yourself. Refer to numbers only with these placeholders, which are filled in per student: {', '.join('{' + name + '}' for name in placeholder_names)}.
+In each chapter summary you may also use {{chapter.accuracy}}, {{chapter.attempted}} and {{chapter.correct}}.
+Fill the JSON fields: introduction; breakdown_notes; time_insights; chapters (one per chapter below, with a one-sentence summary); suggestions (2-3, title and detail).
+
+Accuracy band per subject and difficulty (subject|level|accuracy%, none = not attempted):
+{bands}
+
+Chapters (subject|chapter):
+{chapters}
+
+Weak concepts (<=60%):
+{weak}
+"""
+
+def specialise_report(draft, processed_data, aggregates=None):
+    """
+    Fill a bucket draft in with one student's numbers and concept lists.
+    Returns None if the draft is not a valid report or uses a placeholder
+    this student has no value for.
+    """
+    aggregates = aggregates or processed_data['aggregates']
+    values = student_values(processed_data, aggregates)
+    report = build_feedback_report(draft, processed_data, aggregates)
+    if report is None:
+        return None
+    report.introduction = fill_placeholders(report.introduction, values)
+    report.breakdown_notes = [fill_placeholders(note, values) for note in report.breakdown_notes]
+    report.time_insights = [fill_placeholders(insight, values) for insight in report.time_insights]
+    for chapter in report.chapters:
+        concepts = aggregates.concepts.get((chapter.subject, chapter.chapter), [])
+        chapter.summary = fill_placeholders(chapter.summary, {**values, **chapter_values(aggregates, chapter.subject, chapter.chapter)})
+        chapter.strong_concepts = [c.concept for c in concepts if c.band == "strong"]
+        chapter.weak_concepts = [c.concept for c in concepts if c.band == "weak"]
+    for suggestion in report.suggestions:
+        suggestion.title = fill_placeholders(suggestion.title, values)
+        suggestion.detail = fill_placeholders(suggestion.detail, values)
+    unfilled = unfilled_placeholders(report)
+    if unfilled:
+        print(f"Feedback draft uses unknown placeholders: {', '.join(unfilled)}")
+        return None
+    return report
+
+# --- Bucketed Generation ---
+class ProfileBuckets:
+    """Groups students by profile signature and tracks how often drafts are shared."""
+
+    def __init__(self, band_width=DEFAULT_BAND_WIDTH):
+        self.band_width = band_width
+        self.members = {}
+        self.sizes = Counter()
+
+    def add(self, submission_id, processed_data):
+        signature = profile_signature(processed_data['aggregates'], self.band_width)
+        self.members.setdefault(signature, []).append(submission_id)
+        self.sizes[signature] += 1
+        return signature
+
+    def stats(self):
+        students = sum(self.sizes.values())
+        buckets = len(self.sizes)
+        return {
+            "students": students,
+            "buckets": buckets,
+            "llm_calls": buckets,
+            "hit_rate": round((students - buckets) / students, 3) if students else 0.0,
+            "largest_bucket": max(self.sizes.values(), default=0)
+        }
+
+async def generate_bucketed_reports(students, scheduler, cache=None, band_width=DEFAULT_BAND_WIDTH):
+    """
+    Feedback for {submission_id: processed_data} with one LLM draft per
+    distinct profile, specialised locally for each student.
+    Returns (reports, failures, buckets): {submission_id: FeedbackReport},
+    {submission_id: exception} and the ProfileBuckets with bucket counts.
+    """
+    buckets = ProfileBuckets(band_width)
+    for submission_id, processed_data in students.items():
+        buckets.add(submission_id, processed_data)
+
+    client = scheduler.client
+    config = {**client.generation_config, **STRUCTURED_GENERATION_CONFIG}
+    prompts = {}
+    for signature, members in buckets.members.items():
+        representative = students[members[0]]
+        placeholder_names = list(student_values(representative))
+        prompts[signature] = build_bucket_prompt(representative['aggregates'], placeholder_names, band_width)
+
+    def parse_draft(signature, text):
+        # A draft must specialise cleanly for the bucket's representative before it is cached
+        draft = json.loads(text)
+        if specialise_report(draft, students[buckets.members[signature][0]]) is None:
+            raise ValueError("draft is not a usable report")
+        return draft
+
+    async def draft(signature, prompt):
+        tags = {"bucket": signature[:12]}
+        if cache is not None:
+            with llm_tags(**tags):
+                cached = cache.get(prompt, client.model, config)
+            if cached is not None:
+                try:
+                    return parse_draft(signature, cached)
+                except ValueError:
+                    pass
+        text = await scheduler.generate(prompt, STRUCTURED_GENERATION_CONFIG, tags=tags)
+        parsed = parse_draft(signature, text)
+        if cache is not None:
+            cache.put(prompt, client.model, text, config)
+        return parsed
+
+    outcomes = await asyncio.gather(*(draft(signature, prompt) for signature, prompt in prompts.items()), return_exceptions=True)
+
+    reports = {}
+    failures = {}
+    for signature, outcome in zip(prompts, outcomes):
+        # ValueError covers JSONDecodeError and drafts that are not usable reports
+        if isinstance(outcome, (requests.RequestException, ValueError)):
+            print(f"Error generating feedback draft for {len(buckets.members[signature])} students: {outcome}")
+            for submission_id in buckets.members[signature]:
+                failures[submission_id] = outcome
+            continue
+        if isinstance(outcome, BaseException):
+            raise outcome
+        for submission_id in buckets.members[signature]:
+            report = specialise_report(outcome, students[submission_id])
+            if report is None:
+                failures[submission_id] = ValueError("feedback draft could not be specialised")
+            else:
+                reports[submission_id] = report
+    return reports, failures, buckets
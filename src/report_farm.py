@@ -0,0 +1,126 @@
+import argparse
+import os
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+
+import pdf_generation
+from dataPreprocessing import load_json_data
+from result_cache import ResultCache
+
+# Per-worker state set up once by _init_worker
+_worker = {}
+
+# --- Worker Side ---
+def _init_worker(cache, chart_backend):
+    """Import and warm matplotlib/reportlab once per worker rather than per report."""
+    _worker["cache"] = cache
+    _worker["chart_backend"] = chart_backend or pdf_generation.CHART_BACKEND
+    pdf_generation.get_report_template()
+    if _worker["chart_backend"] == "matplotlib":
+        pdf_generation._chart_figure()
+
+def _render_job(job):
+    """Build one PDF; returns (submission_id, ok, error, seconds) instead of raising."""
+    submission_id, blocks, chart_data, output_path = job
+    start = time.perf_counter()
+    try:
+        ok = pdf_generation.create_styled_pdf(
+            blocks, chart_data, output_path,
+            cache=_worker.get("cache"), chart_backend=_worker.get("chart_backend")
+        )
+        error = None if ok else "PDF build failed"
+    except Exception:
+        ok, error = False, traceback.format_exc(limit=3)
+    return submission_id, ok, error, time.perf_counter() - start
+
+# --- Farm ---
+def iter_build_reports(jobs, max_workers=None, max_pending=None, cache=None, chart_backend=None):
+    """
+    Render (submission_id, blocks, chart_data, output_path) jobs
+    across a pool of warm worker processes. Yields
+    (submission_id, ok, error, seconds) as each report finishes, keeping at
+    most max_pending jobs in flight.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1:
+        _init_worker(cache, chart_backend)
+        for job in jobs:
+            yield _render_job(job)
+        return
+
+    max_pending = max_pending or max_workers * 2
+    pending = set()
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(cache, chart_backend)) as executor:
+        for job in jobs:
+            pending.add(executor.submit(_render_job, job))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in as_completed(pending):
+            yield future.result()
+
+def build_reports(jobs, max_workers=None, cache=None, chart_backend=None):
+    """
+    Render every job and print per-student progress. jobs may be any
+    iterable; a generator is consumed as the pool frees up.
+    Returns (built, failures): [submission_id] and {submission_id: error}.
+    """
+    total = f"/{len(jobs)}" if hasattr(jobs, "__len__") else ""
+    built = []
+    failures = {}
+    for done, (submission_id, ok, error, seconds) in enumerate(
+        iter_build_reports(jobs, max_workers, cache=cache, chart_backend=chart_backend), 1
+    ):
+        if ok:
+            built.append(submission_id)
+            print(f"[{done}{total}] {submission_id}: built in {seconds:.2f}s")
+        else:
+            failures[submission_id] = error
+            print(f"[{done}{total}] {submission_id}: failed: {error}")
+    return built, failures
+
+# --- Main Execution ---
+def main():
+    parser = argparse.ArgumentParser(description="Render feedback PDFs for a cohort across worker processes")
+    parser.add_argument("export", help="JSON export with one or more submissions")
+    parser.add_argument("feedback_dir", help="directory of feedback text files named <submission_id>.txt")
+    parser.add_argument("--out-dir", default="reports")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chart-backend", choices=pdf_generation.CHART_BACKENDS, default=None)
+    parser.add_argument("--repeat", type=int, default=1, help="render each submission this many times (benchmarking)")
+    args = parser.parse_args()
+
+    json_data = load_json_data(args.export)
+    if not json_data:
+        print("Failed to load JSON file")
+        return
+    if isinstance(json_data, dict):
+        json_data = [json_data]
+
+    cache = ResultCache()
+    os.makedirs(args.out_dir, exist_ok=True)
+    missing = {}
+
+    def jobs():
+        # Each student's own feedback, read only when their job is submitted
+        for submission_id, (_, chart_data) in pdf_generation.extract_batch_chart_data(json_data, cache=cache).items():
+            blocks = pdf_generation.load_feedback_blocks(args.feedback_dir, submission_id)
+            if blocks is None:
+                missing[submission_id] = f"no feedback file {os.path.join(args.feedback_dir, submission_id + '.txt')}"
+                continue
+            for name in ([submission_id] if args.repeat == 1 else [f"{submission_id}-{i}" for i in range(args.repeat)]):
+                yield name, blocks, chart_data, os.path.join(args.out_dir, f"{name}.pdf")
+
+    start = time.perf_counter()
+    built, failures = build_reports(jobs(), args.workers, cache=cache, chart_backend=args.chart_backend)
+    elapsed = time.perf_counter() - start
+    failures.update(missing)
+    print(f"Built {len(built)}/{len(built) + len(failures)} reports in {elapsed:.1f}s ({len(built) / elapsed:.1f} reports/s)")
+    for submission_id, error in failures.items():
+        print(f"Failed: {submission_id}: {error}")
+
+if __name__ == "__main__":
+    main()
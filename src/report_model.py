@@ -0,0 +1,307 @@
+import json
+import re
+from dataclasses import asdict, dataclass, field
+
+from fact_table import LEVELS
+
+# --- Document Model ---
+@dataclass
+class ReportTable:
+    title: str
+    headers: list
+    rows: list
+
+@dataclass
+class ChapterFeedback:
+    subject: str
+    chapter: str
+    summary: str
+    strong_concepts: list = field(default_factory=list)
+    weak_concepts: list = field(default_factory=list)
+
+@dataclass
+class Suggestion:
+    title: str
+    detail: str
+
+@dataclass
+class FeedbackReport:
+    """
+    Everything the PDF builder renders. Overall lines and tables come from
+    the aggregates; the prose sections come from the LLM's JSON response.
+    """
+    overall_performance: list
+    introduction: str
+    tables: list
+    breakdown_notes: list = field(default_factory=list)
+    time_insights: list = field(default_factory=list)
+    chapters: list = field(default_factory=list)
+    suggestions: list = field(default_factory=list)
+
+# --- Gemini Response Schema ---
+_STRING_LIST = {"type": "ARRAY", "items": {"type": "STRING"}}
+
+RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "introduction": {"type": "STRING"},
+        "breakdown_notes": _STRING_LIST,
+        "time_insights": _STRING_LIST,
+        "chapters": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "subject": {"type": "STRING"},
+                    "chapter": {"type": "STRING"},
+                    "summary": {"type": "STRING"},
+                    "strong_concepts": _STRING_LIST,
+                    "weak_concepts": _STRING_LIST
+                },
+                "required": ["subject", "chapter", "summary"],
+                "propertyOrdering": ["subject", "chapter", "summary", "strong_concepts", "weak_concepts"]
+            }
+        },
+        "suggestions": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "title": {"type": "STRING"},
+                    "detail": {"type": "STRING"}
+                },
+                "required": ["title", "detail"],
+                "propertyOrdering": ["title", "detail"]
+            }
+        }
+    },
+    "required": ["introduction", "time_insights", "chapters", "suggestions"],
+    "propertyOrdering": ["introduction", "breakdown_notes", "time_insights", "chapters", "suggestions"]
+}
+
+STRUCTURED_GENERATION_CONFIG = {
+    "responseMimeType": "application/json",
+    "responseSchema": RESPONSE_SCHEMA
+}
+
+# --- Sections Built From Data ---
+def overall_lines(processed_data):
+    overall = processed_data['overall_summary']
+    return [
+        f"Total Score: {overall['total_marks_scored']}/{overall['total_marks_possible']}",
+        f"Questions Attempted: {overall['final_attempted']}/{overall['total_questions_in_test']}",
+        f"Correct Answers: {overall['final_correct']}",
+        f"Overall Accuracy: {overall['overall_accuracy_percent']:.1f}%",
+        f"Time Taken: {overall['time_taken_minutes']:.1f} minutes"
+    ]
+
+def performance_tables(processed_data, aggregates=None):
+    aggregates = aggregates or processed_data['aggregates']
+    subject_rows = [
+        [subject, f"{s['marks_scored']}/{s['total_marks_possible']}", f"{s['attempted']}/{s['total_questions']}", f"{s['accuracy_percent']:.1f}%"]
+        for subject, s in processed_data['subject_summary'].items()
+    ]
+    difficulty_rows = [
+        [level.capitalize(), stats.total, stats.answered, f"{stats.accuracy:.1f}%", f"{stats.avg_time:.1f}"]
+        for level in LEVELS
+        for stats in [aggregates.difficulties.get(level)]
+        if stats and stats.total > 0
+    ]
+    return [
+        ReportTable("Subject Performance", ["Subject", "Score", "Attempted", "Accuracy"], subject_rows),
+        ReportTable("Difficulty Performance", ["Difficulty", "Total", "Attempted", "Accuracy", "Avg Time(s)"], difficulty_rows)
+    ]
+
+# --- Build Report From the LLM Response ---
+def parse_report_field(name, value):
+    """Convert one raw JSON field of the LLM response to its model type."""
+    if name == "chapters":
+        return [
+            ChapterFeedback(
+                subject=c.get("subject", ""),
+                chapter=c.get("chapter", ""),
+                summary=c.get("summary", ""),
+                strong_concepts=c.get("strong_concepts", []),
+                weak_concepts=c.get("weak_concepts", [])
+            )
+            for c in value
+        ]
+    if name == "suggestions":
+        return [Suggestion(s.get("title", ""), s.get("detail", "")) for s in value]
+    return value
+
+def missing_report_fields(response):
+    """Required top-level fields of RESPONSE_SCHEMA absent from a parsed response."""
+    return [name for name in RESPONSE_SCHEMA["required"] if name not in response]
+
+def build_feedback_report(response, processed_data, aggregates=None):
+    """
+    Combine a structured LLM response (JSON text or parsed dict) with the
+    data-derived sections. Returns None if the response is not a valid JSON
+    object or lacks a required field.
+    """
+    if isinstance(response, str):
+        try:
+            response = json.loads(response)
+        except json.JSONDecodeError as e:
+            print(f"Error parsing structured feedback: {e}")
+            return None
+    if not isinstance(response, dict):
+        print(f"Error parsing structured feedback: expected a JSON object, got {type(response).__name__}")
+        return None
+    missing = missing_report_fields(response)
+    if missing:
+        print(f"Error parsing structured feedback: missing {', '.join(missing)}")
+        return None
+
+    return FeedbackReport(
+        overall_performance=overall_lines(processed_data),
+        introduction=response.get("introduction", ""),
+        tables=performance_tables(processed_data, aggregates),
+        breakdown_notes=response.get("breakdown_notes", []),
+        time_insights=response.get("time_insights", []),
+        chapters=parse_report_field("chapters", response.get("chapters", [])),
+        suggestions=parse_report_field("suggestions", response.get("suggestions", []))
+    )
+
+# --- Incremental Parsing of a Streamed Response ---
+# Characters that matter outside strings, and inside them
+_STRUCTURE = re.compile(r'["{}\[\],:]')
+_STRING_STOP = re.compile(r'["\\]')
+
+class IncompleteReportError(ValueError):
+    """A streamed response ended before its JSON object closed or with required fields missing."""
+
+class StreamingReportParser:
+    """
+    Parses the JSON object while it is still streaming in. feed() returns
+    the (name, value) top-level fields completed by the new text, so each
+    report section can be laid out as soon as the model finishes it.
+    Only new text is scanned (string and nesting state carry over between
+    chunks) and each field is decoded once, when it closes.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0        # next character to scan
+        self.depth = 0           # 1 inside the top-level object
+        self.in_string = False
+        self.token_start = None  # start of the top-level key or value being scanned
+        self.value_start = None  # just after the colon of the current field
+        self.key = None
+        self.complete = False
+        self.names = []
+
+    def feed(self, text):
+        self.buffer += text
+        fields = []
+        buffer = self.buffer
+        while not self.complete:
+            if self.in_string:
+                match = _STRING_STOP.search(buffer, self.position)
+                if not match:
+                    self.position = len(buffer)
+                    break
+                if match.group() == "\\":
+                    if match.end() >= len(buffer):
+                        # Escape split across chunks; rescan it with the next one
+                        self.position = match.start()
+                        break
+                    self.position = match.end() + 1
+                    continue
+                self.in_string = False
+                self.position = match.end()
+                if self.depth == 1:
+                    self._close_token(fields)
+                continue
+
+            match = _STRUCTURE.search(buffer, self.position)
+            if not match:
+                self.position = len(buffer)
+                break
+            char = match.group()
+            self.position = match.end()
+            if self.depth == 0:
+                if char == "{":
+                    self.depth = 1
+                continue
+            if char == '"' or char in "{[":
+                if self.depth == 1:
+                    self.token_start = match.start()
+                if char == '"':
+                    self.in_string = True
+                else:
+                    self.depth += 1
+            elif char in "}]":
+                if self.depth == 1:
+                    # Closing the object also ends a bare scalar value
+                    self._close_scalar(match.start(), fields)
+                    self.complete = True
+                    break
+                self.depth -= 1
+                if self.depth == 1:
+                    self._close_token(fields)
+            elif self.depth == 1:
+                if char == ":":
+                    self.value_start = self.position
+                else:
+                    self._close_scalar(match.start(), fields)
+
+        # Drop text that is fully parsed so the buffer only holds the open field
+        start = self.position if self.token_start is None else self.token_start
+        if self.value_start is not None:
+            start = min(start, self.value_start)
+        if start:
+            self._shift(start)
+        return fields
+
+    def _shift(self, offset):
+        self.buffer = self.buffer[offset:]
+        self.position -= offset
+        if self.token_start is not None:
+            self.token_start -= offset
+        if self.value_start is not None:
+            self.value_start -= offset
+
+    def _close_token(self, fields):
+        token = json.loads(self.buffer[self.token_start:self.position])
+        self.token_start = None
+        if self.key is None:
+            self.key = token
+        else:
+            self._emit(token, fields)
+
+    def _close_scalar(self, end, fields):
+        # Numbers, true, false and null have no closing character of their own
+        if self.key is not None and self.value_start is not None:
+            text = self.buffer[self.value_start:end].strip()
+            if text:
+                self._emit(json.loads(text), fields)
+
+    def _emit(self, value, fields):
+        fields.append((self.key, parse_report_field(self.key, value)))
+        self.names.append(self.key)
+        self.key = None
+        self.value_start = None
+
+    def finish(self):
+        """Raise IncompleteReportError unless the object closed with every required field."""
+        if not self.complete:
+            raise IncompleteReportError("response ended before the JSON object closed")
+        missing = missing_report_fields(self.names)
+        if missing:
+            raise IncompleteReportError(f"response is missing {', '.join(missing)}")
+
+def report_to_dict(report):
+    return asdict(report)
+
+def report_from_dict(data):
+    return FeedbackReport(
+        overall_performance=data["overall_performance"],
+        introduction=data["introduction"],
+        tables=[ReportTable(**table) for table in data["tables"]],
+        breakdown_notes=data["breakdown_notes"],
+        time_insights=data["time_insights"],
+        chapters=[ChapterFeedback(**chapter) for chapter in data["chapters"]],
+        suggestions=[Suggestion(**suggestion) for suggestion in data["suggestions"]]
+    )
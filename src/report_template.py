@@ -0,0 +1,142 @@
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.pdfbase import pdfmetrics
+from reportlab.platypus import BaseDocTemplate, Frame, PageTemplate, Paragraph, Spacer, TableStyle
+from xml.sax.saxutils import escape
+
+REPORT_TITLE = "Test Performance Report"
+MARGIN = 0.75*inch
+FONTS = ['Helvetica', 'Helvetica-Bold', 'Helvetica-Oblique', 'Times-Roman']
+# Section titles come from LLM text, so only this many distinct ones are kept
+MAX_SECTION_TITLES = 64
+
+# --- Report Styles ---
+def report_styles():
+    return {
+        "main_title": ParagraphStyle(
+            name='MainTitleStyle',
+            fontSize=18,
+            leading=22,
+            spaceAfter=10,
+            fontName='Helvetica-Bold',
+            textColor=colors.navy,
+            alignment=1  # Center
+        ),
+        "section_title": ParagraphStyle(
+            name='SectionTitleStyle',
+            fontSize=14,
+            leading=16,
+            spaceAfter=6,
+            fontName='Helvetica-Bold',
+            textColor=colors.darkblue,
+            alignment=0  # Left
+        ),
+        "subheading": ParagraphStyle(
+            name='SubheadingStyle',
+            fontSize=10,
+            leading=12,
+            spaceAfter=4,
+            fontName='Helvetica-Oblique',
+            textColor=colors.darkslategray
+        ),
+        "body": ParagraphStyle(
+            name='BodyStyle',
+            fontSize=8,
+            leading=10,
+            spaceAfter=3,
+            fontName='Times-Roman',
+            textColor=colors.black
+        ),
+        "list": ParagraphStyle(
+            name='ListStyle',
+            fontSize=8,
+            leading=10,
+            spaceAfter=3,
+            fontName='Times-Roman',
+            textColor=colors.black,
+            leftIndent=16,
+            bulletFontName='Times-Roman',
+            bulletFontSize=8,
+            bulletIndent=8
+        )
+    }
+
+PERFORMANCE_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('TOPPADDING', (0, 0), (-1, -1), 6),
+    ('LEFTPADDING', (0, 0), (-1, -1), 5),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 5),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('BOX', (0, 0), (-1, -1), 1, colors.black),
+])
+
+# --- Page Decoration ---
+def _draw_footer(canvas, doc):
+    """Static footer on every page: report name on the left, page number on the right."""
+    canvas.saveState()
+    canvas.setFont('Helvetica', 7)
+    canvas.setFillColor(colors.grey)
+    canvas.drawString(MARGIN, 0.45*inch, REPORT_TITLE)
+    canvas.drawRightString(doc.pagesize[0] - MARGIN, 0.45*inch, f"Page {doc.page}")
+    canvas.restoreState()
+
+# --- Report Template ---
+class ReportTemplate:
+    """
+    Everything every report shares: paragraph and table styles, font
+    metrics, the page template with its footer, and the parsed title text.
+    Built once per process by get_report_template. Flowables carry layout
+    state (reportlab marks one postponed when it misses a page bottom), so
+    every call hands out new ones built from the cached fragments.
+    """
+
+    def __init__(self, pagesize=letter, margin=MARGIN):
+        self.pagesize = pagesize
+        self.margin = margin
+        self.page_width = pagesize[0] - 2*margin
+        self.styles = report_styles()
+        self.table_style = PERFORMANCE_TABLE_STYLE
+        for font_name in FONTS:
+            pdfmetrics.getFont(font_name)  # Load AFM metrics now rather than mid-layout
+        frame = Frame(margin, margin, self.page_width, pagesize[1] - 2*margin, id='body',
+                      leftPadding=6, rightPadding=6, topPadding=6, bottomPadding=6)
+        self.page_templates = [PageTemplate(id='report', frames=[frame], onPage=_draw_footer)]
+        self._title_frags = Paragraph(REPORT_TITLE, self.styles["main_title"]).frags
+        self._section_frags = {}
+
+    def doc(self, output_filename):
+        doc = BaseDocTemplate(output_filename, pagesize=self.pagesize, leftMargin=self.margin, rightMargin=self.margin,
+                              topMargin=self.margin, bottomMargin=self.margin, title=REPORT_TITLE)
+        doc.addPageTemplates(self.page_templates)
+        return doc
+
+    def title_flowables(self):
+        return [Paragraph(REPORT_TITLE, self.styles["main_title"], frags=list(self._title_frags)), Spacer(1, 0.08*inch)]
+
+    def section_title(self, title):
+        """New section heading Paragraph; its markup is parsed once per title."""
+        text = escape(title)
+        frags = self._section_frags.get(title)
+        if frags is None:
+            paragraph = Paragraph(text, self.styles["section_title"])
+            if len(self._section_frags) < MAX_SECTION_TITLES:
+                self._section_frags[title] = paragraph.frags
+            return paragraph
+        return Paragraph(text, self.styles["section_title"], frags=list(frags))
+
+_template = None
+
+def get_report_template():
+    """The ReportTemplate for this process, built on first use."""
+    global _template
+    if _template is None:
+        _template = ReportTemplate()
+    return _template
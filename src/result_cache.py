@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+# Bump when processing, prompt or chart code changes what gets cached, so
+# entries written by older code are never served
+CODE_VERSION = "3"
+
+DEFAULT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", ".report_cache")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# --- Content Hashing ---
+def content_hash(*parts):
+    """Stable SHA-256 of JSON-serialisable inputs (dict key order ignored)."""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# --- On-disk Result Cache ---
+class ResultCache:
+    """
+    Content-addressed per-student cache for processed aggregates, LLM
+    feedback and rendered charts. Each entry is one file under
+    <root>/<namespace>/; file mtimes track recency, and the least recently
+    used entries are evicted once the cache grows past max_bytes.
+    Safe to share between worker processes.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, code_version=CODE_VERSION):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.code_version = code_version
+        self._size = None
+
+    def make_key(self, submission_id, *inputs):
+        return hashlib.sha256(
+            f"{self.code_version}:{submission_id}:{content_hash(*inputs)}".encode("utf-8")
+        ).hexdigest()
+
+    def _path(self, namespace, key):
+        return os.path.join(self.root, namespace, key[:2], key)
+
+    def get(self, namespace, key, default=None):
+        path = self._path(namespace, key)
+        try:
+            with open(path, "rb") as file:
+                value = file.read()
+        except OSError:
+            return default
+        try:
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            pass
+        return value
+
+    def touch(self, namespace, key):
+        """Mark an entry as recently used without reading it."""
+        try:
+            os.utime(self._path(namespace, key))
+        except OSError:
+            pass
+
+    def put(self, namespace, key, value):
+        path = self._path(namespace, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file first so readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            old_size = os.stat(path).st_size
+        except OSError:
+            old_size = 0
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(value)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Error writing cache entry {path}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        if self._size is None:
+            self._size = self._scan_size()
+        else:
+            # Overwriting an entry only changes the size by the difference
+            self._size += len(value) - old_size
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def delete(self, namespace, key):
+        try:
+            os.remove(self._path(namespace, key))
+        except OSError:
+            pass
+        self._size = None
+
+    def get_object(self, namespace, key, default=None):
+        value = self.get(namespace, key)
+        if value is None:
+            return default
+        try:
+            return pickle.loads(value)
+        except Exception as e:
+            print(f"Error reading cache entry {namespace}/{key}: {e}")
+            return default
+
+    def put_object(self, namespace, key, value):
+        self.put(namespace, key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _entries(self, namespace=None):
+        root = os.path.join(self.root, namespace) if namespace else self.root
+        for directory, _, file_names in os.walk(root):
+            for file_name in file_names:
+                if file_name.endswith(".tmp"):
+                    continue
+                path = os.path.join(directory, file_name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Remove least recently used entries until under 90% of max_bytes."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._size = total
+
+    def clear(self, namespace=None):
+        """Remove every entry, or only those in one namespace."""
+        for _, _, path in list(self._entries(namespace)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._size = None if namespace else 0
+
+    def __getstate__(self):
+        # Worker processes rescan the directory instead of inheriting a stale size
+        state = self.__dict__.copy()
+        state["_size"] = None
+        return state
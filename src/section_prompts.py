@@ -0,0 +1,166 @@
+import asyncio
+import json
+
+import requests
+
+from fact_table import LEVELS
+from llm_context import COMPACT_LEGEND, compact_context_sections
+from llm_metrics import llm_tags
+from report_model import RESPONSE_SCHEMA, FeedbackReport, overall_lines, parse_report_field, performance_tables
+
+PERSONA = "You are an expert tutor writing one part of a student's test feedback report. Be friendly, specific and jargon-free."
+
+_FIELDS = RESPONSE_SCHEMA["properties"]
+
+def _object_schema(**properties):
+    return {"type": "OBJECT", "properties": properties, "required": list(properties)}
+
+# --- Section Definitions ---
+# name: (compact context sections the prompt depends on, instruction, response schema)
+SECTIONS = {
+    "introduction": (
+        ["overall", "subjects", "strong_concepts", "weak_concepts"],
+        "Write a short, personal, motivating introduction that names real strengths and acknowledges challenges such as a low attempt rate.",
+        _object_schema(introduction=_FIELDS["introduction"])
+    ),
+    "breakdown_notes": (
+        ["overall", "difficulty", "subject_difficulty"],
+        "Give 2-4 short remarks on performance by difficulty level across subjects.",
+        _object_schema(breakdown_notes=_FIELDS["breakdown_notes"])
+    ),
+    "time_insights": (
+        ["overall", "subjects", "difficulty", "chapters"],
+        "Explain how time allocation affects accuracy, pointing out patterns such as spending too long on easy questions. One point per item.",
+        _object_schema(time_insights=_FIELDS["time_insights"])
+    ),
+    "suggestions": (
+        ["overall", "subjects", "chapters", "weak_concepts"],
+        "Give 2-3 actionable suggestions, each a short title and detail, targeting weaknesses and using strengths.",
+        _object_schema(suggestions=_FIELDS["suggestions"])
+    )
+}
+
+CHAPTER_INSTRUCTION = (
+    "Analyse this chapter: a one-sentence summary plus its strong (>=80%) and weak (<=60%) concepts."
+)
+CHAPTER_SCHEMA = _FIELDS["chapters"]["items"]
+
+def _generation_config(schema):
+    return {"responseMimeType": "application/json", "responseSchema": schema}
+
+def _section_prompt(instruction, data):
+    return f"{PERSONA}\n{instruction}\nData (pipe-separated tables; see legend):\n\n{data}\n"
+
+def chapter_context(aggregates, subject, chapter):
+    """Data slice for one chapter; independent of the rest of the test."""
+    stats = aggregates.chapters[(subject, chapter)]
+    difficulty_counts = aggregates.chapter_difficulties[(subject, chapter)]
+    mix = "/".join(str(difficulty_counts[level].total if level in difficulty_counts else 0) for level in LEVELS)
+    lines = [
+        COMPACT_LEGEND,
+        "subject|chapter|n|att|ok|bad|na|rev|acc|t|easy/medium/tough",
+        f"{subject}|{chapter}|{stats.total}|{stats.answered}|{stats.correct}|{stats.incorrect}|"
+        f"{stats.not_answered}|{stats.marked_review}|{stats.accuracy:.1f}|{stats.avg_time:.1f}|{mix}"
+    ]
+    markers = {"strong": "+", "moderate": "~", "weak": "-"}
+    concepts = aggregates.concepts.get((subject, chapter), [])
+    lines.append("concepts: " + ("; ".join(
+        f"{markers[c.band]}{c.concept}({c.correct}/{c.total})" for c in concepts
+    ) if concepts else "none attempted"))
+    return "\n".join(lines)
+
+def build_section_requests(processed_data, aggregates=None):
+    """
+    One independent request per report section and per chapter, as
+    {key: (prompt, generation_config)} in report order. Each prompt holds
+    only the slice of data its section depends on, so the response cache
+    reuses a section for any student whose slice is unchanged.
+    """
+    aggregates = aggregates or processed_data['aggregates']
+    context = {name: text for name, _, text in compact_context_sections(processed_data, aggregates)}
+    requests_by_key = {}
+    for name, (needs, instruction, schema) in SECTIONS.items():
+        data = "\n\n".join(context[section] for section in needs if section in context)
+        requests_by_key[name] = (_section_prompt(instruction, data), _generation_config(schema))
+    for subject, chapter in aggregates.chapters:
+        requests_by_key[("chapter", subject, chapter)] = (
+            _section_prompt(CHAPTER_INSTRUCTION, chapter_context(aggregates, subject, chapter)),
+            _generation_config(CHAPTER_SCHEMA)
+        )
+    return requests_by_key
+
+# --- Fan Out and Merge ---
+def _parse_section(key, text):
+    """Decode one section response, raising ValueError unless it has the expected shape."""
+    value = json.loads(text)
+    if not isinstance(value, dict):
+        raise ValueError(f"expected a JSON object, got {type(value).__name__}")
+    if isinstance(key, tuple):
+        if "summary" not in value:
+            raise ValueError("missing summary")
+        return value
+    if key not in value:
+        raise ValueError(f"missing {key}")
+    if key == "suggestions" and not all(isinstance(item, dict) for item in value[key] or []):
+        raise ValueError("suggestions must be objects")
+    return value
+
+async def _generate_section(scheduler, key, prompt, generation_config, cache):
+    """Parsed response for one section; only responses that parse are cached."""
+    client = scheduler.client
+    config = {**client.generation_config, **generation_config}
+    section = key if isinstance(key, str) else f"chapter:{key[1]}/{key[2]}"
+    if cache is not None:
+        with llm_tags(section=section):
+            cached = cache.get(prompt, client.model, config)
+        if cached is not None:
+            try:
+                return _parse_section(key, cached)
+            except ValueError:
+                pass
+    text = await scheduler.generate(prompt, generation_config, tags={"section": section})
+    value = _parse_section(key, text)
+    if cache is not None:
+        cache.put(prompt, client.model, text, config)
+    return value
+
+async def generate_sectioned_report(processed_data, scheduler, cache=None, aggregates=None):
+    """
+    Generate every section concurrently through the scheduler and merge the
+    results in report order. Returns a report_model.FeedbackReport, or None
+    if any section failed or came back malformed.
+    """
+    requests_by_key = build_section_requests(processed_data, aggregates)
+    outcomes = await asyncio.gather(
+        *(_generate_section(scheduler, key, prompt, config, cache) for key, (prompt, config) in requests_by_key.items()),
+        return_exceptions=True
+    )
+
+    fields = {}
+    chapters = []
+    failed = False
+    for key, value in zip(requests_by_key, outcomes):
+        # ValueError covers JSONDecodeError and malformed sections
+        if isinstance(value, (requests.RequestException, ValueError)):
+            print(f"Error generating report section {key}: {value}")
+            failed = True
+            continue
+        if isinstance(value, BaseException):
+            raise value
+        if isinstance(key, tuple):
+            _, subject, chapter = key
+            chapters.append({**value, "subject": subject, "chapter": chapter})
+        else:
+            fields[key] = value.get(key)
+    if failed:
+        return None
+
+    return FeedbackReport(
+        overall_performance=overall_lines(processed_data),
+        introduction=fields.get("introduction") or "",
+        tables=performance_tables(processed_data, aggregates),
+        breakdown_notes=fields.get("breakdown_notes") or [],
+        time_insights=fields.get("time_insights") or [],
+        chapters=parse_report_field("chapters", chapters),
+        suggestions=parse_report_field("suggestions", fields.get("suggestions") or [])
+    )
@@ -0,0 +1,64 @@
+import hashlib
+from html.parser import HTMLParser
+
+# Syllabus headings that differ from the subject names used in the reports
+SUBJECT_ALIASES = {
+    "Maths": "Mathematics",
+    "Math": "Mathematics"
+}
+
+# --- Parse Syllabus HTML ---
+class _SyllabusParser(HTMLParser):
+    """Collects <li> chapters under each <h2> subject heading."""
+
+    def __init__(self):
+        super().__init__()
+        self.chapters = set()
+        self._subject = None
+        self._tag = None
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("h2", "li"):
+            self._tag = tag
+            self._text = []
+
+    def handle_data(self, data):
+        if self._tag:
+            self._text.append(data)
+
+    def handle_endtag(self, tag):
+        if tag != self._tag:
+            return
+        text = " ".join("".join(self._text).split())
+        if tag == "h2":
+            self._subject = SUBJECT_ALIASES.get(text, text)
+        elif self._subject and text:
+            self.chapters.add((self._subject, text))
+        self._tag = None
+
+def parse_syllabus(syllabus_html):
+    """Return the frozenset of (subject, chapter) pairs listed in a syllabus."""
+    parser = _SyllabusParser()
+    parser.feed(syllabus_html or "")
+    parser.close()
+    return frozenset(parser.chapters)
+
+# --- Cached Test Scope ---
+_scope_cache = {}
+
+def get_test_scope(test):
+    """
+    Return (chapters, subjects) in scope for a test: a frozenset of
+    (subject, chapter) pairs and the frozenset of subjects it covers.
+    Parsed once per test id (or syllabus hash when the id is missing).
+    A missing or empty syllabus gives empty sets, so nothing is filtered.
+    """
+    syllabus_html = test.get("syllabus") or ""
+    test_id = test.get("_id", {}).get("$oid") or hashlib.sha1(syllabus_html.encode("utf-8")).hexdigest()
+
+    scope = _scope_cache.get(test_id)
+    if scope is None:
+        chapters = parse_syllabus(syllabus_html)
+        scope = _scope_cache[test_id] = (chapters, frozenset(subject for subject, _ in chapters))
+    return scope
@@ -0,0 +1,141 @@
+from fact_table import LEVELS
+from report_model import ChapterFeedback, FeedbackReport, Suggestion, overall_lines, performance_tables
+
+# Rule thresholds
+GOOD_ACCURACY = 75
+LOW_ACCURACY = 50
+LOW_ATTEMPT_RATE = 70
+SLOW_RATIO = 1.25  # A level is "slow" when it takes this much longer than a harder one
+MAX_LISTED_CONCEPTS = 3
+
+# --- Helpers ---
+def _percent(part, whole):
+    return part / whole * 100 if whole else 0
+
+def _join(names):
+    names = list(names)
+    return ", ".join(names[:-1]) + f" and {names[-1]}" if len(names) > 1 else "".join(names)
+
+def _top_concepts(concepts, strongest):
+    ranked = sorted(concepts, key=lambda c: (c.accuracy, c.total), reverse=strongest)
+    return [c.concept for c in ranked[:MAX_LISTED_CONCEPTS]]
+
+# --- Sections ---
+def _introduction(processed_data, aggregates):
+    overall = processed_data['overall_summary']
+    accuracy = overall['overall_accuracy_percent']
+    attempt_rate = _percent(overall['final_attempted'], overall['total_questions_in_test'])
+    attempted_subjects = [(s.accuracy, subject) for subject, s in aggregates.subjects.items() if s.answered]
+
+    if accuracy >= GOOD_ACCURACY:
+        opening = f"You answered {accuracy:.1f}% of your attempted questions correctly, which shows a solid grasp of the material."
+    elif accuracy >= LOW_ACCURACY:
+        opening = f"Your accuracy of {accuracy:.1f}% gives you a good base to build on."
+    else:
+        opening = f"Your accuracy of {accuracy:.1f}% shows there is clear room to grow, and this report points to where to start."
+    sentences = [opening]
+    if attempted_subjects:
+        best_accuracy, best_subject = max(attempted_subjects)
+        sentences.append(f"{best_subject} was your strongest subject at {best_accuracy:.1f}% accuracy.")
+    if aggregates.strong_concepts:
+        sentences.append(f"You have already mastered {len(aggregates.strong_concepts)} concepts, including {_join(_top_concepts(aggregates.strong_concepts, True))}.")
+    if attempt_rate < LOW_ATTEMPT_RATE:
+        sentences.append(f"You attempted {attempt_rate:.0f}% of the questions, so answering more of them with confidence is the quickest way to raise your score.")
+    return " ".join(sentences)
+
+def _breakdown_notes(aggregates):
+    levels = [(level, aggregates.difficulties[level]) for level in LEVELS if level in aggregates.difficulties and aggregates.difficulties[level].total]
+    notes = [
+        f"{level.capitalize()}: {stats.answered}/{stats.total} attempted at {stats.accuracy:.1f}% accuracy."
+        for level, stats in levels
+    ]
+    answered = [(stats.accuracy, level) for level, stats in levels if stats.answered]
+    if len(answered) > 1:
+        best, worst = max(answered), min(answered)
+        if best[1] != worst[1]:
+            notes.append(f"You were most accurate on {best[1]} questions and least accurate on {worst[1]} ones.")
+    return notes
+
+def _time_insights(aggregates):
+    insights = []
+    timed = [(level, aggregates.difficulties[level].avg_time) for level in LEVELS
+             if level in aggregates.difficulties and aggregates.difficulties[level].answered]
+    for (easier, easier_time), (harder, harder_time) in zip(timed, timed[1:]):
+        if harder_time and easier_time > harder_time * SLOW_RATIO:
+            insights.append(
+                f"You spent {easier_time:.0f} seconds per {easier} question but only {harder_time:.0f} on {harder} ones; "
+                f"quicker methods on {easier} questions would free time for harder ones."
+            )
+    subjects = [(s.avg_time, subject, s.accuracy) for subject, s in aggregates.subjects.items() if s.answered]
+    if len(subjects) > 1:
+        slowest_time, slowest, slowest_accuracy = max(subjects)
+        fastest_time, fastest, _ = min(subjects)
+        insights.append(
+            f"{slowest} took the longest at {slowest_time:.0f} seconds per answered question "
+            f"({slowest_accuracy:.1f}% accuracy), compared with {fastest_time:.0f} seconds in {fastest}."
+        )
+    if not insights:
+        insights.append("Your time per question was fairly even across difficulty levels.")
+    return insights
+
+def _chapter_feedback(aggregates):
+    chapters = []
+    for (subject, chapter), stats in aggregates.chapters.items():
+        concepts = aggregates.concepts.get((subject, chapter), [])
+        if not stats.answered:
+            summary = f"None of the {stats.total} questions were attempted; start with the basics of this chapter."
+        elif stats.accuracy >= GOOD_ACCURACY:
+            summary = f"Strong work: {stats.correct} of {stats.answered} attempted questions correct."
+        elif stats.accuracy >= LOW_ACCURACY:
+            summary = f"Steady: {stats.correct} of {stats.answered} attempted questions correct, with a few gaps to close."
+        else:
+            summary = f"Needs attention: {stats.correct} of {stats.answered} attempted questions correct."
+        chapters.append(ChapterFeedback(
+            subject=subject,
+            chapter=chapter,
+            summary=summary,
+            strong_concepts=[c.concept for c in concepts if c.band == "strong"],
+            weak_concepts=[c.concept for c in concepts if c.band == "weak"]
+        ))
+    return chapters
+
+def _suggestions(processed_data, aggregates):
+    overall = processed_data['overall_summary']
+    suggestions = []
+    if aggregates.weak_concepts:
+        suggestions.append(Suggestion(
+            "Targeted Concept Review",
+            f"Revise {_join(_top_concepts(aggregates.weak_concepts, False))} first, then solve a set of practice problems on each until you get them right consistently."
+        ))
+    if _percent(overall['final_attempted'], overall['total_questions_in_test']) < LOW_ATTEMPT_RATE:
+        suggestions.append(Suggestion(
+            "Attempt More Questions",
+            "Go through the paper once answering everything you are sure of, then return to the rest; more attempts at your current accuracy means a higher score."
+        ))
+    suggestions.append(Suggestion(
+        "Timed Practice",
+        "Take timed practice tests and note how long each difficulty level takes, aiming to spend less time on easy questions."
+    ))
+    if len(suggestions) < 3 and aggregates.strong_concepts:
+        suggestions.append(Suggestion(
+            "Build on Your Strengths",
+            f"Keep {_join(_top_concepts(aggregates.strong_concepts, True))} sharp with quick revision so they stay reliable marks."
+        ))
+    return suggestions[:3]
+
+# --- Template Report ---
+def build_template_report(processed_data, aggregates=None):
+    """
+    Rule-based FeedbackReport from the aggregates alone: same sections as
+    the LLM report, no API call, so it also covers API outages.
+    """
+    aggregates = aggregates or processed_data['aggregates']
+    return FeedbackReport(
+        overall_performance=overall_lines(processed_data),
+        introduction=_introduction(processed_data, aggregates),
+        tables=performance_tables(processed_data, aggregates),
+        breakdown_notes=_breakdown_notes(aggregates),
+        time_insights=_time_insights(aggregates),
+        chapters=_chapter_feedback(aggregates),
+        suggestions=_suggestions(processed_data, aggregates)
+    )
@@ -0,0 +1,69 @@
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+from reportlab.graphics.charts.legends import Legend
+from reportlab.graphics.shapes import Drawing, Group, String
+from reportlab.lib import colors
+
+DIFFICULTY_LEVELS = ['Easy', 'Medium', 'Tough']
+
+# Same palette as the matplotlib charts
+SERIES = [
+    ('correct', 'Correct', colors.HexColor('#36A2EB')),
+    ('incorrect', 'Incorrect', colors.HexColor('#FF6384')),
+    ('unattempted', 'Unattempted', colors.HexColor('#FFCE56'))
+]
+
+# --- Vector Bar Chart for a Subject ---
+def subject_chart_drawing(subject, subject_data, width, height):
+    """
+    Grouped correct/incorrect/unattempted bars per difficulty level as a
+    reportlab Drawing, which is itself a flowable of the given size.
+    """
+    drawing = Drawing(width, height)
+    totals = [subject_data[level]['total'] for level in DIFFICULTY_LEVELS]
+
+    drawing.add(String(width / 2, height - 14, f'{subject} Performance',
+                       fontName='Helvetica', fontSize=10, textAnchor='middle'))
+
+    chart = VerticalBarChart()
+    chart.x = 38
+    chart.y = 30
+    chart.width = width - chart.x - 12
+    chart.height = height - chart.y - 26
+    chart.data = [[subject_data[level][key] for level in DIFFICULTY_LEVELS] for key, _, _ in SERIES]
+    chart.groupSpacing = 12
+    chart.barSpacing = 1
+    for index, (_, _, color) in enumerate(SERIES):
+        chart.bars[index].fillColor = color
+        chart.bars[index].strokeColor = None
+
+    chart.categoryAxis.categoryNames = DIFFICULTY_LEVELS
+    chart.categoryAxis.labels.fontSize = 8
+    chart.categoryAxis.labels.dy = -2
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.valueMax = max(totals) + 2
+    chart.valueAxis.valueStep = max(1, (max(totals) + 2) // 5)
+    chart.valueAxis.labels.fontSize = 7
+    chart.valueAxis.visibleGrid = False
+
+    chart.barLabelFormat = '%d'
+    chart.barLabels.fontSize = 7
+    chart.barLabels.nudge = 5
+    drawing.add(chart)
+
+    drawing.add(String(chart.x + chart.width / 2, 4, 'Difficulty', fontName='Helvetica', fontSize=8, textAnchor='middle'))
+    y_label = Group(String(0, 0, 'Questions', fontName='Helvetica', fontSize=8, textAnchor='middle'))
+    y_label.transform = (0, 1, -1, 0, 10, chart.y + chart.height / 2)
+    drawing.add(y_label)
+
+    legend = Legend()
+    legend.x = chart.x + chart.width - 70
+    legend.y = chart.y + chart.height - 4
+    legend.alignment = 'right'
+    legend.fontSize = 6
+    legend.boxAnchor = 'nw'
+    legend.dx = legend.dy = 6
+    legend.deltay = 8
+    legend.colorNamePairs = [(color, label) for _, label, color in SERIES]
+    drawing.add(legend)
+
+    return drawing